@@ -1,14 +1,10 @@
-from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
+from contextvars import ContextVar
 from langchain_core.runnables import RunnableLambda, RunnablePassthrough
-from app.services.rag import rag_service
-
-# Usamos Gemini Flash (rápido y gratis)
-llm = ChatGoogleGenerativeAI(
-    model="gemini-2.5-flash-lite",
-    temperature=0
-)
+from app.services.rag import DEFAULT_COLLECTION
+from app.services.rag_collections import rag_collections
+from app.services.llm_gateway import llm_gateway
 
 template = """Eres un asistente de soporte técnico.
 Responde la pregunta basándote ÚNICAMENTE en el siguiente contexto.
@@ -22,19 +18,36 @@ Pregunta:
 """
 prompt = ChatPromptTemplate.from_template(template)
 
-def retrieve_context(input_dict):
-    return rag_service.search(input_dict["question"])
+# Colección + versión del índice del que salió el contexto de la llamada en curso
+_index_namespace: ContextVar[str] = ContextVar("rag_index_namespace", default="")
+
+# Usamos Gemini Flash (rápido y gratis), a través del gateway. La cadena se compila una vez.
+# Respuestas cacheadas por versión del índice: tras una re-indexación nunca se sirve una respuesta vieja.
+answer_chain = prompt | llm_gateway.runnable(
+    "gemini-2.5-flash-lite",
+    name="rag_answer",
+    cache=True,
+    namespace=_index_namespace.get,
+) | StrOutputParser()
 
-def route_logic(input_dict):
+async def retrieve_context(input_dict):
+    """Busca en la colección pedida (`collection`, opcional): se carga al primer uso."""
+    service = await rag_collections.aget(input_dict.get("collection") or DEFAULT_COLLECTION)
+    namespace = f"{service.name}:{service.manifest.get('_version') or ''}"
+    return {"context": await service.asearch(input_dict["question"]), "namespace": namespace}
+
+async def route_logic(input_dict):
     """Decide si llamar al LLM o devolver error."""
-    if not input_dict.get("context"):
+    retrieval = input_dict["retrieval"]
+    if not retrieval["context"]:
         return "Lo siento, no encuentro información en la base de conocimientos interna sobre este tema."
-    
-    chain = prompt | llm | StrOutputParser()
-    return chain.invoke(input_dict)
 
-# La cadena final exportable
+    # Se fija acá (y no en retrieve_context, que corre en otra tarea) para que lo vea el gateway
+    _index_namespace.set(retrieval["namespace"])
+    return await answer_chain.ainvoke({"question": input_dict["question"], "context": retrieval["context"]})
+
+# La cadena final exportable (async: usar .ainvoke / .astream)
 rag_processing_chain = (
-    RunnablePassthrough.assign(context=retrieve_context) 
+    RunnablePassthrough.assign(retrieval=retrieve_context) 
     | RunnableLambda(route_logic)
 )
\ No newline at end of file
@@ -1,4 +1,5 @@
 import os
+import logging
 from dotenv import load_dotenv
 
 # Carga el .env que está en la misma carpeta backend/
@@ -6,6 +7,174 @@ load_dotenv()
 
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 
+# --- Proveedor de modelos (LLMs y embeddings) ---
+# google: Gemini. fake: modelos locales deterministas, sin red ni API key (tests de carga, desarrollo offline)
+MODEL_PROVIDER = os.getenv("MODEL_PROVIDER", "google").lower()
+# Latencia y tamaño de respuesta simulados por los modelos fake (para que se parezcan a los reales)
+FAKE_LLM_FIRST_TOKEN_MS = float(os.getenv("FAKE_LLM_FIRST_TOKEN_MS", "300"))
+FAKE_LLM_TOKEN_MS = float(os.getenv("FAKE_LLM_TOKEN_MS", "5"))
+FAKE_LLM_OUTPUT_TOKENS = int(os.getenv("FAKE_LLM_OUTPUT_TOKENS", "60"))
+# Fracción de preguntas a las que el LLM fake responde pidiendo una herramienta (ejercita el loop ReAct)
+FAKE_LLM_TOOL_CALL_RATE = float(os.getenv("FAKE_LLM_TOOL_CALL_RATE", "0.3"))
+FAKE_EMBEDDING_LATENCY_MS = float(os.getenv("FAKE_EMBEDDING_LATENCY_MS", "80"))
+FAKE_EMBEDDING_DIM = int(os.getenv("FAKE_EMBEDDING_DIM", "768"))
+
+# --- Gateway de LLMs ---
+# Llamadas en vuelo por modelo (por proceso): el resto espera turno en vez de disparar 429s
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+# Reintentos ante 429/5xx/timeouts con backoff exponencial y jitter completo
+LLM_RETRIES = int(os.getenv("LLM_RETRIES", "3"))
+LLM_RETRY_BASE_SECONDS = float(os.getenv("LLM_RETRY_BASE_SECONDS", "0.1"))
+LLM_RETRY_MAX_SECONDS = float(os.getenv("LLM_RETRY_MAX_SECONDS", "2.0"))
+# Requests idénticas concurrentes comparten una sola llamada al modelo (single-flight)
+LLM_COALESCE = os.getenv("LLM_COALESCE", "true").lower() == "true"
+
 # Validación opcional (Muy recomendada)
-if not GOOGLE_API_KEY:
-    print("⚠️ ADVERTENCIA: No se encontró GOOGLE_API_KEY")
\ No newline at end of file
+if MODEL_PROVIDER == "google" and not GOOGLE_API_KEY:
+    logging.getLogger(__name__).warning("⚠️ ADVERTENCIA: No se encontró GOOGLE_API_KEY")
+
+# --- Persistencia local ---
+# Carpeta raíz para los artefactos generados en runtime (índices, caches, etc.)
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+DATA_DIR = os.getenv("DATA_DIR", os.path.join(BASE_DIR, "data"))
+
+# Índice FAISS versionado (vectores + docstore + manifest)
+RAG_INDEX_DIR = os.getenv("RAG_INDEX_DIR", os.path.join(DATA_DIR, "faiss_index"))
+
+# Colecciones RAG con nombre (una base de conocimiento por equipo). La colección "default" usa
+# RAG_INDEX_DIR; el resto vive en RAG_COLLECTIONS_DIR/<nombre>, cada una con su índice y documentos.
+RAG_COLLECTIONS_DIR = os.getenv("RAG_COLLECTIONS_DIR", os.path.join(DATA_DIR, "collections"))
+# Se cargan al primer uso y se descargan (LRU) cuando las cargadas superan este presupuesto (0 = sin tope)
+RAG_COLLECTIONS_MEMORY_MB = int(os.getenv("RAG_COLLECTIONS_MEMORY_MB", "1024"))
+# Fijadas: se cargan en el warm-up y nunca se descargan (separadas por coma)
+RAG_PINNED_COLLECTIONS = [c.strip() for c in os.getenv("RAG_PINNED_COLLECTIONS", "default").split(",") if c.strip()]
+
+# Cache persistente de embeddings (hash de texto + modelo + task_type)
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", os.path.join(DATA_DIR, "embedding_cache.sqlite3"))
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "100000"))
+
+# Cache persistente de respuestas de LLM (llamadas con temperature=0: misma entrada, misma salida).
+# Las respuestas del RAG se invalidan solas al cambiar la versión del índice.
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", os.path.join(DATA_DIR, "llm_cache.sqlite3"))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "20000"))
+LLM_CACHE_TTL_SECONDS = float(os.getenv("LLM_CACHE_TTL_SECONDS", str(24 * 3600)))
+
+# --- Triaje masivo ---
+# Máximo de tickets procesándose a la vez en /agent/process/batch (por request)
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "16"))
+# Tickets por request (más es un 413): acota las tareas y llamadas al LLM que puede encolar un cliente
+BATCH_MAX_TICKETS = int(os.getenv("BATCH_MAX_TICKETS", "1000"))
+# Tickets por tanda de clasificación con el LLM (abatch); los resultados se emiten al terminar cada tanda
+BATCH_LLM_CHUNK_SIZE = int(os.getenv("BATCH_LLM_CHUNK_SIZE", "64"))
+
+# --- Pre-clasificador local de tickets (fast-path sin LLM) ---
+FASTPATH_ENABLED = os.getenv("FASTPATH_ENABLED", "true").lower() == "true"
+# Confianza mínima del voto kNN y similitud mínima con el vecino más cercano
+FASTPATH_THRESHOLD = float(os.getenv("FASTPATH_THRESHOLD", "0.8"))
+FASTPATH_MIN_SIMILARITY = float(os.getenv("FASTPATH_MIN_SIMILARITY", "0.5"))
+# Fracción de aciertos locales que igual se mandan al LLM para medir acuerdo
+FASTPATH_SHADOW_RATE = float(os.getenv("FASTPATH_SHADOW_RATE", "0.0"))
+FASTPATH_MAX_EXAMPLES = int(os.getenv("FASTPATH_MAX_EXAMPLES", "2000"))
+
+# --- Rate limiting (por ruta e IP) ---
+# Formato "N/second|minute|hour". Cada ruta se puede sobreescribir con RATE_LIMIT_<RUTA>,
+# por ejemplo RATE_LIMIT_REACT_CHAT="20/minute".
+_DEFAULT_RATE_LIMITS = {
+    "default": "60/minute",
+    "react_chat": "10/minute",
+    "rag_query": "30/minute",
+    "rag_documents": "30/minute",
+    "agent_process": "60/minute",
+    "agent_batch": "5/minute",
+}
+RATE_LIMITS = {
+    route: os.getenv(f"RATE_LIMIT_{route.upper()}", spec) for route, spec in _DEFAULT_RATE_LIMITS.items()
+}
+# Tope duro de claves (IPs) recordadas por ruta: acota la memoria ante tráfico de escaneo
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+
+# --- Estado compartido (timezone, rate limiter, leases) ---
+# Workers de uvicorn: es la variable que uvicorn usa como default de --workers
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+# memory: en el proceso (un solo worker). sqlite: compartido entre los workers del nodo.
+# auto: sqlite si WEB_CONCURRENCY > 1
+STATE_BACKEND = os.getenv("STATE_BACKEND", "auto").lower()
+STATE_DB_PATH = os.getenv("STATE_DB_PATH", os.path.join(DATA_DIR, "state.sqlite3"))
+# Tope de claves por namespace (ej: IPs recordadas por cada ruta del rate limiter)
+STATE_MAX_KEYS = int(os.getenv("STATE_MAX_KEYS", str(RATE_LIMIT_MAX_KEYS)))
+
+# --- Memoria conversacional del agente ReAct (checkpointer SQLite) ---
+CHECKPOINT_DB_PATH = os.getenv("CHECKPOINT_DB_PATH", os.path.join(DATA_DIR, "checkpoints.sqlite3"))
+# Threads sin actividad por más de este tiempo se borran (default: 7 días)
+CHECKPOINT_TTL_SECONDS = float(os.getenv("CHECKPOINT_TTL_SECONDS", str(7 * 24 * 3600)))
+CHECKPOINT_MAX_THREADS = int(os.getenv("CHECKPOINT_MAX_THREADS", "50000"))
+CHECKPOINT_KEEP_PER_THREAD = int(os.getenv("CHECKPOINT_KEEP_PER_THREAD", "3"))
+CHECKPOINT_SWEEP_INTERVAL = float(os.getenv("CHECKPOINT_SWEEP_INTERVAL", "300"))
+
+# --- Ventana de contexto del agente ReAct ---
+# Presupuesto (aprox. en tokens) del historial que se envía al modelo en cada paso
+REACT_CONTEXT_TOKEN_BUDGET = int(os.getenv("REACT_CONTEXT_TOKEN_BUDGET", "3000"))
+# Al superar el presupuesto, la ventana se recorta hasta esta fracción (histéresis:
+# así el resumen no se recalcula en cada turno sino cada varios)
+REACT_CONTEXT_RETAIN_RATIO = float(os.getenv("REACT_CONTEXT_RETAIN_RATIO", "0.6"))
+
+# --- Calculadora del agente (evaluador sandbox) ---
+MATH_MAX_EXPRESSION_LENGTH = int(os.getenv("MATH_MAX_EXPRESSION_LENGTH", "500"))
+# Tope de exponente y de tamaño de enteros (en bits) para cualquier resultado intermedio
+MATH_MAX_EXPONENT = int(os.getenv("MATH_MAX_EXPONENT", "10000"))
+MATH_MAX_INT_BITS = int(os.getenv("MATH_MAX_INT_BITS", "4096"))
+MATH_TIMEOUT_SECONDS = float(os.getenv("MATH_TIMEOUT_SECONDS", "1.0"))
+MATH_CACHE_SIZE = int(os.getenv("MATH_CACHE_SIZE", "1024"))
+# > 0: evalúa en un pool de procesos pre-creado que se mata si una expresión excede el tiempo.
+# Con 0 se evalúa en el proceso del servidor y un timeout solo abandona el hilo (sigue consumiendo CPU).
+MATH_POOL_SIZE = int(os.getenv("MATH_POOL_SIZE", "1"))
+
+# --- Ejecución de herramientas del agente ReAct ---
+# Timeout por defecto de cada llamada a herramienta (cada herramienta puede definir el suyo)
+REACT_TOOL_TIMEOUT_SECONDS = float(os.getenv("REACT_TOOL_TIMEOUT_SECONDS", "10"))
+
+# --- RAG híbrido (BM25 + FAISS) ---
+# Candidatos que aporta cada retriever antes de la fusión (RRF)
+RAG_HYBRID_CANDIDATES = int(os.getenv("RAG_HYBRID_CANDIDATES", "8"))
+# Un hit léxico entra a la fusión si cubre al menos esta fracción (por idf) de la consulta
+RAG_LEXICAL_MIN_COVERAGE = float(os.getenv("RAG_LEXICAL_MIN_COVERAGE", "0.3"))
+# Atajo léxico: match fuerte (identificador exacto + alta cobertura) se responde sin embeber la consulta
+RAG_LEXICAL_FASTPATH = os.getenv("RAG_LEXICAL_FASTPATH", "true").lower() == "true"
+RAG_LEXICAL_FASTPATH_COVERAGE = float(os.getenv("RAG_LEXICAL_FASTPATH_COVERAGE", "0.75"))
+# Descartar sin embeber las consultas que no comparten ningún término con el corpus. Apagado por defecto:
+# la búsqueda semántica encuentra sinónimos y consultas en otro idioma que BM25 no ve.
+# (Las consultas sin ningún término útil, ej. solo stopwords, se descartan siempre.)
+RAG_LEXICAL_REJECT_NO_OVERLAP = os.getenv("RAG_LEXICAL_REJECT_NO_OVERLAP", "false").lower() == "true"
+
+# --- Tipo de índice FAISS ---
+# flat (exacto), hnsw (grafo, sub-lineal) o ivfpq (listas invertidas + product quantization, comprimido)
+RAG_INDEX_TYPE = os.getenv("RAG_INDEX_TYPE", "flat")
+RAG_HNSW_M = int(os.getenv("RAG_HNSW_M", "32"))
+RAG_HNSW_EF_CONSTRUCTION = int(os.getenv("RAG_HNSW_EF_CONSTRUCTION", "200"))
+RAG_HNSW_EF_SEARCH = int(os.getenv("RAG_HNSW_EF_SEARCH", "64"))
+# 0 = automático (~4·sqrt(n) listas)
+RAG_IVF_NLIST = int(os.getenv("RAG_IVF_NLIST", "0"))
+RAG_IVF_NPROBE = int(os.getenv("RAG_IVF_NPROBE", "16"))
+# Sub-cuantizadores de PQ (debe dividir la dimensión de los embeddings, 768) y bits por código
+RAG_PQ_M = int(os.getenv("RAG_PQ_M", "16"))
+RAG_PQ_NBITS = int(os.getenv("RAG_PQ_NBITS", "8"))
+
+# --- Readiness (/ready) ---
+# Un componente requerido que falla el warm-up se reintenta con backoff exponencial (segundos)
+READINESS_RETRY_INITIAL = float(os.getenv("READINESS_RETRY_INITIAL", "2"))
+READINESS_RETRY_MAX = float(os.getenv("READINESS_RETRY_MAX", "60"))
+
+# --- Logging y trazas ---
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# Spans por request (router -> nodo -> LLM/herramienta) exportados como JSONL (formato OTLP/JSON) por un hilo aparte
+TRACE_ENABLED = os.getenv("TRACE_ENABLED", "true").lower() == "true"
+# Muestreo en la raíz (head-based): la decisión se toma al entrar el request y la heredan todos sus spans
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0.1"))
+TRACE_EXPORT_PATH = os.getenv("TRACE_EXPORT_PATH", os.path.join(DATA_DIR, "traces.jsonl"))
+# Tope de caracteres por atributo (prompts, respuestas, argumentos de herramientas)
+TRACE_MAX_ATTRIBUTE_CHARS = int(os.getenv("TRACE_MAX_ATTRIBUTE_CHARS", "512"))
+# Spans pendientes de escribir: si el disco no da abasto se descartan (nunca se frena un request)
+TRACE_QUEUE_SIZE = int(os.getenv("TRACE_QUEUE_SIZE", "10000"))
+# Al superar este tamaño el archivo se rota a <archivo>.1
+TRACE_FILE_MAX_BYTES = int(os.getenv("TRACE_FILE_MAX_BYTES", str(50 * 1024 * 1024)))
@@ -0,0 +1,25 @@
+import logging
+
+from app.core.config import LOG_LEVEL
+from app.utils.tracing import TraceContextFilter
+
+LOG_FORMAT = "%(asctime)s - %(levelname)s - %(name)s - [trace=%(trace_id)s] %(message)s"
+
+
+def configure_logging(level: str = LOG_LEVEL):
+    """
+    Configuración única del logging de la app (la llaman los puntos de entrada, nunca un import).
+    Cada línea lleva el trace_id del request en curso para cruzarla con las trazas.
+    """
+    root = logging.getLogger()
+    if root.handlers:
+        # Ya configurado por quien nos embebe (ej: el benchmark): solo sumamos los ids de traza
+        for handler in root.handlers:
+            if not any(isinstance(f, TraceContextFilter) for f in handler.filters):
+                handler.addFilter(TraceContextFilter())
+        return
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    handler.addFilter(TraceContextFilter())
+    root.addHandler(handler)
+    root.setLevel(level)
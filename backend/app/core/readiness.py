@@ -0,0 +1,90 @@
+import time
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Any, Callable, Optional
+from app.core.config import READINESS_RETRY_INITIAL, READINESS_RETRY_MAX
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Component:
+    name: str
+    # Función bloqueante que deja el componente listo (corre en el threadpool)
+    warm: Callable[[], Any]
+    # Si es requerido, /ready responde 503 hasta que termine bien
+    required: bool = True
+    state: str = "pending"  # pending -> warming -> ready | failed (-> warming, si es requerido)
+    error: Optional[str] = None
+    seconds: Optional[float] = None
+    attempts: int = 0
+
+
+class Readiness:
+    """
+    Componentes pesados (índice, clientes de modelos, pools) que se preparan en segundo
+    plano después de abrir el puerto. /health dice si el proceso vive; /ready, si ya
+    puede atender tráfico (es lo que debe consultar el balanceador en un deploy).
+    """
+
+    def __init__(self):
+        self.components: dict[str, Component] = {}
+
+    def register(self, name: str, warm: Callable[[], Any], required: bool = True):
+        self.components[name] = Component(name, warm, required)
+
+    async def warm_up(self):
+        """
+        Prepara todos los componentes en paralelo. Un fallo no frena al resto.
+        Los requeridos que fallan (ej. el proveedor de modelos todavía no responde) se
+        reintentan con backoff hasta que queden listos: un error transitorio no deja
+        a /ready en 503 para siempre.
+        """
+        await asyncio.gather(*(self._warm(c) for c in self.components.values()))
+        logger.info(f"{'✅' if self.ready else '⚠️'} Warm-up terminado: {self.summary()}")
+
+        failed = [c for c in self.components.values() if c.required and c.state == "failed"]
+        await asyncio.gather(*(self._retry(c) for c in failed))
+
+    async def _retry(self, component: Component):
+        delay = READINESS_RETRY_INITIAL
+        while component.state == "failed":
+            await asyncio.sleep(delay)
+            await self._warm(component)
+            delay = min(delay * 2, READINESS_RETRY_MAX)
+        logger.info(f"✅ '{component.name}' listo tras {component.attempts} intentos")
+
+    async def _warm(self, component: Component):
+        component.state = "warming"
+        component.attempts += 1
+        start = time.perf_counter()
+        try:
+            await asyncio.to_thread(component.warm)
+            component.state, component.error = "ready", None
+        except Exception as e:
+            component.state, component.error = "failed", str(e)
+            logger.error(f"🔥 Warm-up de '{component.name}' falló (intento {component.attempts}): {e}")
+        component.seconds = round(time.perf_counter() - start, 3)
+
+    @property
+    def ready(self) -> bool:
+        return all(c.state == "ready" for c in self.components.values() if c.required)
+
+    def summary(self) -> dict[str, str]:
+        return {name: c.state for name, c in self.components.items()}
+
+    def report(self) -> dict:
+        return {
+            "ready": self.ready,
+            "components": {
+                c.name: {
+                    "state": c.state, "required": c.required, "seconds": c.seconds,
+                    "error": c.error, "attempts": c.attempts,
+                }
+                for c in self.components.values()
+            },
+        }
+
+
+readiness = Readiness()
@@ -1,17 +1,25 @@
+from app.core.state_store import state_store
+
+DEFAULT_TIMEZONE = "UTC"
+
+
 class AppSettings:
+    """
+    Configuración modificable en runtime. Vive en el state store (no en atributos del proceso):
+    con varios workers, un cambio hecho en uno lo ven todos.
+    """
     _instance = None
     
     def __new__(cls):
         if cls._instance is None:
             cls._instance = super(AppSettings, cls).__new__(cls)
-            cls._instance.timezone = "UTC" # Valor por defecto
         return cls._instance
 
     def set_timezone(self, tz: str):
-        self.timezone = tz
+        state_store.set("settings", "timezone", tz)
 
     def get_timezone(self):
-        return self.timezone
+        return state_store.get("settings", "timezone") or DEFAULT_TIMEZONE
 
 # Instancia global (Singleton)
-settings = AppSettings()
\ No newline at end of file
+settings = AppSettings()
@@ -0,0 +1,179 @@
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Callable, Optional, TypeVar
+
+from app.core.config import STATE_BACKEND, STATE_DB_PATH, STATE_MAX_KEYS, WEB_CONCURRENCY
+
+logger = logging.getLogger(__name__)
+
+R = TypeVar("R")
+
+# fn(valor actual o None, ahora) -> (valor nuevo o None para no escribir, vencimiento o None, resultado)
+UpdateFn = Callable[[Optional[Any], float], tuple[Optional[Any], Optional[float], R]]
+
+
+class StateStore(ABC):
+    """
+    Estado chico y compartido de la app (configuración en runtime, contadores del rate limiter,
+    leases de tareas periódicas), separado por namespace. Los valores son JSON-serializables.
+    - `memory`: diccionarios del proceso. Lo más rápido, pero cada worker tiene su copia.
+    - `sqlite`: un archivo local compartido por todos los workers del nodo (WAL).
+    Las claves con vencimiento se olvidan solas y hay un tope duro de claves por namespace.
+    """
+
+    @abstractmethod
+    def get(self, namespace: str, key: str) -> Optional[Any]:
+        ...
+
+    @abstractmethod
+    def set(self, namespace: str, key: str, value: Any, expires_at: Optional[float] = None):
+        ...
+
+    @abstractmethod
+    def update(self, namespace: str, key: str, fn: UpdateFn[R]) -> R:
+        """Lee-modifica-escribe atómico (entre hilos y, en `sqlite`, entre procesos)."""
+
+    def try_acquire_lease(self, name: str, owner: str, seconds: float) -> bool:
+        """Lease exclusivo por `seconds`: para que una tarea periódica corra en un solo worker."""
+        def step(current: Optional[dict], now: float):
+            if current is not None and current["owner"] != owner:
+                return None, None, False
+            return {"owner": owner}, now + seconds, True
+        return self.update("leases", name, step)
+
+
+class MemoryStateStore(StateStore):
+    def __init__(self, max_keys: int):
+        self.max_keys = max_keys
+        # namespace -> clave -> (valor, vencimiento), en orden de última escritura
+        self._data: dict[str, OrderedDict[str, tuple[Any, Optional[float]]]] = {}
+        self._lock = threading.Lock()
+
+    def _live(self, namespace: str, key: str, now: float) -> Optional[Any]:
+        entry = self._data.get(namespace, {}).get(key)
+        if entry is None or (entry[1] is not None and entry[1] <= now):
+            return None
+        return entry[0]
+
+    def _write(self, namespace: str, key: str, value: Any, expires_at: Optional[float], now: float):
+        entries = self._data.setdefault(namespace, OrderedDict())
+        entries[key] = (value, expires_at)
+        entries.move_to_end(key)
+        # Desde el frente (escritas hace más tiempo): las vencidas, y las que excedan el tope
+        while entries:
+            _, front_expires = next(iter(entries.values()))
+            if (front_expires is None or front_expires > now) and len(entries) <= self.max_keys:
+                break
+            entries.popitem(last=False)
+
+    def get(self, namespace: str, key: str) -> Optional[Any]:
+        with self._lock:
+            return self._live(namespace, key, time.time())
+
+    def set(self, namespace: str, key: str, value: Any, expires_at: Optional[float] = None):
+        with self._lock:
+            self._write(namespace, key, value, expires_at, time.time())
+
+    def update(self, namespace: str, key: str, fn: UpdateFn[R]) -> R:
+        with self._lock:
+            now = time.time()
+            value, expires_at, result = fn(self._live(namespace, key, now), now)
+            if value is not None:
+                self._write(namespace, key, value, expires_at, now)
+            return result
+
+
+class SqliteStateStore(StateStore):
+    """
+    Cada `update` es una transacción `BEGIN IMMEDIATE`: SQLite serializa a los escritores de
+    todos los procesos, así que el read-modify-write es atómico sin un servidor aparte.
+    """
+
+    # Cada cuántas escrituras se purgan vencidas y se aplica el tope de claves
+    PURGE_EVERY = 1000
+
+    def __init__(self, path: str, max_keys: int):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.max_keys = max_keys
+        self._writes = 0
+        self._lock = threading.Lock()
+        # Autocommit: las transacciones se abren explícitamente
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS state ("
+            "namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, "
+            "expires_at REAL, updated_at REAL NOT NULL, PRIMARY KEY (namespace, key))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_state_updated ON state(namespace, updated_at)")
+
+    def _read(self, namespace: str, key: str, now: float) -> Optional[Any]:
+        row = self._conn.execute(
+            "SELECT value, expires_at FROM state WHERE namespace = ? AND key = ?", (namespace, key)
+        ).fetchone()
+        if row is None or (row[1] is not None and row[1] <= now):
+            return None
+        return json.loads(row[0])
+
+    def _write(self, namespace: str, key: str, value: Any, expires_at: Optional[float], now: float):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO state VALUES (?, ?, ?, ?, ?)",
+            (namespace, key, json.dumps(value), expires_at, now),
+        )
+        self._writes += 1
+
+    def get(self, namespace: str, key: str) -> Optional[Any]:
+        with self._lock:
+            return self._read(namespace, key, time.time())
+
+    def set(self, namespace: str, key: str, value: Any, expires_at: Optional[float] = None):
+        self.update(namespace, key, lambda current, now: (value, expires_at, None))
+
+    def update(self, namespace: str, key: str, fn: UpdateFn[R]) -> R:
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                now = time.time()
+                value, expires_at, result = fn(self._read(namespace, key, now), now)
+                if value is not None:
+                    self._write(namespace, key, value, expires_at, now)
+                    if self._writes % self.PURGE_EVERY == 0:
+                        self._purge(namespace, now)
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            return result
+
+    def _purge(self, namespace: str, now: float):
+        self._conn.execute("DELETE FROM state WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,))
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM state WHERE namespace = ?", (namespace,)).fetchone()
+        overflow = count - self.max_keys
+        if overflow > 0:
+            self._conn.execute(
+                "DELETE FROM state WHERE namespace = ? AND key IN "
+                "(SELECT key FROM state WHERE namespace = ? ORDER BY updated_at LIMIT ?)",
+                (namespace, namespace, overflow),
+            )
+
+
+def create_state_store(backend: str = STATE_BACKEND) -> StateStore:
+    if backend == "auto":
+        # Con varios workers (uvicorn lee WEB_CONCURRENCY como default de --workers) el estado se comparte
+        backend = "sqlite" if WEB_CONCURRENCY > 1 else "memory"
+    if backend == "sqlite":
+        logger.info(f"🗄️ Estado compartido entre workers en {STATE_DB_PATH}")
+        return SqliteStateStore(STATE_DB_PATH, STATE_MAX_KEYS)
+    if backend == "memory":
+        return MemoryStateStore(STATE_MAX_KEYS)
+    raise ValueError(f"STATE_BACKEND inválido: {backend} (memory | sqlite | auto)")
+
+
+state_store = create_state_store()
@@ -1,57 +1,114 @@
-from typing import cast
+import logging
+from typing import AsyncIterator, Optional, cast
 from langgraph.graph import StateGraph, END
-from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.prompts import ChatPromptTemplate
 
 # Importamos los esquemas
 from app.schemas.graph_schemas import AgentState, ClassificationOutput
-from app.core.config import GOOGLE_API_KEY
+from app.services.llm_gateway import llm_gateway
+from app.services.ticket_classifier import ticket_classifier
+from app.utils.metrics import instrument_node
+
+logger = logging.getLogger(__name__)
 
 # --- Configuración ---
-llm = ChatGoogleGenerativeAI(
-    model="gemini-2.5-flash-lite",
-    temperature=0,
-    google_api_key=GOOGLE_API_KEY
+# PROMPT REAL Y COMPLETO
+system_prompt = """Eres un sistema experto de triaje y clasificación de tickets para una empresa de software.
+Tu trabajo es analizar el mensaje de entrada y asignarle una de las siguientes categorías estrictas:
+
+1. 'technical-issue': Úsalo cuando el usuario reporte errores de código, fallos del servidor (500, 404), bugs visuales o comportamientos inesperados del software.
+2. 'user-issue': Úsalo cuando el usuario tenga problemas de acceso, olvido de contraseñas, dudas sobre facturación, o preguntas sobre cómo usar una funcionalidad (errores humanos).
+3. 'general': Úsalo para saludos, preguntas irrelevantes, spam o temas que no requieren soporte.
+
+Tu 'reason' debe ser una frase corta y explicativa en español justificando tu decisión."""
+
+prompt = ChatPromptTemplate.from_messages([
+    ("system", system_prompt),
+    ("human", "{input_text}"),
+])
+
+# Cadena compilada una sola vez. Con salida estructurada, LangChain devuelve un objeto Pydantic.
+# Un mismo ticket se clasifica siempre igual: la respuesta se cachea (el schema es parte de la clave).
+classification_chain = prompt | llm_gateway.runnable(
+    "gemini-2.5-flash-lite", name="ticket_classifier", schema=ClassificationOutput, cache=True
 )
-# Al usar with_structured_output, LangChain intentará devolver un objeto Pydantic
-structured_llm = llm.with_structured_output(ClassificationOutput)
+
+# --- Clasificación (la usan los nodos y el triaje masivo) ---
+
+def local_decision(text: str) -> Optional[dict]:
+    """Clasificación del fast-path local, o None si el ticket tiene que ir al LLM."""
+    decision = ticket_classifier.decide(text)
+    if decision is None:
+        return None
+
+    category, reason, confidence = decision
+    logger.info(f"⚡ Preclasificación local: {category} ({confidence:.2f})")
+    ticket_classifier.record("fast-path", text)
+    return {"classification": category, "reason": reason, "decision_source": "fast-path"}
+
+def llm_decision(text: str, result: ClassificationOutput) -> dict:
+    ticket_classifier.record("llm", text, llm_label=result.category)
+    return {"classification": result.category, "reason": result.reason, "decision_source": "llm"}
+
+async def classify_batch(
+    texts: list[str], max_concurrency: int, chunk_size: int
+) -> AsyncIterator[tuple[str, dict | Exception]]:
+    """
+    Clasificación del triaje masivo: primero el fast-path local (sin red) y el resto con
+    `classification_chain.abatch` por tandas de `chunk_size`, con a lo sumo `max_concurrency`
+    llamadas en vuelo (pasan igual por el gateway: cache, single-flight y semáforo por modelo).
+    Devuelve (texto, {classification, reason, decision_source} | error) a medida que cada tanda termina.
+    """
+    pending = []
+    for text in texts:
+        decision = local_decision(text)
+        if decision is None:
+            pending.append(text)
+        else:
+            yield text, decision
+
+    for start in range(0, len(pending), chunk_size):
+        chunk = pending[start:start + chunk_size]
+        logger.debug(f"🧠 Clasificando tanda de {len(chunk)} tickets con el LLM")
+        results = await classification_chain.abatch(
+            [{"input_text": text} for text in chunk], {"max_concurrency": max_concurrency}, return_exceptions=True
+        )
+        for text, result in zip(chunk, results):
+            if isinstance(result, Exception):
+                yield text, result
+            else:
+                yield text, llm_decision(text, cast(ClassificationOutput, result))
 
 # --- Nodos ---
 
-def node_analysis(state: AgentState):
-    print("--- 🧠 Nodo Análisis ---")
-    
-    # PROMPT REAL Y COMPLETO
-    system_prompt = """Eres un sistema experto de triaje y clasificación de tickets para una empresa de software.
-    Tu trabajo es analizar el mensaje de entrada y asignarle una de las siguientes categorías estrictas:
+async def node_preclassification(state: AgentState):
+    """Fast-path local: si el ticket es obvio lo clasificamos sin llamar al LLM."""
+    if state["classification"]:
+        # Ya viene clasificado (triaje masivo, ver classify_batch)
+        return {}
+    return local_decision(state["input_text"]) or {"decision_source": "llm"}
 
-    1. 'technical-issue': Úsalo cuando el usuario reporte errores de código, fallos del servidor (500, 404), bugs visuales o comportamientos inesperados del software.
-    2. 'user-issue': Úsalo cuando el usuario tenga problemas de acceso, olvido de contraseñas, dudas sobre facturación, o preguntas sobre cómo usar una funcionalidad (errores humanos).
-    3. 'general': Úsalo para saludos, preguntas irrelevantes, spam o temas que no requieren soporte.
+def route_after_preclassification(state: AgentState):
+    return "derivacion" if state["classification"] else "analisis"
 
-    Tu 'reason' debe ser una frase corta y explicativa en español justificando tu decisión."""
-    
-    prompt = ChatPromptTemplate.from_messages([
-        ("system", system_prompt),
-        ("human", "{input_text}"), 
-    ])
-    
-    chain = prompt | structured_llm
+async def node_analysis(state: AgentState):
+    logger.debug("🧠 Nodo Análisis")
     
     # TRUCO PARA PYLANCE: Forzamos el tipado de la variable 'result'
-    response = chain.invoke({"input_text": state["input_text"]})
+    response = await classification_chain.ainvoke({"input_text": state["input_text"]})
     result = cast(ClassificationOutput, response)
+    update = llm_decision(state["input_text"], result)
     
     return {
-        "classification": result.category, 
-        "reason": result.reason
+        "classification": update["classification"], 
+        "reason": update["reason"]
     }
 
-def node_derivation(state: AgentState):
+async def node_derivation(state: AgentState):
     # AgentState es un TypedDict, así que AQUÍ usamos CORCHETES ["..."]
     # Si intentas usar state.classification dará error.
     category = state["classification"]
-    print(f"--- 🔀 Nodo Derivación: {category} ---")
+    logger.info(f"🔀 Nodo Derivación: {category}")
     
     if category == "technical-issue":
         destination = "COLA_INGENIERIA"
@@ -67,8 +124,8 @@ def node_derivation(state: AgentState):
     
     return {"reason": new_reason}
 
-def node_response(state: AgentState):
-    print("--- 📝 Nodo Respuesta ---")
+async def node_response(state: AgentState):
+    logger.debug("📝 Nodo Respuesta")
     
     # Nuevamente, AgentState usa corchetes
     classification = state["classification"]
@@ -85,11 +142,21 @@ def node_response(state: AgentState):
 # --- Grafo ---
 def build_agent_graph():
     workflow = StateGraph(AgentState)
-    workflow.add_node("analisis", node_analysis)
-    workflow.add_node("derivacion", node_derivation)
-    workflow.add_node("respuesta", node_response)
+    nodes = {
+        "preclasificacion": node_preclassification,
+        "analisis": node_analysis,
+        "derivacion": node_derivation,
+        "respuesta": node_response,
+    }
+    for name, node in nodes.items():
+        workflow.add_node(name, instrument_node("incident", name, node))
 
-    workflow.set_entry_point("analisis")
+    workflow.set_entry_point("preclasificacion")
+    workflow.add_conditional_edges(
+        "preclasificacion",
+        route_after_preclassification,
+        {"analisis": "analisis", "derivacion": "derivacion"},
+    )
     workflow.add_edge("analisis", "derivacion")
     workflow.add_edge("derivacion", "respuesta")
     workflow.add_edge("respuesta", END)
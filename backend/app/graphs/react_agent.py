@@ -1,54 +1,180 @@
+import asyncio
 import logging
 from typing import TypedDict, Annotated, Sequence
 
-from langchain_core.messages import BaseMessage, SystemMessage, AIMessage 
+from langchain_core.messages import BaseMessage, SystemMessage, AIMessage, HumanMessage, ToolMessage
 from langgraph.graph import StateGraph, END
 from langgraph.graph.message import add_messages
-from langgraph.prebuilt import ToolNode
-from langgraph.checkpoint.memory import MemorySaver
-from langchain_google_genai import ChatGoogleGenerativeAI
 
-from app.core.config import GOOGLE_API_KEY
-from app.tools.agent_tools import tools
+from app.core.config import (
+    CHECKPOINT_DB_PATH, CHECKPOINT_TTL_SECONDS, CHECKPOINT_MAX_THREADS,
+    CHECKPOINT_KEEP_PER_THREAD, CHECKPOINT_SWEEP_INTERVAL, REACT_CONTEXT_TOKEN_BUDGET, REACT_CONTEXT_RETAIN_RATIO,
+    REACT_TOOL_TIMEOUT_SECONDS
+)
+from app.core.state_store import state_store
+from app.services.checkpointer import SqliteCheckpointer
+from app.services.llm_gateway import llm_gateway
+from app.utils.metrics import instrument_node
+from app.utils.tracing import tracer, annotate
+from app.tools.agent_tools import tools, TOOL_TIMEOUTS
 from app.schemas.react_schemas import ReactState
 
-# --- Logging Setup ---
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+# El logging lo configura el punto de entrada (app.main). El detalle de cada paso (mensajes,
+# respuestas, argumentos) va a las trazas muestreadas, no a los logs de cada request.
+logger = logging.getLogger(__name__)
 
-# 2. Modelo (Gemini)
-llm = ChatGoogleGenerativeAI(
-    model="gemini-2.5-flash",
-    temperature=0,
-    google_api_key=GOOGLE_API_KEY
+# 2. Modelo (Gemini), a través del gateway. Sin single-flight: cada thread tiene su propio
+# historial (dos llamadas idénticas son rarísimas) y el streaming de tokens es por request.
+# Con cache: solo se guardan las respuestas finales (sin tool_calls); los pasos posteriores a una
+# herramienta llevan su resultado en el prompt, así que nunca se reutiliza un dato viejo (ej: la hora).
+agent_llm = llm_gateway.runnable(
+    "gemini-2.5-flash", lambda llm: llm.bind_tools(tools), name="react_agent", coalesce=False, cache=True
 )
-llm_with_tools = llm.bind_tools(tools)
+
+# Modelo liviano para resumir el historial que sale de la ventana
+summary_llm = llm_gateway.runnable("gemini-2.5-flash-lite", name="context_summary", coalesce=False)
+# Tag para distinguir estas llamadas (ej: el endpoint de streaming no reenvía sus tokens)
+SUMMARY_TAG = "context_summary"
+
+# --- Gestión de la ventana de contexto ---
+
+def estimate_tokens(message: BaseMessage) -> int:
+    """Estimación barata (~4 caracteres por token), sin llamadas de red."""
+    content = message.content if isinstance(message.content, str) else str(message.content)
+    tool_calls = getattr(message, "tool_calls", None)
+    return (len(content) + (len(str(tool_calls)) if tool_calls else 0)) // 4 + 4
+
+def is_tool_chatter(message: BaseMessage) -> bool:
+    """Pasos intermedios de herramientas (llamada + resultado)."""
+    return isinstance(message, ToolMessage) or (isinstance(message, AIMessage) and bool(message.tool_calls))
+
+def window_start(messages: Sequence[BaseMessage], budget: int, floor: int) -> int:
+    """
+    Primer índice de la ventana: el inicio de turno (HumanMessage) más antiguo tal que
+    la ventana entre en el presupuesto. Nunca corta un turno a la mitad y siempre
+    conserva el turno actual completo. No retrocede más allá de `floor`.
+    """
+    last_human = max(
+        (i for i, m in enumerate(messages) if isinstance(m, HumanMessage)), default=floor
+    )
+    start, used = last_human, sum(estimate_tokens(m) for m in messages[last_human:])
+    for i in range(last_human - 1, floor - 1, -1):
+        used += estimate_tokens(messages[i])
+        if used > budget:
+            break
+        if isinstance(messages[i], HumanMessage):
+            start = i
+    return max(start, floor)
+
+def compact_window(messages: Sequence[BaseMessage]) -> list[BaseMessage]:
+    """En los turnos ya cerrados, las llamadas/resultados de herramientas no aportan: se descartan."""
+    last_human = max((i for i, m in enumerate(messages) if isinstance(m, HumanMessage)), default=0)
+    return [
+        m for i, m in enumerate(messages)
+        if i >= last_human or not is_tool_chatter(m)
+    ]
+
+async def summarize(previous: str, messages: Sequence[BaseMessage]) -> str:
+    """Incorpora al resumen existente los mensajes que salen de la ventana."""
+    transcript = "\n".join(
+        f"{'Usuario' if isinstance(m, HumanMessage) else 'Asistente'}: {m.content}"
+        for m in messages if not is_tool_chatter(m)
+    )
+    prompt = (
+        "Actualiza el resumen de una conversación entre un usuario y un asistente. "
+        "Conserva datos concretos (números, fechas, resultados, preferencias del usuario) "
+        "y descarta saludos o detalles irrelevantes. Responde solo con el resumen, en español.\n\n"
+        f"Resumen actual:\n{previous or '(vacío)'}\n\nNuevos mensajes:\n{transcript}"
+    )
+    response = await summary_llm.ainvoke(prompt, config={"tags": [SUMMARY_TAG]})
+    return str(response.content)
+
+async def build_context(state: ReactState) -> tuple[list[BaseMessage], dict]:
+    """
+    Arma el historial a enviar al modelo con un presupuesto de tokens fijo:
+    resumen acumulado + turnos recientes intactos. El resumen vive en el estado
+    (persistido por el checkpointer) y solo se recalcula cuando la ventana se desliza.
+    Devuelve (mensajes de la ventana, actualizaciones del estado; vacío si no cambió el resumen).
+    """
+    messages = list(state["messages"])
+    summary = state.get("summary", "")
+    summary_until = state.get("summary_until")
+
+    # La ventana actual empieza justo después del último mensaje resumido
+    ids = [m.id for m in messages]
+    floor = ids.index(summary_until) + 1 if summary_until in ids else 0
+
+    window = compact_window(messages[floor:])
+    if sum(estimate_tokens(m) for m in window) <= REACT_CONTEXT_TOKEN_BUDGET:
+        return window, {}
+
+    # Se desliza la ventana: recortamos con margen y resumimos lo que sale
+    start = window_start(messages, int(REACT_CONTEXT_TOKEN_BUDGET * REACT_CONTEXT_RETAIN_RATIO), floor)
+    if start <= floor:
+        # El turno actual ocupa todo el presupuesto: no hay nada viejo para resumir
+        return window, {}
+
+    logger.info(f"Context window slides: summarizing {start - floor} messages.")
+    new_summary = await summarize(summary, messages[floor:start])
+    return compact_window(messages[start:]), {"summary": new_summary, "summary_until": messages[start - 1].id}
 
 # 3. Nodos del Grafo
-tool_node = ToolNode(tools)
+tools_by_name = {t.name: t for t in tools}
+
+async def run_tool_call(tool_call: dict) -> ToolMessage:
+    """Ejecuta una llamada a herramienta con su timeout. Los errores vuelven al modelo como ToolMessage."""
+    name = tool_call["name"]
+    agent_tool = tools_by_name.get(name)
+    if agent_tool is None:
+        return ToolMessage(content=f"Error: la herramienta '{name}' no existe.", tool_call_id=tool_call["id"], name=name, status="error")
+
+    timeout = TOOL_TIMEOUTS.get(name, REACT_TOOL_TIMEOUT_SECONDS)
+    with tracer.span(f"tool {name}", attributes={"tool.name": name, "tool.args": tool_call.get("args")}) as span:
+        try:
+            # Invocar con el tool_call completo devuelve directamente el ToolMessage (y emite los eventos on_tool_*)
+            result = await asyncio.wait_for(agent_tool.ainvoke({**tool_call, "type": "tool_call"}), timeout)
+            span.set_attribute("tool.output", result.content)
+            return result
+        except asyncio.TimeoutError:
+            logger.warning(f"Tool '{name}' timed out after {timeout}s.")
+            content = f"Error: la herramienta '{name}' excedió el tiempo límite ({timeout}s)."
+        except Exception as e:
+            logger.error(f"Tool '{name}' failed: {e}")
+            content = f"Error ejecutando '{name}': {e}"
+        span.error = content
+        return ToolMessage(content=content, tool_call_id=tool_call["id"], name=name, status="error")
 
 # Nodo para llamar al modelo
-def call_model(state: ReactState):
-    logging.info("---CALLING THE MODEL---")
+async def call_model(state: ReactState):
+    logger.debug("---CALLING THE MODEL---")
     
     system_prompt = (
         "Eres un asistente servicial que debe responder a las preguntas del usuario. "
         "No hagas preguntas de seguimiento si puedes encontrar la información tú mismo usando tus herramientas. "
         "Usa tus herramientas siempre que sea posible. "
-        "Regla importante: Si una pregunta involucra un cálculo matemático con una fecha (como 'hoy', 'mañana', etc.), "
-        "DEBES usar primero la herramienta `datetime_info` para obtener la fecha, y luego DEBES usar la herramienta `convert_date_to_timestamp` sobre el resultado. "
-        "Finalmente, usa la calculadora con el timestamp numérico. No extraigas partes de la fecha manualmente."
+        "Si necesitas varias herramientas independientes entre sí, pídelas todas en la misma respuesta: se ejecutan en paralelo. "
+        "Regla importante: Si una pregunta involucra un cálculo matemático con la fecha u hora actual (como 'hoy', 'mañana', etc.), "
+        "DEBES usar directamente la herramienta `date_calculator`, donde la variable `now` es el timestamp Unix actual. "
+        "Si solo necesitas el timestamp actual, usa `current_timestamp`. "
+        "Para fechas que no son la actual, usa `convert_date_to_timestamp` y luego la calculadora. No extraigas partes de la fecha manualmente."
     )
     
-    messages = [SystemMessage(content=system_prompt), *state["messages"]]
+    window, updates = await build_context(state)
+    summary = updates.get("summary", state.get("summary", ""))
+    if summary:
+        system_prompt += f"\n\nResumen de la conversación anterior:\n{summary}"
     
-    logging.info(f"Messages: {messages}")
-    response = llm_with_tools.invoke(messages)
-    logging.info(f"Model Response: {response}")
-    return {"messages": [response]}
+    messages = [SystemMessage(content=system_prompt), *window]
+
+    annotate(react__history_messages=len(state["messages"]), react__window_messages=len(window), react__summarized=bool(updates))
+
+    response = await agent_llm.ainvoke(messages)
+    logger.debug(f"Model response: {len(response.tool_calls)} tool calls.")
+    return {"messages": [response], **updates}
 
 # Nodo para invocar herramientas (con logging)
-def call_tool_node(state: ReactState):
-    logging.info("---CALLING A TOOL---")
+async def call_tool_node(state: ReactState):
+    logger.debug("---CALLING A TOOL---")
     last_message = state["messages"][-1]
     
     # --- CORRECCIÓN 1: Verificamos tipo antes de acceder a la propiedad ---
@@ -57,31 +183,31 @@ def call_tool_node(state: ReactState):
         return state
     
     # Aquí Pylance ya sabe que last_message es AIMessage y tiene tool_calls
-    logging.info(f"Tool Calls: {last_message.tool_calls}")
+    logger.debug(f"Tool calls: {[call['name'] for call in last_message.tool_calls]}")
     
-    tool_response = tool_node.invoke(state)
-    logging.info(f"Tool Response: {tool_response}")
-    return tool_response
+    # Las llamadas de un mismo AIMessage son independientes: se ejecutan concurrentemente
+    tool_messages = await asyncio.gather(*(run_tool_call(call) for call in last_message.tool_calls))
+    return {"messages": list(tool_messages)}
 
 
 # 4. Lógica Condicional para decidir qué nodo ejecutar
 def should_continue(state: ReactState):
-    logging.info("---CHECKING FOR NEXT STEP---")
+    logger.debug("---CHECKING FOR NEXT STEP---")
     last_message = state["messages"][-1]
     
     # --- CORRECCIÓN 2: Verificamos tipo antes de acceder a la propiedad ---
     if isinstance(last_message, AIMessage) and last_message.tool_calls:
-        logging.info("Decision: Call a tool.")
+        logger.debug("Decision: Call a tool.")
         return "call_tool"
     
-    logging.info("Decision: End of execution.")
+    logger.debug("Decision: End of execution.")
     return END
 
 
 # 5. Construcción del Grafo
 workflow = StateGraph(ReactState)
-workflow.add_node("agent", call_model)
-workflow.add_node("call_tool", call_tool_node)
+workflow.add_node("agent", instrument_node("react", "agent", call_model))
+workflow.add_node("call_tool", instrument_node("react", "call_tool", call_tool_node))
 
 workflow.set_entry_point("agent")
 
@@ -95,8 +221,17 @@ workflow.add_conditional_edges(
 )
 workflow.add_edge("call_tool", "agent")
 
-# 6. Memoria
-memory = MemorySaver()
+# 6. Memoria (persistente en SQLite: sobrevive a reinicios, expira threads inactivos y la
+# comparten todos los workers, así que un thread puede continuar en cualquiera de ellos).
+# El hilo que expira threads lo arranca el lifespan de la app, no el import.
+memory = SqliteCheckpointer(
+    CHECKPOINT_DB_PATH,
+    ttl_seconds=CHECKPOINT_TTL_SECONDS,
+    max_threads=CHECKPOINT_MAX_THREADS,
+    keep_per_thread=CHECKPOINT_KEEP_PER_THREAD,
+    sweep_interval=CHECKPOINT_SWEEP_INTERVAL,
+    lease_store=state_store,
+)
 
 # 7. Compilación
 react_graph = workflow.compile(checkpointer=memory)
\ No newline at end of file
@@ -1,7 +1,44 @@
+import asyncio
+import contextlib
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse, PlainTextResponse
+from app.core.logging_config import configure_logging
+from app.core.readiness import readiness
 from app.routers import rag_router, agent_router, react_router
+from app.graphs.react_agent import memory
+from app.services.llm_gateway import llm_gateway
+from app.services.rag_collections import rag_collections
+from app.utils.metrics import REGISTRY, MetricsMiddleware
+from app.utils.safe_math import math_pool
+from app.utils.tracing import tracer, TracingMiddleware
 
-app = FastAPI(title="AI Engineer Test API", version="1.0.0")
+configure_logging()
+
+
+# Componentes pesados: se preparan en paralelo después de abrir el puerto (ver /ready)
+readiness.register("rag_index", rag_collections.warm_up)
+readiness.register("llm_clients", llm_gateway.warm_up)
+readiness.register("checkpoint_expiry", memory.start_expiry_worker, required=False)
+if math_pool is not None:
+    readiness.register("math_pool", math_pool.start, required=False)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # El warm-up no bloquea el arranque: el servidor acepta conexiones de inmediato
+    warm_up = asyncio.create_task(readiness.warm_up())
+    yield
+    warm_up.cancel()
+    with contextlib.suppress(asyncio.CancelledError):
+        await warm_up
+    # Escribe los spans pendientes antes de salir
+    await asyncio.to_thread(tracer.shutdown)
+
+
+app = FastAPI(title="AI Engineer Test API", version="1.0.0", lifespan=lifespan)
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(TracingMiddleware)
 
 # Registrar routers
 app.include_router(rag_router.router)
@@ -10,8 +47,19 @@ app.include_router(react_router.router)
 
 @app.get("/health")
 def health():
+    """Liveness: el proceso responde (no implica que ya pueda atender consultas)."""
     return {"status": "ok"}
 
+@app.get("/ready")
+def ready():
+    """Readiness: 200 cuando todos los componentes requeridos están listos, 503 mientras tanto."""
+    return JSONResponse(readiness.report(), status_code=200 if readiness.ready else 503)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Métricas en formato de texto de Prometheus (latencias por endpoint, nodo, LLM, embeddings y FAISS)."""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run("app.main:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
+    uvicorn.run("app.main:app", host="0.0.0.0", port=8000, reload=True)
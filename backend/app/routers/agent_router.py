@@ -1,37 +1,98 @@
-from typing import cast
-from fastapi import APIRouter, HTTPException
+import json
+from typing import AsyncIterator, Optional, cast
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from app.graphs.incident_agent import incident_graph
-from app.schemas.graph_schemas import AgentState, AgentInput
+from app.core.config import BATCH_MAX_CONCURRENCY, BATCH_MAX_TICKETS, BATCH_LLM_CHUNK_SIZE
+from app.graphs.incident_agent import incident_graph, classify_batch
+from app.services.ticket_classifier import ticket_classifier
+from app.schemas.graph_schemas import AgentState, AgentInput, BatchAgentInput
+from app.utils.rate_limiter import RateLimit
 
 
 # Definimos el Router
 router = APIRouter(prefix="/agent", tags=["Ejercicio 2"])
 
-@router.post("/process")
+async def run_ticket(text: str, decision: Optional[dict] = None) -> dict:
+    """
+    Ejecuta el grafo completo para un ticket y devuelve la parte pública del estado final.
+    Con `decision` (classification, reason, decision_source) el ticket ya viene clasificado
+    y el grafo solo deriva y arma la respuesta.
+    """
+    # CORRECCIÓN: Inicializamos TODAS las claves del AgentState para que Pylance no se queje.
+    # Al ser un TypedDict, espera que la estructura esté completa desde el inicio.
+    initial_state: AgentState = {
+        "input_text": text,
+        "classification": "",  # Placeholder vacío
+        "reason": "",          # Placeholder vacío
+        "final_output": "",    # Placeholder vacío
+        "decision_source": "",  # Lo completa el nodo de preclasificación
+        **(decision or {}),
+    }
+    
+    # .ainvoke ejecuta todo el flujo (Análisis -> Derivación -> Respuesta) sin bloquear el event loop
+    # Ahora 'initial_state' cumple perfectamente con el contrato de AgentState
+    response = await incident_graph.ainvoke(initial_state)
+    result = cast(AgentState, response)
+    
+    # Devolvemos solo lo que nos interesa del estado final
+    return {
+        "input": result["input_text"],
+        "classification": result["classification"],
+        "final_response": result["final_output"],
+        "decision_source": result["decision_source"]
+    }
+
+@router.post("/process", dependencies=[Depends(RateLimit("agent_process"))])
 async def process_incident(request: AgentInput):
     try:
         # Invocamos el Grafo con el texto del usuario
-        # CORRECCIÓN: Inicializamos TODAS las claves del AgentState para que Pylance no se queje.
-        # Al ser un TypedDict, espera que la estructura esté completa desde el inicio.
-        initial_state: AgentState = {
-            "input_text": request.text,
-            "classification": "",  # Placeholder vacío
-            "reason": "",          # Placeholder vacío
-            "final_output": ""     # Placeholder vacío
-        }
-        
-        # .invoke ejecuta todo el flujo (Análisis -> Derivación -> Respuesta)
-        # Ahora 'initial_state' cumple perfectamente con el contrato de AgentState
-        response = incident_graph.invoke(initial_state)
-        result = cast(AgentState, response)
-        
-        # Devolvemos solo lo que nos interesa del estado final
-        return {
-            "input": result["input_text"],
-            "classification": result["classification"],
-            "final_response": result["final_output"]
-        }
+        return await run_ticket(request.text)
 
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/stats")
+async def triage_stats():
+    """Tasa de fast-path vs LLM y acuerdo entre el clasificador local y el LLM."""
+    return ticket_classifier.stats()
+
+@router.post("/process/batch", dependencies=[Depends(RateLimit("agent_batch"))])
+async def process_incident_batch(request: BatchAgentInput):
+    """
+    Triaje masivo: devuelve NDJSON (una línea por ticket) en orden de finalización, no de entrada.
+    Los tickets obvios salen primero (fast-path local); el resto se clasifica con el LLM en tandas
+    (`abatch`, a lo sumo `max_concurrency` llamadas en vuelo) y cada tanda se emite al terminar.
+    Cada línea trae el `index` original; un ticket que falla no corta el resto.
+    """
+    if len(request.tickets) > BATCH_MAX_TICKETS:
+        raise HTTPException(
+            status_code=413, detail=f"Demasiados tickets en un request (máximo {BATCH_MAX_TICKETS})."
+        )
+    limit = min(request.max_concurrency or BATCH_MAX_CONCURRENCY, BATCH_MAX_CONCURRENCY)
+
+    # Tickets idénticos (muy comunes en backlogs) se clasifican una sola vez
+    groups: dict[str, list[int]] = {}
+    for index, ticket in enumerate(request.tickets):
+        groups.setdefault(ticket.text.strip(), []).append(index)
+
+    async def ndjson() -> AsyncIterator[str]:
+        # Si el cliente corta la conexión, el generador se cancela junto con la tanda en vuelo
+        async for text, decision in classify_batch(list(groups), limit, BATCH_LLM_CHUNK_SIZE):
+            result, error = None, None
+            if isinstance(decision, Exception):
+                error = str(decision)
+            else:
+                try:
+                    # Ya clasificado: el grafo solo deriva y arma la respuesta (sin LLM)
+                    result = await run_ticket(text, decision)
+                except Exception as e:
+                    error = str(e)
+            for index in groups[text]:
+                if error is None:
+                    line = {"index": index, "status": "ok", **cast(dict, result)}
+                else:
+                    line = {"index": index, "status": "error", "input": text, "detail": error}
+                yield json.dumps(line, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
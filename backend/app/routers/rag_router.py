@@ -1,26 +1,163 @@
-from fastapi import APIRouter, HTTPException
-from app.schemas.rag_schemas import RAGQueryRequest, RAGResponse
+from typing import AsyncIterator
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from fastapi.concurrency import run_in_threadpool
+from langchain_core.documents import Document
+from app.schemas.rag_schemas import (
+    RAGQueryRequest, RAGResponse, DocumentUpsertRequest, DocumentDeleteRequest, IngestionResponse,
+    COLLECTION_NAME_PATTERN
+)
 from app.chains.rag_chain import rag_processing_chain
+from app.services.llm_gateway import CACHE_HIT_EVENT
+from app.services.rag import RAGService, DEFAULT_COLLECTION
+from app.services.rag_collections import rag_collections, UnknownCollection
+from app.utils.rate_limiter import RateLimit
+from app.utils.sse import sse_event, SSE_HEADERS
 import logging
 
 router = APIRouter(prefix="/rag", tags=["Ejercicio 1"])
 logger = logging.getLogger(__name__)
 
-@router.post("/query", response_model=RAGResponse)
+# Colección de los endpoints de documentos y stats (la consulta la lleva en el body)
+CollectionParam = Query(DEFAULT_COLLECTION, pattern=COLLECTION_NAME_PATTERN, description="Colección (ej: payments)")
+
+async def get_collection(collection: str, create: bool = False) -> RAGService:
+    try:
+        return await rag_collections.aget(collection, create=create)
+    except UnknownCollection:
+        raise HTTPException(status_code=404, detail=f"No existe la colección '{collection}'.")
+
+def build_rag_response(result_text: str) -> RAGResponse:
+    # Detectamos si fue un fallback simple
+    is_fallback = "no encuentro información" in result_text
+
+    return RAGResponse(
+        answer=result_text,
+        context_found=not is_fallback,
+        sources=["Manual Interno"] if not is_fallback else []
+    )
+
+@router.post("/query", response_model=RAGResponse, dependencies=[Depends(RateLimit("rag_query"))])
 async def query_technical_docs(request: RAGQueryRequest):
     try:
         # Ejecutamos la cadena
-        result_text = rag_processing_chain.invoke({"question": request.question})
-        
-        # Detectamos si fue un fallback simple
-        is_fallback = "no encuentro información" in result_text
-        
-        return RAGResponse(
-            answer=result_text,
-            context_found=not is_fallback,
-            sources=["Manual Interno"] if not is_fallback else []
-        )
+        result_text = await rag_processing_chain.ainvoke(request.model_dump())
+        return build_rag_response(result_text)
 
+    except UnknownCollection:
+        raise HTTPException(status_code=404, detail=f"No existe la colección '{request.collection}'.")
     except Exception as e:
         logger.error(f"Error RAG: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/query/stream", dependencies=[Depends(RateLimit("rag_query"))])
+async def query_technical_docs_stream(request: RAGQueryRequest):
+    """
+    Igual que /query pero por Server-Sent Events:
+    - `token`: fragmentos de la respuesta a medida que el modelo los genera
+      (una respuesta cacheada o el fallback sin contexto llegan enteros en un solo token).
+    - `done`: el mismo cuerpo que /query.
+    - `error`: si algo falla a mitad del stream.
+    """
+    # Validamos la colección antes de abrir el stream: si no existe, es un 404 y no un evento de error
+    if not rag_collections.exists(request.collection):
+        raise HTTPException(status_code=404, detail=f"No existe la colección '{request.collection}'.")
+
+    async def event_stream() -> AsyncIterator[str]:
+        try:
+            streamed = False
+            result_text = ""
+            async for event in rag_processing_chain.astream_events(request.model_dump(), version="v2"):
+                kind = event["event"]
+                if kind == "on_chat_model_stream":
+                    delta = event["data"]["chunk"].content
+                    if isinstance(delta, str) and delta:
+                        streamed = True
+                        yield sse_event("token", {"delta": delta})
+                elif kind == "on_custom_event" and event["name"] == CACHE_HIT_EVENT:
+                    streamed = True
+                    yield sse_event("token", {"delta": event["data"]["response"].content})
+                elif kind == "on_chain_end" and not event["parent_ids"]:
+                    result_text = event["data"]["output"]
+
+            if not streamed:
+                yield sse_event("token", {"delta": result_text})
+            yield sse_event("done", build_rag_response(result_text).model_dump())
+
+        except Exception as e:
+            logger.error(f"Error RAG (stream): {e}")
+            yield sse_event("error", {"detail": str(e)})
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+@router.get("/stats")
+async def rag_stats(collection: str = CollectionParam):
+    """Contadores de la cache de embeddings, de la recuperación (atajos léxicos vs híbrida) y del índice FAISS."""
+    service = await get_collection(collection)
+    return {
+        "embedding_cache": service.embeddings.stats(),
+        "retrieval": service.retrieval_stats(),
+        "index": service.index_stats(),
+    }
+
+@router.get("/collections")
+async def list_collections():
+    """Colecciones en disco: si están cargadas o fijadas, memoria estimada, hits, cargas y descargas."""
+    return await run_in_threadpool(rag_collections.stats)
+
+
+# --- Ingesta incremental ---
+# La ingesta (split + embeddings + escritura a disco) corre en el threadpool
+# para no bloquear el event loop; las búsquedas siguen sirviéndose durante la ingesta.
+
+@router.get("/documents")
+async def list_documents(collection: str = CollectionParam):
+    """Documentos indexados con su hash y cantidad de chunks."""
+    return (await get_collection(collection)).list_documents()
+
+@router.put("/documents", response_model=IngestionResponse, dependencies=[Depends(RateLimit("rag_documents"))])
+async def upsert_documents(request: DocumentUpsertRequest, collection: str = CollectionParam):
+    """
+    Agrega o reemplaza documentos por id. Los que no cambiaron no se re-embeben. Crea la colección si no existe.
+    Cada llamada copia y re-escribe el índice completo (O(tamaño de la colección)): conviene mandar
+    muchos documentos por request; para cargas masivas usar `app.services.bulk_ingest`.
+    """
+    docs = {d.id: Document(page_content=d.content, metadata={"source": d.id, **d.metadata}) for d in request.documents}
+    service = await get_collection(collection, create=True)
+    try:
+        return await run_in_threadpool(service.upsert_documents, docs)
+    except Exception as e:
+        logger.error(f"Error ingesta: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post(
+    "/documents/delete", response_model=IngestionResponse, dependencies=[Depends(RateLimit("rag_documents"))]
+)
+async def delete_documents(request: DocumentDeleteRequest, collection: str = CollectionParam):
+    """Elimina varios documentos (y sus chunks) del índice, con una sola re-escritura del índice."""
+    service = await get_collection(collection)
+    try:
+        return await run_in_threadpool(service.delete_documents, request.ids)
+    except Exception as e:
+        logger.error(f"Error ingesta: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.delete(
+    "/documents/{doc_id}", response_model=IngestionResponse, dependencies=[Depends(RateLimit("rag_documents"))]
+)
+async def delete_document(doc_id: str, collection: str = CollectionParam):
+    """
+    Elimina un documento (y sus chunks) del índice. Como el upsert, re-escribe el índice completo:
+    para borrar varios usar `POST /documents/delete` en un solo request.
+    """
+    service = await get_collection(collection)
+    try:
+        result = await run_in_threadpool(service.delete_documents, [doc_id])
+    except Exception as e:
+        logger.error(f"Error ingesta: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    # La existencia se decide bajo el lock de escritura y con la última versión publicada
+    # (otro worker pudo haberlo creado): el manifest en memoria de este worker puede estar atrasado
+    if doc_id not in result["deleted"]:
+        raise HTTPException(status_code=404, detail="Documento no encontrado.")
+    return result
@@ -1,28 +1,71 @@
 import time
-from typing import Optional, Any, cast
-from fastapi import APIRouter, HTTPException, Request
+import asyncio
+from typing import Optional, Any, AsyncIterator, cast
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
-from langchain_core.messages import HumanMessage
+from langchain_core.messages import BaseMessage, HumanMessage
 from langchain_core.runnables import RunnableConfig
 import pytz
 
-from app.graphs.react_agent import react_graph, memory, ReactState
+from app.graphs.react_agent import react_graph, memory, ReactState, SUMMARY_TAG
+from app.services.checkpointer import UnknownCursor
 from app.core.settings import settings
+from app.services.llm_gateway import CACHE_HIT_EVENT
 from app.schemas.react_schemas import ChatRequest, ChatResponse, TimezoneRequest
-from app.utils.rate_limiter import check_rate_limit
+from app.utils.rate_limiter import RateLimit
+from app.utils.sse import sse_event, SSE_HEADERS
+from app.utils.tracing import annotate
 
 router = APIRouter(prefix="/react", tags=["Ejercicio 3: Agente ReAct"])
 
 
-# --- Endpoints ---
+# --- Helpers ---
+
+def extract_answer_text(message: BaseMessage) -> str:
+    """Texto de la respuesta final del modelo."""
+    # Corrección: El contenido de Gemini viene como una lista de partes.
+    # Extraemos el texto de la primera parte.
+    if isinstance(message.content, list):
+        # Obtenemos el primer elemento
+        first_content = message.content[0]
+    
+        # CORRECCIÓN: Verificamos que sea un diccionario antes de usar .get()
+        if isinstance(first_content, dict):
+            return first_content.get("text", "")
+        # Si es un string dentro de una lista (raro, pero posible)
+        return str(first_content)
+    return message.content
+
+def extract_delta_text(chunk: BaseMessage) -> str:
+    """Texto incremental de un chunk de streaming (puede venir partido en varias partes)."""
+    if isinstance(chunk.content, str):
+        return chunk.content
+    return "".join(
+        part.get("text", "") if isinstance(part, dict) else str(part)
+        for part in chunk.content
+    )
 
-@router.post("/chat", response_model=ChatResponse)
-async def chat_with_agent(request: ChatRequest, req: Request):
-    # 1. Rate Limiting
-    client_ip = req.client.host if req.client else "unknown"
-    check_rate_limit(client_ip)
+def build_metadata(last_message: BaseMessage, start_time: float, thread_id: str) -> dict[str, Any]:
+    """Metadata técnica de la respuesta (misma forma en /chat y /chat/stream)."""
+    execution_time = time.time() - start_time
+    token_usage = last_message.response_metadata.get("token_usage", {})
     
+    return {
+        "execution_time_seconds": round(execution_time, 2),
+        "tokens": token_usage,
+        "model": "gemini-2.5-flash",
+        "thread_id": thread_id
+    }
+
+
+# --- Endpoints ---
+
+# 1. Rate Limiting: lo aplica la dependencia RateLimit (responde 429 + Retry-After)
+@router.post("/chat", response_model=ChatResponse, dependencies=[Depends(RateLimit("react_chat"))])
+async def chat_with_agent(request: ChatRequest):
     start_time = time.time()
+    annotate(react__thread_id=request.thread_id)
     
     try:
         # 2. Invocación del Agente
@@ -33,75 +76,137 @@ async def chat_with_agent(request: ChatRequest, req: Request):
         # y una lista de BaseMessage
         inputs: ReactState = {"messages": [HumanMessage(content=request.question)]}
         
-        # Ejecutamos el grafo
-        response = react_graph.invoke(inputs, config=config)
+        # Ejecutamos el grafo (async: el event loop sigue atendiendo otras requests)
+        response = await react_graph.ainvoke(inputs, config=config)
         result = cast(ReactState, response)
         
         # 3. Extracción de Respuesta
         last_message = result["messages"][-1]
         
-        # Corrección: El contenido de Gemini viene como una lista de partes.
-        # Extraemos el texto de la primera parte.
-        if isinstance(last_message.content, list):
-            # Obtenemos el primer elemento
-            first_content = last_message.content[0]
-        
-            # CORRECCIÓN: Verificamos que sea un diccionario antes de usar .get()
-            if isinstance(first_content, dict):
-                answer_text = first_content.get("text", "")
-            else:
-                # Si es un string dentro de una lista (raro, pero posible)
-                answer_text = str(first_content)
-        else:
-            answer_text = last_message.content
-        
-        # 4. Cálculo de Metadata
-        execution_time = time.time() - start_time
-        token_usage = last_message.response_metadata.get("token_usage", {})
-        
         return {
-            "answer": answer_text,
-            "metadata": {
-                "execution_time_seconds": round(execution_time, 2),
-                "tokens": token_usage,
-                "model": "gemini-2.5-flash",
-                "thread_id": request.thread_id
-            }
+            "answer": extract_answer_text(last_message),
+            "metadata": build_metadata(last_message, start_time, request.thread_id)
         }
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing request: {str(e)}")
 
+@router.post("/chat/stream", dependencies=[Depends(RateLimit("react_chat"))])
+async def chat_with_agent_stream(request: ChatRequest):
+    """
+    Igual que /chat pero por Server-Sent Events:
+    - `tool_start` / `tool_end`: inicio y fin de cada herramienta.
+    - `token`: fragmentos de texto del modelo a medida que se generan.
+    - `done`: respuesta completa + la misma metadata que /chat.
+    - `error`: si algo falla a mitad del stream.
+    """
+    start_time = time.time()
+    annotate(react__thread_id=request.thread_id)
+    config: RunnableConfig = {"configurable": {"thread_id": request.thread_id}}
+    inputs: ReactState = {"messages": [HumanMessage(content=request.question)]}
+
+    async def event_stream() -> AsyncIterator[str]:
+        try:
+            async for event in react_graph.astream_events(inputs, config=config, version="v2"):
+                kind = event["event"]
+
+                # Solo reenviamos los tokens del nodo del agente (no los de otros LLMs internos)
+                # Solo tokens de la respuesta (no los del resumen de contexto, que corre en el mismo nodo)
+                if (
+                    kind == "on_chat_model_stream"
+                    and event["metadata"].get("langgraph_node") == "agent"
+                    and SUMMARY_TAG not in event.get("tags", [])
+                ):
+                    delta = extract_delta_text(event["data"]["chunk"])
+                    if delta:
+                        yield sse_event("token", {"delta": delta})
+
+                # Respuesta servida desde la cache de LLM: no hubo streaming, va entera como un solo token
+                elif (
+                    kind == "on_custom_event"
+                    and event["name"] == CACHE_HIT_EVENT
+                    and event["metadata"].get("langgraph_node") == "agent"
+                ):
+                    response = event["data"]["response"]
+                    delta = extract_delta_text(response) if isinstance(response, BaseMessage) else ""
+                    if delta:
+                        yield sse_event("token", {"delta": delta})
+
+                elif kind == "on_tool_start":
+                    yield sse_event("tool_start", {"tool": event["name"], "input": event["data"].get("input")})
+
+                elif kind == "on_tool_end":
+                    output = event["data"].get("output")
+                    yield sse_event("tool_end", {"tool": event["name"], "output": getattr(output, "content", output)})
+
+            snapshot = await react_graph.aget_state(config)
+            last_message = snapshot.values["messages"][-1]
+            yield sse_event("done", {
+                "answer": extract_answer_text(last_message),
+                "metadata": build_metadata(last_message, start_time, request.thread_id),
+            })
+
+        except Exception as e:
+            yield sse_event("error", {"detail": f"Error processing request: {str(e)}"})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS,
+    )
+
 @router.post("/config/timezone")
 async def set_agent_timezone(config: TimezoneRequest):
     """Cambia la zona horaria para la herramienta datetime_info."""
     if config.timezone not in pytz.all_timezones:
         raise HTTPException(status_code=400, detail="Zona horaria inválida. Use formato 'Continent/City'")
     
-    settings.set_timezone(config.timezone)
+    # Escritura en el state store (SQLite con varios workers): fuera del event loop
+    await asyncio.to_thread(settings.set_timezone, config.timezone)
     return {"status": "success", "current_timezone": config.timezone}
 
 @router.get("/context/{thread_id}", response_model=list[dict])
-async def get_context(thread_id: str):
-    """Obtiene el historial de mensajes para un thread_id específico."""
+async def get_context(
+    thread_id: str,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=1000, description="Máximo de mensajes (default: todos)"),
+    before: Optional[str] = Query(None, description="Id de mensaje: devuelve los anteriores a él"),
+    after: Optional[str] = Query(None, description="Id de mensaje: devuelve los posteriores (solo lo nuevo)"),
+    types: Optional[list[str]] = Query(None, description="Tipos a incluir (ej: human, ai). Sin 'tool' se omiten los pasos de herramientas"),
+    if_none_match: Optional[str] = Header(None),
+):
+    """
+    Historial de mensajes de un thread, paginado por id de mensaje y en orden cronológico.
+    - Sin parámetros: el historial completo. Con `limit`: los últimos `limit` mensajes.
+    - `before=<id>`: página anterior. `after=<id>`: solo los mensajes nuevos desde ese id.
+    - Headers: `X-Prev-Cursor` (usar como `before`, si hay más viejos), `X-Next-Cursor` (usar como
+      `after` para pedir lo nuevo) y `ETag` (con `If-None-Match` responde 304 si el thread no cambió).
+    """
     try:
-        # 1. Definimos config con tipado para que Pylance sea feliz
-        config: RunnableConfig = {"configurable": {"thread_id": thread_id}}
-        
-        # 2. Usamos el método oficial del grafo para obtener el 'Snapshot' del estado
-        snapshot = react_graph.get_state(config)
-        
-        # 3. Accedemos a .values (que es tu ReactState dict)
-        if not snapshot.values:
+        # La versión sale de un índice: un 304 no deserializa ni lee mensajes
+        version = await asyncio.to_thread(memory.thread_version, thread_id)
+        if version is None:
             raise HTTPException(status_code=404, detail="No se encontró contexto para este ID.")
-        
-        # 4. Iteramos sobre snapshot.values["messages"]
-        history = [
-            {"type": msg.type, "content": msg.content} 
-            for msg in snapshot.values.get("messages", [])
-        ]
-        return history
 
+        etag = f'W/"{version}"'
+        if if_none_match and etag in [tag.strip() for tag in if_none_match.split(",")]:
+            return Response(status_code=304, headers={"ETag": etag})
+
+        page = await asyncio.to_thread(
+            memory.list_messages, thread_id, limit=limit, before=before, after=after, types=types
+        )
+
+        response.headers["ETag"] = etag
+        if page.has_older and page.messages:
+            response.headers["X-Prev-Cursor"] = page.messages[0]["id"]
+        next_cursor = page.messages[-1]["id"] if page.messages else after
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = next_cursor
+        response.headers["X-Has-More-After"] = str(page.has_newer).lower()
+        return page.messages
+
+    except UnknownCursor as e:
+        raise HTTPException(status_code=400, detail=f"Cursor desconocido para este thread: {e}")
     except Exception as e:
         if isinstance(e, HTTPException):
             raise e
@@ -111,21 +216,11 @@ async def get_context(thread_id: str):
 async def reset_context(thread_id: str):
     """Reinicia la conversación borrando la memoria del thread."""
     try:
-        # CORRECCIÓN: MemorySaver es una clase simple, no tiene 'get_checkpointer'.
-        # La forma de borrar en esta clase específica es accediendo a su .storage
-        
-        # Buscamos todas las claves en memoria que pertenezcan a este thread_id
-        keys_to_delete = [
-            k for k in memory.storage.keys() 
-            if k == thread_id or (isinstance(k, tuple) and k[0] == thread_id)
-        ]
-        
-        if not keys_to_delete:
+        # El checkpointer indexa por thread_id: no recorremos los datos de otros threads
+        if not await asyncio.to_thread(memory.has_thread, thread_id):
             return {"status": "warning", "message": "No se encontró contexto para borrar."}
 
-        # Borramos físicamente del diccionario en memoria
-        for k in keys_to_delete:
-            del memory.storage[k]
+        await memory.adelete_thread(thread_id)
 
         return {"status": "success", "message": f"Contexto para '{thread_id}' eliminado."}
         
@@ -1,10 +1,17 @@
-from typing import TypedDict, Literal, Optional
+from typing import TypedDict, Literal, Optional, List
 from pydantic import BaseModel, Field
 
 # Modelo de entrada simple
 class AgentInput(BaseModel):
     text: str = Field(..., description="Descripción del incidente reportado por el usuario")
 
+# Entrada para el triaje masivo de backlogs
+class BatchAgentInput(BaseModel):
+    tickets: List[AgentInput] = Field(..., description="Tickets a clasificar")
+    max_concurrency: Optional[int] = Field(
+        default=None, ge=1, description="Tickets en paralelo (tope: BATCH_MAX_CONCURRENCY)"
+    )
+
 # --- 1. Lo que Gemini nos va a responder (Structured Output) ---
 class ClassificationOutput(BaseModel):
     """Estructura estricta para la clasificación del incidente."""
@@ -23,4 +30,5 @@ class AgentState(TypedDict):
     input_text: str          # El mensaje original del usuario
     classification: str      # La categoría detectada ('technical-issue', etc.)
     reason: str              # El motivo detectado
-    final_output: str        # La respuesta final que mostraremos al usuario
\ No newline at end of file
+    final_output: str        # La respuesta final que mostraremos al usuario
+    decision_source: str     # Quién clasificó: 'fast-path' (local) o 'llm'
\ No newline at end of file
@@ -1,10 +1,33 @@
 from pydantic import BaseModel, Field
-from typing import List
+from typing import List, Dict, Any
+
+# Nombre de colección RAG: también es el nombre de su carpeta en disco
+COLLECTION_NAME_PATTERN = r"^[a-z0-9][a-z0-9_-]{0,63}$"
 
 class RAGQueryRequest(BaseModel):
     question: str = Field(..., description="La pregunta técnica del usuario")
+    collection: str = Field(
+        "default", pattern=COLLECTION_NAME_PATTERN, description="Base de conocimiento a consultar (ej: payments)"
+    )
 
 class RAGResponse(BaseModel):
     answer: str = Field(..., description="Respuesta generada por el LLM o mensaje de fallback")
     context_found: bool = Field(..., description="Indica si se encontró información relevante en los docs")
-    sources: List[str] = Field(default=[], description="Fuentes utilizadas")
\ No newline at end of file
+    sources: List[str] = Field(default=[], description="Fuentes utilizadas")
+
+class DocumentIn(BaseModel):
+    id: str = Field(..., description="Identificador estable del documento (ej: nombre del manual)")
+    content: str = Field(..., description="Texto completo del documento, sin fragmentar")
+    metadata: Dict[str, Any] = Field(default={}, description="Metadata libre (source, section, etc.)")
+
+class DocumentUpsertRequest(BaseModel):
+    documents: List[DocumentIn] = Field(..., description="Documentos a agregar o reemplazar")
+
+class DocumentDeleteRequest(BaseModel):
+    ids: List[str] = Field(..., description="Ids de los documentos a eliminar")
+
+class IngestionResponse(BaseModel):
+    upserted: List[str] = Field(default=[], description="Documentos re-indexados")
+    unchanged: List[str] = Field(default=[], description="Documentos sin cambios (no se re-embebieron)")
+    deleted: List[str] = Field(default=[], description="Documentos eliminados del índice")
+    chunks_added: int = Field(default=0, description="Chunks nuevos embebidos")
@@ -1,4 +1,4 @@
-from typing import TypedDict, Annotated, Sequence, Any
+from typing import TypedDict, Annotated, Sequence, Any, NotRequired
 from pydantic import BaseModel, Field
 from langchain_core.messages import BaseMessage
 from langgraph.graph.message import add_messages
@@ -8,6 +8,10 @@ from langgraph.graph.message import add_messages
 class ReactState(TypedDict):
     # 'add_messages' es vital: le dice al grafo "no sobrescribas la lista, agrega el nuevo mensaje al final"
     messages: Annotated[Sequence[BaseMessage], add_messages]
+    # Resumen acumulado de la parte de la conversación que ya salió de la ventana de contexto
+    summary: NotRequired[str]
+    # Id del último mensaje incorporado al resumen (marca dónde empieza la ventana)
+    summary_until: NotRequired[str]
 
 # --- 2. Modelos de la API (External Contract) ---
 # Esto es lo que valida FastAPI
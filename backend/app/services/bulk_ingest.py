@@ -0,0 +1,321 @@
+"""
+Ingesta masiva de directorios (manuales en markdown, texto plano o docx) al índice RAG.
+
+Pipeline de generadores, con memoria acotada sin importar el tamaño del corpus:
+
+    archivos -> lectura + normalización -> split (pool de procesos) -> slabs
+             -> dedupe por hash -> embeddings (lotes con tope de requests en vuelo)
+             -> append al índice -> checkpoint periódico
+
+Uso (desde backend/):
+    python -m app.services.bulk_ingest ./manuales
+    python -m app.services.bulk_ingest ./manuales --workers 8 --slab-chunks 4096 --in-flight 4
+"""
+import os
+import re
+import sys
+import time
+import hashlib
+import threading
+import logging
+import argparse
+import unicodedata
+import zipfile
+import multiprocessing
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator, Optional, TypeVar
+from xml.etree import ElementTree
+
+from langchain_core.documents import Document
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+SUPPORTED_EXTENSIONS = (".md", ".markdown", ".txt", ".rst", ".docx")
+WORD_NS = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+CHECKPOINT_KEY = "bulk_ingest:{root}"
+
+
+# --- Etapa 1: archivos ---
+
+def iter_files(root: str, extensions: tuple[str, ...], relative: str = "") -> Iterator[str]:
+    """
+    Rutas relativas (con '/') en orden lexicográfico estable, recorriendo el árbol de a un
+    directorio por vez. Ese orden es lo que permite retomar una corrida cortada comparando rutas.
+    """
+    with os.scandir(os.path.join(root, relative)) as it:
+        # Un directorio 'x' se ordena como 'x/' para que el recorrido coincida con el orden de las rutas
+        entries = sorted(it, key=lambda e: e.name + ("/" if e.is_dir() else ""))
+    for entry in entries:
+        if entry.name.startswith("."):
+            continue
+        relpath = f"{relative}{entry.name}"
+        if entry.is_dir():
+            yield from iter_files(root, extensions, f"{relpath}/")
+        elif entry.name.lower().endswith(extensions):
+            yield relpath
+
+
+def read_docx(path: str) -> str:
+    """Texto de un .docx sin dependencias extra: párrafos de word/document.xml."""
+    with zipfile.ZipFile(path) as archive:
+        root = ElementTree.fromstring(archive.read("word/document.xml"))
+    paragraphs = (
+        "".join(node.text or "" for node in paragraph.iter(f"{WORD_NS}t"))
+        for paragraph in root.iter(f"{WORD_NS}p")
+    )
+    return "\n".join(paragraphs)
+
+
+def normalize_text(text: str) -> str:
+    """Unicode NFC, saltos de línea uniformes, sin caracteres de control ni espacios sobrantes."""
+    text = unicodedata.normalize("NFC", text).replace("\r\n", "\n").replace("\r", "\n")
+    text = "".join(c for c in text if c in "\n\t" or unicodedata.category(c)[0] != "C")
+    text = re.sub(r"[ \t]+\n", "\n", text)
+    return re.sub(r"\n{3,}", "\n\n", text).strip()
+
+
+def read_documents(root: str, paths: Iterable[str], prefix: str) -> Iterator[tuple[str, Document]]:
+    for relpath in paths:
+        full_path = os.path.join(root, relpath)
+        try:
+            if relpath.lower().endswith(".docx"):
+                raw = read_docx(full_path)
+            else:
+                with open(full_path, encoding="utf-8", errors="replace") as f:
+                    raw = f.read()
+        except (OSError, zipfile.BadZipFile, KeyError, ElementTree.ParseError) as e:
+            logger.warning(f"⚠️ No se pudo leer '{relpath}': {e}")
+            continue
+
+        text = normalize_text(raw)
+        if not text:
+            continue
+        doc_id = f"{prefix}{relpath}"
+        yield doc_id, Document(page_content=text, metadata={"source": doc_id})
+
+
+# --- Etapa 2: split en un pool de procesos ---
+
+_worker_splitter = None
+
+
+def _init_split_worker(chunk_size: int, chunk_overlap: int):
+    global _worker_splitter
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+    _worker_splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+
+    # Si el proceso principal muere de golpe (kill -9, OOM), los workers no quedan huérfanos
+    parent = os.getppid()
+
+    def watch_parent():
+        while os.getppid() == parent:
+            time.sleep(1)
+        os._exit(1)
+
+    threading.Thread(target=watch_parent, daemon=True).start()
+
+
+def _split_worker(item: tuple[str, Document]) -> tuple[str, Document, list[Document]]:
+    doc_id, doc = item
+    chunks = _worker_splitter.split_documents([doc])  # type: ignore[union-attr]
+    for chunk in chunks:
+        chunk.metadata["doc_id"] = doc_id
+    return doc_id, doc, chunks
+
+
+def bounded_map(
+    executor: ProcessPoolExecutor | ThreadPoolExecutor, fn: Callable[[T], R], items: Iterable[T], max_in_flight: int
+) -> Iterator[R]:
+    """
+    Como executor.map pero con contrapresión: nunca hay más de `max_in_flight` tareas
+    pendientes (executor.map consume todo el iterable de entrada de golpe).
+    Devuelve los resultados en el orden de entrada.
+    """
+    pending: deque[Future] = deque()
+    for item in items:
+        pending.append(executor.submit(fn, item))
+        if len(pending) >= max_in_flight:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+# --- Etapa 3: slabs, dedupe y embeddings ---
+
+def iter_slabs(
+    split_docs: Iterable[tuple[str, Document, list[Document]]], slab_chunks: int
+) -> Iterator[list[tuple[str, Document, list[Document]]]]:
+    """Agrupa documentos hasta juntar ~`slab_chunks` chunks (un documento nunca se parte entre slabs)."""
+    slab: list[tuple[str, Document, list[Document]]] = []
+    size = 0
+    for item in split_docs:
+        slab.append(item)
+        size += len(item[2])
+        if size >= slab_chunks:
+            yield slab
+            slab, size = [], 0
+    if slab:
+        yield slab
+
+
+def content_hash(text: str) -> bytes:
+    return hashlib.sha1(text.encode()).digest()
+
+
+class BulkIngestor:
+    def __init__(
+        self,
+        root: str,
+        prefix: str = "",
+        extensions: tuple[str, ...] = SUPPORTED_EXTENSIONS,
+        workers: int = max(1, (os.cpu_count() or 2) - 1),
+        slab_chunks: int = 2048,
+        in_flight: int = 4,
+        checkpoint_chunks: int = 50_000,
+        resume: bool = True,
+        collection: str = "default",
+    ):
+        # Import diferido: los procesos del pool no deben inicializar el servicio RAG
+        from app.services.rag import CHUNK_SIZE, CHUNK_OVERLAP, EMBED_BATCH_SIZE
+        from app.services.rag_collections import rag_collections
+
+        self.rag = rag_collections.get(collection, create=True)
+        self.chunk_size, self.chunk_overlap, self.batch_size = CHUNK_SIZE, CHUNK_OVERLAP, EMBED_BATCH_SIZE
+        self.root = os.path.abspath(root)
+        self.prefix = prefix
+        self.extensions = extensions
+        self.workers = workers
+        self.slab_chunks = slab_chunks
+        self.in_flight = in_flight
+        self.checkpoint_chunks = checkpoint_chunks
+        self.resume = resume
+        self.stats = {"files": 0, "unchanged": 0, "chunks": 0, "duplicate_chunks": 0, "embedded": 0, "slabs": 0}
+
+    @property
+    def checkpoint_key(self) -> str:
+        return CHECKPOINT_KEY.format(root=self.root)
+
+    def _pending_paths(self) -> Iterator[str]:
+        last_done = self.rag.document_store.get_meta(self.checkpoint_key) if self.resume else None
+        if last_done:
+            logger.info(f"⏩ Retomando después de '{last_done}'.")
+        for relpath in iter_files(self.root, self.extensions):
+            if last_done is None or relpath > last_done:
+                yield relpath
+
+    def _changed_documents(self, docs: Iterable[tuple[str, Document]]) -> Iterator[tuple[str, Document]]:
+        """Descarta antes del split los documentos que ya están indexados con el mismo contenido."""
+        from app.services.document_store import document_hash
+
+        for doc_id, doc in docs:
+            self.stats["files"] += 1
+            indexed = self.rag.manifest.get("documents", {}).get(doc_id)
+            if indexed and indexed["hash"] == document_hash(doc):
+                self.stats["unchanged"] += 1
+                continue
+            yield doc_id, doc
+
+    def _embed_slab(self, slab: list[tuple[str, Document, list[Document]]], embed_pool: ThreadPoolExecutor) -> list:
+        """Embebe cada texto distinto una sola vez, en lotes con como máximo `in_flight` requests a la vez."""
+        unique: dict[bytes, str] = {}
+        for _, _, chunks in slab:
+            for chunk in chunks:
+                unique.setdefault(content_hash(chunk.page_content), chunk.page_content)
+        total = sum(len(chunks) for _, _, chunks in slab)
+        self.stats["chunks"] += total
+        self.stats["duplicate_chunks"] += total - len(unique)
+
+        keys = list(unique)
+        batches = [keys[i:i + self.batch_size] for i in range(0, len(keys), self.batch_size)]
+        vectors: dict[bytes, list[float]] = {}
+        embed = self.rag.embeddings.embed_documents
+        for batch, batch_vectors in zip(
+            batches, bounded_map(embed_pool, lambda b: embed([unique[k] for k in b]), batches, self.in_flight)
+        ):
+            vectors.update(zip(batch, batch_vectors))
+        self.stats["embedded"] += len(keys)
+
+        return [
+            (doc_id, doc, chunks, [vectors[content_hash(c.page_content)] for c in chunks])
+            for doc_id, doc, chunks in slab
+        ]
+
+    def run(self) -> dict:
+        start = time.perf_counter()
+        docs = self._changed_documents(read_documents(self.root, self._pending_paths(), self.prefix))
+
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(
+            self.workers, mp_context=context, initializer=_init_split_worker,
+            initargs=(self.chunk_size, self.chunk_overlap),
+        ) as split_pool, ThreadPoolExecutor(self.in_flight) as embed_pool, self.rag.bulk_session() as session:
+            split_docs = bounded_map(split_pool, _split_worker, docs, self.workers * 4)
+            since_checkpoint = 0
+            last_doc: Optional[str] = None
+
+            for slab in iter_slabs(split_docs, self.slab_chunks):
+                session.add_slab(self._embed_slab(slab, embed_pool))
+                self.stats["slabs"] += 1
+                since_checkpoint += sum(len(chunks) for _, _, chunks in slab)
+                last_doc = slab[-1][0]
+
+                if since_checkpoint >= self.checkpoint_chunks:
+                    session.checkpoint()
+                    self._save_progress(last_doc)
+                    since_checkpoint = 0
+                    logger.info(f"📌 Checkpoint: {self.stats}")
+
+        # bulk_session ya publicó el índice final
+        self._save_progress(None)
+        self.stats["seconds"] = round(time.perf_counter() - start, 2)
+        self.stats["index_vectors"] = self.rag.vectorstore.index.ntotal if self.rag.vectorstore else 0
+        return self.stats
+
+    def _save_progress(self, last_doc: Optional[str]):
+        """Marca el último archivo persistido; al terminar se limpia para que la próxima corrida revise todo."""
+        if last_doc is None:
+            self.rag.document_store.set_meta(self.checkpoint_key, "")
+            return
+        self.rag.document_store.set_meta(self.checkpoint_key, last_doc[len(self.prefix):])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingesta masiva de un directorio de manuales al índice RAG.")
+    parser.add_argument("root", help="Directorio con los documentos")
+    parser.add_argument("--prefix", default="", help="Prefijo para los ids de documento (ej: 'runbooks/')")
+    parser.add_argument("--ext", default=",".join(SUPPORTED_EXTENSIONS), help="Extensiones a incluir")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) - 1), help="Procesos para el split")
+    parser.add_argument("--slab-chunks", type=int, default=2048, help="Chunks por slab de embeddings/append")
+    parser.add_argument("--in-flight", type=int, default=4, help="Requests de embeddings simultáneas")
+    parser.add_argument("--checkpoint-chunks", type=int, default=50_000, help="Persistir el índice cada N chunks")
+    parser.add_argument("--no-resume", action="store_true", help="Ignorar el checkpoint de una corrida anterior")
+    parser.add_argument("--collection", default="default", help="Colección destino (se crea si no existe)")
+    args = parser.parse_args()
+
+    from app.core.logging_config import configure_logging
+    configure_logging()
+
+    if not os.path.isdir(args.root):
+        parser.error(f"No existe el directorio: {args.root}")
+
+    ingestor = BulkIngestor(
+        args.root,
+        prefix=args.prefix,
+        extensions=tuple(e if e.startswith(".") else f".{e}" for e in args.ext.split(",") if e),
+        workers=args.workers,
+        slab_chunks=args.slab_chunks,
+        in_flight=args.in_flight,
+        checkpoint_chunks=args.checkpoint_chunks,
+        resume=not args.no_resume,
+        collection=args.collection,
+    )
+    stats = ingestor.run()
+    logger.info(f"✅ Ingesta masiva terminada: {stats}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,508 @@
+import os
+import json
+import time
+import random
+import socket
+import asyncio
+import logging
+import sqlite3
+import threading
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Iterator, List, Optional, Sequence
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+)
+
+from app.core.state_store import StateStore
+
+logger = logging.getLogger(__name__)
+
+# Canal del estado del agente con el historial (se indexa aparte para paginarlo)
+MESSAGES_CHANNEL = "messages"
+
+
+class UnknownCursor(ValueError):
+    """El id de mensaje usado como cursor no existe en el thread."""
+
+
+@dataclass
+class MessagePage:
+    messages: list[dict[str, Any]]
+    # Si quedan mensajes (que pasen el filtro) antes del primero / después del último de la página
+    has_older: bool
+    has_newer: bool
+
+
+class SqliteCheckpointer(BaseCheckpointSaver[str]):
+    """
+    Checkpointer de LangGraph persistido en un archivo SQLite local (modo WAL).
+
+    - Las claves primarias empiezan por `thread_id`, así que leer o borrar un thread
+      es una búsqueda en el B-tree (O(log n)) y nunca toca los datos de otros threads.
+    - Solo se conservan los últimos `keep_per_thread` checkpoints de cada thread
+      (el agente siempre reanuda desde el último).
+    - Como en MemorySaver, los valores de los canales se guardan aparte, uno por versión: cada
+      checkpoint solo escribe los canales que cambiaron (`new_versions`) y los checkpoints
+      conservados comparten los que no. La fila del checkpoint no trae `channel_values`.
+    - Un hilo en segundo plano expira los threads inactivos (TTL) y aplica un tope de threads.
+    - El archivo se comparte entre los workers del nodo (WAL + busy timeout). Con `lease_store`,
+      el barrido corre en un solo worker por intervalo en vez de en todos a la vez.
+    - Los mensajes del canal `messages` se copian además a una tabla propia, una fila por mensaje
+      (solo los nuevos en cada checkpoint): el historial se pagina por id sin deserializar el estado.
+    """
+
+    def __init__(self, path: str, *, ttl_seconds: Optional[float], max_threads: Optional[int],
+                 keep_per_thread: int = 3, sweep_interval: float = 300.0, lease_store: Optional[StateStore] = None):
+        super().__init__()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.ttl_seconds = ttl_seconds
+        self.max_threads = max_threads
+        self.keep_per_thread = keep_per_thread
+        self.sweep_interval = sweep_interval
+        self.lease_store = lease_store
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS checkpoints (
+                thread_id TEXT NOT NULL,
+                checkpoint_ns TEXT NOT NULL DEFAULT '',
+                checkpoint_id TEXT NOT NULL,
+                parent_checkpoint_id TEXT,
+                type TEXT,
+                checkpoint BLOB,
+                metadata_type TEXT,
+                metadata BLOB,
+                PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+            );
+            CREATE TABLE IF NOT EXISTS blobs (
+                thread_id TEXT NOT NULL,
+                checkpoint_ns TEXT NOT NULL DEFAULT '',
+                channel TEXT NOT NULL,
+                version TEXT NOT NULL,
+                type TEXT NOT NULL,
+                blob BLOB,
+                PRIMARY KEY (thread_id, checkpoint_ns, channel, version)
+            );
+            CREATE TABLE IF NOT EXISTS writes (
+                thread_id TEXT NOT NULL,
+                checkpoint_ns TEXT NOT NULL DEFAULT '',
+                checkpoint_id TEXT NOT NULL,
+                task_id TEXT NOT NULL,
+                idx INTEGER NOT NULL,
+                channel TEXT NOT NULL,
+                type TEXT,
+                value BLOB,
+                task_path TEXT NOT NULL DEFAULT '',
+                PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+            );
+            CREATE TABLE IF NOT EXISTS threads (
+                thread_id TEXT PRIMARY KEY,
+                updated_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_threads_updated_at ON threads(updated_at);
+            CREATE TABLE IF NOT EXISTS messages (
+                thread_id TEXT NOT NULL,
+                seq INTEGER NOT NULL,
+                message_id TEXT NOT NULL,
+                type TEXT NOT NULL,
+                has_tool_calls INTEGER NOT NULL,
+                content TEXT NOT NULL,
+                PRIMARY KEY (thread_id, seq)
+            );
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_messages_id ON messages(thread_id, message_id);
+            """
+        )
+        self._conn.commit()
+        self._sweeper: Optional[threading.Thread] = None
+
+    # --- Lectura ---
+
+    def _load_checkpoint(self, thread_id: str, checkpoint_ns: str, typed_checkpoint: tuple[str, bytes]) -> Checkpoint:
+        """Checkpoint con sus `channel_values` armados desde los blobs de cada canal en su versión."""
+        checkpoint = self.serde.loads_typed(typed_checkpoint)
+        # Checkpoints guardados antes de separar los canales traen los valores adentro
+        channel_values = dict(checkpoint.get("channel_values") or {})
+        for channel, version in checkpoint["channel_versions"].items():
+            row = self._conn.execute(
+                "SELECT type, blob FROM blobs "
+                "WHERE thread_id = ? AND checkpoint_ns = ? AND channel = ? AND version = ?",
+                (thread_id, checkpoint_ns, channel, str(version)),
+            ).fetchone()
+            if row and row[0] != "empty":
+                channel_values[channel] = self.serde.loads_typed(row)
+        return {**checkpoint, "channel_values": channel_values}
+
+    def _to_tuple(self, thread_id: str, checkpoint_ns: str, row: tuple) -> CheckpointTuple:
+        checkpoint_id, parent_id, type_, checkpoint, metadata_type, metadata = row
+        writes = self._conn.execute(
+            "SELECT task_id, channel, type, value FROM writes "
+            "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ? ORDER BY task_id, idx",
+            (thread_id, checkpoint_ns, checkpoint_id),
+        ).fetchall()
+        return CheckpointTuple(
+            config={"configurable": {
+                "thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint_id,
+            }},
+            checkpoint=self._load_checkpoint(thread_id, checkpoint_ns, (type_, checkpoint)),
+            metadata=self.serde.loads_typed((metadata_type, metadata)),
+            parent_config=(
+                {"configurable": {
+                    "thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": parent_id,
+                }}
+                if parent_id else None
+            ),
+            pending_writes=[
+                (task_id, channel, self.serde.loads_typed((w_type, value)))
+                for task_id, channel, w_type, value in writes
+            ],
+        )
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        thread_id: str = config["configurable"]["thread_id"]
+        checkpoint_ns: str = config["configurable"].get("checkpoint_ns", "")
+        columns = "checkpoint_id, parent_checkpoint_id, type, checkpoint, metadata_type, metadata"
+
+        with self._lock:
+            if checkpoint_id := get_checkpoint_id(config):
+                row = self._conn.execute(
+                    f"SELECT {columns} FROM checkpoints "
+                    "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                    (thread_id, checkpoint_ns, checkpoint_id),
+                ).fetchone()
+            else:
+                # Los ids de checkpoint son ordenables en el tiempo: el mayor es el último
+                row = self._conn.execute(
+                    f"SELECT {columns} FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? "
+                    "ORDER BY checkpoint_id DESC LIMIT 1",
+                    (thread_id, checkpoint_ns),
+                ).fetchone()
+            return self._to_tuple(thread_id, checkpoint_ns, row) if row else None
+
+    def list(self, config: Optional[RunnableConfig], *, filter: Optional[dict[str, Any]] = None,
+             before: Optional[RunnableConfig] = None, limit: Optional[int] = None) -> Iterator[CheckpointTuple]:
+        query = (
+            "SELECT thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, type, checkpoint, "
+            "metadata_type, metadata FROM checkpoints"
+        )
+        clauses, params = [], []
+        if config:
+            clauses.append("thread_id = ?")
+            params.append(config["configurable"]["thread_id"])
+            if (ns := config["configurable"].get("checkpoint_ns")) is not None:
+                clauses.append("checkpoint_ns = ?")
+                params.append(ns)
+            if checkpoint_id := get_checkpoint_id(config):
+                clauses.append("checkpoint_id = ?")
+                params.append(checkpoint_id)
+        if before and (before_id := get_checkpoint_id(before)):
+            clauses.append("checkpoint_id < ?")
+            params.append(before_id)
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+        query += " ORDER BY checkpoint_id DESC"
+
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+            results = []
+            for thread_id, checkpoint_ns, *rest in rows:
+                item = self._to_tuple(thread_id, checkpoint_ns, tuple(rest))
+                if filter and not all(item.metadata.get(k) == v for k, v in filter.items()):
+                    continue
+                results.append(item)
+                if limit is not None and len(results) >= limit:
+                    break
+        yield from results
+
+    def has_thread(self, thread_id: str) -> bool:
+        with self._lock:
+            row = self._conn.execute("SELECT 1 FROM threads WHERE thread_id = ?", (thread_id,)).fetchone()
+        return row is not None
+
+    # --- Escritura ---
+
+    def put(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+            new_versions: ChannelVersions) -> RunnableConfig:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        channel_values = checkpoint["channel_values"]
+        # Solo se serializan los canales que cambiaron en este paso (el resto ya está en `blobs`)
+        blobs = [
+            (thread_id, checkpoint_ns, channel, str(version),
+             *(self.serde.dumps_typed(channel_values[channel]) if channel in channel_values else ("empty", None)))
+            for channel, version in new_versions.items()
+        ]
+        type_, blob = self.serde.dumps_typed({**checkpoint, "channel_values": {}})
+        metadata_type, metadata_blob = self.serde.dumps_typed(get_checkpoint_metadata(config, metadata))
+
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO blobs VALUES (?, ?, ?, ?, ?, ?)", blobs)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (thread_id, checkpoint_ns, checkpoint["id"], config["configurable"].get("checkpoint_id"),
+                 type_, blob, metadata_type, metadata_blob),
+            )
+            self._conn.execute("INSERT OR REPLACE INTO threads VALUES (?, ?)", (thread_id, time.time()))
+            if checkpoint_ns == "" and MESSAGES_CHANNEL in new_versions:
+                self._log_messages(thread_id, channel_values.get(MESSAGES_CHANNEL, []))
+            self._prune(thread_id, checkpoint_ns)
+            self._conn.commit()
+
+        return {"configurable": {
+            "thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint["id"],
+        }}
+
+    def put_writes(self, config: RunnableConfig, writes: Sequence[tuple[str, Any]], task_id: str,
+                   task_path: str = "") -> None:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+
+        # Writes especiales (índice negativo: errores, interrupts) reemplazan; las normales no se duplican
+        special, regular = [], []
+        for idx, (channel, value) in enumerate(writes):
+            type_, blob = self.serde.dumps_typed(value)
+            write_idx = WRITES_IDX_MAP.get(channel, idx)
+            row = (thread_id, checkpoint_ns, checkpoint_id, task_id, write_idx, channel, type_, blob, task_path)
+            (special if write_idx < 0 else regular).append(row)
+
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO writes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", special)
+            self._conn.executemany("INSERT OR IGNORE INTO writes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", regular)
+            self._conn.commit()
+
+    def _prune(self, thread_id: str, checkpoint_ns: str):
+        """
+        Borra los checkpoints (y sus writes) más viejos que los últimos `keep_per_thread`, y las
+        versiones de cada canal anteriores a la que usa el checkpoint conservado más viejo
+        (las versiones crecen con cada paso, así que ningún checkpoint conservado las referencia).
+        """
+        row = self._conn.execute(
+            "SELECT checkpoint_id, type, checkpoint FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? "
+            "ORDER BY checkpoint_id DESC LIMIT 1 OFFSET ?",
+            (thread_id, checkpoint_ns, self.keep_per_thread - 1),
+        ).fetchone()
+        if row is None:
+            return
+        oldest_id, type_, checkpoint = row
+        for table in ("checkpoints", "writes"):
+            self._conn.execute(
+                f"DELETE FROM {table} WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id < ?",
+                (thread_id, checkpoint_ns, oldest_id),
+            )
+        # La fila ya no trae los valores de los canales: deserializarla es barato
+        oldest_versions = self.serde.loads_typed((type_, checkpoint))["channel_versions"]
+        self._conn.executemany(
+            "DELETE FROM blobs WHERE thread_id = ? AND checkpoint_ns = ? AND channel = ? AND version < ?",
+            [(thread_id, checkpoint_ns, channel, str(version)) for channel, version in oldest_versions.items()],
+        )
+
+    def _log_messages(self, thread_id: str, messages: Sequence[Any]):
+        """
+        Agrega al índice de mensajes los que todavía no están (add_messages solo agrega al final).
+        Si la lista cambió por otra vía (mensajes borrados o reemplazados), se reconstruye entera.
+        """
+        last = self._conn.execute(
+            "SELECT seq, message_id FROM messages WHERE thread_id = ? ORDER BY seq DESC LIMIT 1", (thread_id,)
+        ).fetchone()
+        stored = last[0] + 1 if last else 0
+        if last and (len(messages) < stored or messages[stored - 1].id != last[1]):
+            self._conn.execute("DELETE FROM messages WHERE thread_id = ?", (thread_id,))
+            stored = 0
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO messages VALUES (?, ?, ?, ?, ?, ?)",
+            [
+                (thread_id, seq, m.id, m.type, int(bool(getattr(m, "tool_calls", None))),
+                 json.dumps(m.content, ensure_ascii=False))
+                for seq, m in enumerate(messages[stored:], start=stored)
+            ],
+        )
+
+    def _delete_threads(self, thread_ids: List[str]):
+        params = [(t,) for t in thread_ids]
+        for table in ("checkpoints", "blobs", "writes", "threads", "messages"):
+            self._conn.executemany(f"DELETE FROM {table} WHERE thread_id = ?", params)
+
+    def delete_thread(self, thread_id: str) -> None:
+        with self._lock:
+            self._delete_threads([thread_id])
+            self._conn.commit()
+
+    def expire(self) -> int:
+        """Borra threads inactivos (TTL) y, si sobran, los menos recientes. Devuelve cuántos borró."""
+        with self._lock:
+            expired: List[str] = []
+            if self.ttl_seconds is not None:
+                expired += [r[0] for r in self._conn.execute(
+                    "SELECT thread_id FROM threads WHERE updated_at < ?", (time.time() - self.ttl_seconds,)
+                )]
+            if self.max_threads is not None:
+                (count,) = self._conn.execute("SELECT COUNT(*) FROM threads").fetchone()
+                overflow = count - len(expired) - self.max_threads
+                if overflow > 0:
+                    expired += [r[0] for r in self._conn.execute(
+                        "SELECT thread_id FROM threads WHERE thread_id NOT IN (SELECT value FROM json_each(?)) "
+                        "ORDER BY updated_at LIMIT ?",
+                        (json.dumps(expired), overflow),
+                    )]
+            if expired:
+                self._delete_threads(expired)
+                self._conn.commit()
+        return len(expired)
+
+    def start_expiry_worker(self):
+        """Lanza (una sola vez) el hilo que expira threads cada `sweep_interval` segundos."""
+        if self._sweeper is not None:
+            return
+
+        owner = f"{socket.gethostname()}:{os.getpid()}"
+
+        def loop():
+            while True:
+                time.sleep(self.sweep_interval)
+                try:
+                    if self.lease_store is not None and not self.lease_store.try_acquire_lease(
+                        "checkpoint-expiry", owner, self.sweep_interval
+                    ):
+                        continue
+                    if removed := self.expire():
+                        logger.info(f"🧹 Checkpointer: {removed} threads expirados.")
+                except Exception as e:
+                    logger.error(f"🔥 Error expirando threads: {e}")
+
+        self._sweeper = threading.Thread(target=loop, name="checkpoint-expiry", daemon=True)
+        self._sweeper.start()
+
+    # --- Historial paginado ---
+
+    def thread_version(self, thread_id: str) -> Optional[str]:
+        """Id del último checkpoint del thread (cambia con cada paso): sirve de ETag. None si no existe."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT checkpoint_id FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = '' "
+                "ORDER BY checkpoint_id DESC LIMIT 1",
+                (thread_id,),
+            ).fetchone()
+        return row[0] if row else None
+
+    def _ensure_message_log(self, thread_id: str):
+        """Threads guardados antes de existir la tabla de mensajes: se indexan una vez desde el checkpoint."""
+        if self._conn.execute("SELECT 1 FROM messages WHERE thread_id = ? LIMIT 1", (thread_id,)).fetchone():
+            return
+        row = self._conn.execute(
+            "SELECT type, checkpoint FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = '' "
+            "ORDER BY checkpoint_id DESC LIMIT 1",
+            (thread_id,),
+        ).fetchone()
+        if row:
+            checkpoint = self._load_checkpoint(thread_id, "", row)
+            self._log_messages(thread_id, checkpoint["channel_values"].get(MESSAGES_CHANNEL, []))
+            self._conn.commit()
+
+    def _cursor_seq(self, thread_id: str, message_id: str) -> int:
+        row = self._conn.execute(
+            "SELECT seq FROM messages WHERE thread_id = ? AND message_id = ?", (thread_id, message_id)
+        ).fetchone()
+        if row is None:
+            raise UnknownCursor(message_id)
+        return row[0]
+
+    def list_messages(self, thread_id: str, *, limit: Optional[int] = None, before: Optional[str] = None,
+                      after: Optional[str] = None, types: Optional[Sequence[str]] = None) -> MessagePage:
+        """
+        Página del historial en orden cronológico. `before`/`after` son ids de mensaje (exclusivos).
+        Sin `after`, la página son los `limit` mensajes más recientes (antes de `before`, si viene);
+        con `after`, los primeros `limit` posteriores. `types` filtra por tipo de mensaje; si no
+        incluye "tool", también se omiten las llamadas a herramientas del modelo (sin texto para el usuario).
+        """
+        clauses, params = ["thread_id = ?"], [thread_id]
+        if types:
+            clauses.append(f"type IN ({','.join('?' * len(types))})")
+            params += list(types)
+            if "tool" not in types:
+                clauses.append("has_tool_calls = 0")
+
+        with self._lock:
+            self._ensure_message_log(thread_id)
+            low = self._cursor_seq(thread_id, after) if after else -1
+            high = self._cursor_seq(thread_id, before) if before else None
+
+            range_clauses, range_params = [*clauses, "seq > ?"], [*params, low]
+            if high is not None:
+                range_clauses.append("seq < ?")
+                range_params.append(high)
+            # Con `after` se avanza desde el cursor; si no, se toma la cola (lo más nuevo)
+            order = "ASC" if after else "DESC"
+            query = (
+                "SELECT seq, message_id, type, content FROM messages WHERE "
+                f"{' AND '.join(range_clauses)} ORDER BY seq {order}"
+            )
+            if limit is not None:
+                query += f" LIMIT {int(limit)}"
+            rows = self._conn.execute(query, range_params).fetchall()
+            if order == "DESC":
+                rows.reverse()
+
+            def exists(condition: str, seq: int) -> bool:
+                return self._conn.execute(
+                    f"SELECT EXISTS(SELECT 1 FROM messages WHERE {' AND '.join(clauses)} AND {condition})",
+                    [*params, seq],
+                ).fetchone()[0] == 1
+
+            has_older = exists("seq < ?", rows[0][0] if rows else (high if high is not None else low + 1))
+            has_newer = exists("seq > ?", rows[-1][0] if rows else low)
+
+        return MessagePage(
+            messages=[
+                {"id": message_id, "type": type_, "content": json.loads(content)}
+                for _, message_id, type_, content in rows
+            ],
+            has_older=has_older,
+            has_newer=has_newer,
+        )
+
+    # --- Versión async: SQLite es bloqueante, lo corremos en el threadpool ---
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(self, config: Optional[RunnableConfig], *, filter: Optional[dict[str, Any]] = None,
+                    before: Optional[RunnableConfig] = None, limit: Optional[int] = None) -> AsyncIterator[CheckpointTuple]:
+        items = await asyncio.to_thread(
+            lambda: list(self.list(config, filter=filter, before=before, limit=limit))
+        )
+        for item in items:
+            yield item
+
+    async def aput(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+                   new_versions: ChannelVersions) -> RunnableConfig:
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config: RunnableConfig, writes: Sequence[tuple[str, Any]], task_id: str,
+                          task_path: str = "") -> None:
+        await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        await asyncio.to_thread(self.delete_thread, thread_id)
+
+    def get_next_version(self, current: Optional[str], channel: None) -> str:
+        # Mismo esquema de versiones que MemorySaver
+        if current is None:
+            current_v = 0
+        elif isinstance(current, int):
+            current_v = current
+        else:
+            current_v = int(current.split(".")[0])
+        return f"{current_v + 1:032}.{random.random():016}"
@@ -0,0 +1,84 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from typing import Iterator, Optional
+
+from langchain_core.documents import Document
+
+
+def document_hash(doc: Document) -> str:
+    """Hash del contenido + metadata: si no cambia, no hay nada que re-embeber."""
+    h = hashlib.sha256(doc.page_content.encode())
+    h.update(json.dumps(doc.metadata, sort_keys=True, default=str).encode())
+    return h.hexdigest()
+
+
+class DocumentStore:
+    """
+    Fuente de verdad de los documentos originales (texto completo, sin fragmentar).
+    El índice FAISS se puede reconstruir siempre a partir de aquí, por ejemplo
+    cuando cambian el modelo de embeddings o los parámetros de chunking.
+    """
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS documents ("
+            "doc_id TEXT PRIMARY KEY, content TEXT NOT NULL, metadata TEXT NOT NULL, "
+            "hash TEXT NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self._conn.commit()
+
+    def upsert(self, docs: dict[str, Document]):
+        now = time.time()
+        rows = [
+            (doc_id, doc.page_content, json.dumps(doc.metadata, default=str), document_hash(doc), now)
+            for doc_id, doc in docs.items()
+        ]
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO documents VALUES (?, ?, ?, ?, ?)", rows)
+            self._conn.commit()
+
+    def delete(self, doc_ids: list[str]):
+        with self._lock:
+            self._conn.executemany("DELETE FROM documents WHERE doc_id = ?", [(i,) for i in doc_ids])
+            self._conn.commit()
+
+    def hashes(self) -> dict[str, str]:
+        with self._lock:
+            return dict(self._conn.execute("SELECT doc_id, hash FROM documents").fetchall())
+
+    def get_many(self, doc_ids: list[str]) -> dict[str, Document]:
+        docs: dict[str, Document] = {}
+        with self._lock:
+            for start in range(0, len(doc_ids), 500):
+                chunk = doc_ids[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT doc_id, content, metadata FROM documents WHERE doc_id IN ({placeholders})", chunk
+                ).fetchall()
+                for doc_id, content, metadata in rows:
+                    docs[doc_id] = Document(page_content=content, metadata=json.loads(metadata))
+        return docs
+
+    def iter_ids(self) -> Iterator[str]:
+        with self._lock:
+            ids = [row[0] for row in self._conn.execute("SELECT doc_id FROM documents ORDER BY doc_id")]
+        yield from ids
+
+    def get_meta(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key: str, value: str):
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (key, value))
+            self._conn.commit()
@@ -0,0 +1,101 @@
+import asyncio
+import hashlib
+from typing import Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from app.utils.sqlite_lru import SQLiteLRUCache
+from app.utils.metrics import EMBEDDING_REQUEST_DURATION, EMBEDDING_TEXTS
+
+DOCUMENT_TASK = "retrieval_document"
+QUERY_TASK = "retrieval_query"
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Envuelve un modelo de embeddings con una cache persistente direccionada por contenido.
+    La clave es hash(modelo, task_type, texto): el mismo chunk o la misma pregunta
+    nunca se embeben dos veces, ni entre reinicios ni entre workers.
+    """
+
+    def __init__(self, underlying: Embeddings, model: str, cache: SQLiteLRUCache):
+        self.underlying = underlying
+        self.model = model
+        self.cache = cache
+        # Llamadas reales al proveedor (textos enviados), útil para medir el ahorro
+        self.embedded_texts = 0
+
+    def _key(self, text: str, task_type: str) -> str:
+        return hashlib.sha256(f"{self.model}\x00{task_type}\x00{text}".encode()).hexdigest()
+
+    @staticmethod
+    def _encode(vector: list[float]) -> bytes:
+        return np.asarray(vector, dtype=np.float32).tobytes()
+
+    @staticmethod
+    def _decode(blob: bytes) -> list[float]:
+        return np.frombuffer(blob, dtype=np.float32).tolist()
+
+    def _lookup(self, texts: list[str], task_type: str) -> tuple[list[Optional[list[float]]], list[str]]:
+        """Resuelve en lote desde la cache. Devuelve (vectores parciales, textos faltantes)."""
+        keys = [self._key(t, task_type) for t in texts]
+        cached = self.cache.get_many(keys)
+        vectors = [self._decode(cached[k]) if k in cached else None for k in keys]
+        # Deduplicamos los faltantes: textos repetidos se embeben una sola vez
+        missing = list(dict.fromkeys(t for t, v in zip(texts, vectors) if v is None))
+        EMBEDDING_TEXTS.labels(self.model, "cache").inc(len(texts) - sum(v is None for v in vectors))
+        return vectors, missing
+
+    def _merge(self, texts: list[str], task_type: str, vectors: list,
+               missing: list[str], fresh: list[list[float]]) -> list[list[float]]:
+        by_text = dict(zip(missing, fresh))
+        self.cache.set_many((self._key(t, task_type), self._encode(v)) for t, v in by_text.items())
+        self.embedded_texts += len(missing)
+        EMBEDDING_TEXTS.labels(self.model, "api").inc(len(missing))
+        return [v if v is not None else by_text[t] for t, v in zip(texts, vectors)]
+
+    # --- Interfaz sync ---
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        vectors, missing = self._lookup(texts, DOCUMENT_TASK)
+        if not missing:
+            return vectors  # type: ignore[return-value]
+
+        with EMBEDDING_REQUEST_DURATION.labels(self.model, DOCUMENT_TASK).time():
+            fresh = self.underlying.embed_documents(missing, task_type=DOCUMENT_TASK)  # type: ignore[call-arg]
+        return self._merge(texts, DOCUMENT_TASK, vectors, missing, fresh)
+
+    def embed_query(self, text: str) -> list[float]:
+        vectors, missing = self._lookup([text], QUERY_TASK)
+        if not missing:
+            return vectors[0]  # type: ignore[return-value]
+
+        with EMBEDDING_REQUEST_DURATION.labels(self.model, QUERY_TASK).time():
+            fresh = [self.underlying.embed_query(text, task_type=QUERY_TASK)]  # type: ignore[call-arg]
+        return self._merge([text], QUERY_TASK, vectors, missing, fresh)[0]
+
+    # --- Interfaz async ---
+
+    # La cache es SQLite (sincrónica): lecturas y escrituras corren en el threadpool, no en el event loop
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        vectors, missing = await asyncio.to_thread(self._lookup, texts, DOCUMENT_TASK)
+        if not missing:
+            return vectors  # type: ignore[return-value]
+
+        with EMBEDDING_REQUEST_DURATION.labels(self.model, DOCUMENT_TASK).time():
+            fresh = await self.underlying.aembed_documents(missing, task_type=DOCUMENT_TASK)  # type: ignore[call-arg]
+        return await asyncio.to_thread(self._merge, texts, DOCUMENT_TASK, vectors, missing, fresh)
+
+    async def aembed_query(self, text: str) -> list[float]:
+        vectors, missing = await asyncio.to_thread(self._lookup, [text], QUERY_TASK)
+        if not missing:
+            return vectors[0]  # type: ignore[return-value]
+
+        with EMBEDDING_REQUEST_DURATION.labels(self.model, QUERY_TASK).time():
+            fresh = [await self.underlying.aembed_query(text, task_type=QUERY_TASK)]  # type: ignore[call-arg]
+        return (await asyncio.to_thread(self._merge, [text], QUERY_TASK, vectors, missing, fresh))[0]
+
+    def stats(self) -> dict:
+        return {**self.cache.stats(), "model": self.model, "embedded_texts": self.embedded_texts}
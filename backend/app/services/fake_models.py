@@ -0,0 +1,222 @@
+import json
+import time
+import types
+import zlib
+import asyncio
+import collections.abc
+from typing import Any, AsyncIterator, Iterator, Literal, Optional, Sequence, Union, get_args, get_origin
+
+import numpy as np
+from pydantic import BaseModel
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage, HumanMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.runnables import Runnable, RunnableLambda
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+from app.services.lexical_index import tokenize
+
+# Vocabulario de relleno para las respuestas simuladas (1 palabra ~ 1 token)
+FILLER = (
+    "según la documentación interna el procedimiento recomendado es revisar los registros del servicio "
+    "y escalar el incidente si el problema persiste luego de reiniciar el componente afectado"
+).split()
+
+
+def _seed(text: str) -> int:
+    """Semilla estable entre procesos y ejecuciones (a diferencia de hash())."""
+    return zlib.crc32(text.encode("utf-8"))
+
+
+def _content(message: BaseMessage) -> str:
+    return message.content if isinstance(message.content, str) else json.dumps(message.content, default=str)
+
+
+def fake_value(annotation: Any, seed: int, name: str = "") -> Any:
+    """Valor determinista para un tipo de campo Pydantic (Literal elige una opción según la semilla)."""
+    origin = get_origin(annotation)
+    if origin is Literal:
+        choices = get_args(annotation)
+        return choices[seed % len(choices)]
+    if origin in (Union, types.UnionType):
+        return fake_value(next(a for a in get_args(annotation) if a is not type(None)), seed, name)
+    if origin in (list, tuple, set, collections.abc.Sequence):
+        return []
+    if origin is dict:
+        return {}
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return fake_instance(annotation, seed).model_dump()
+    if annotation is bool:
+        return seed % 2 == 0
+    if annotation is int:
+        return seed % 100
+    if annotation is float:
+        return (seed % 1000) / 1000
+    return f"Respuesta simulada ({name or 'texto'})."
+
+
+def fake_instance(schema: type[BaseModel], seed: int) -> BaseModel:
+    return schema.model_validate({
+        name: fake_value(field.annotation, seed + i, name) for i, (name, field) in enumerate(schema.model_fields.items())
+    })
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Chat model local y determinista con la misma interfaz que ChatGoogleGenerativeAI
+    (ainvoke, streaming, bind_tools, with_structured_output) y latencia simulada:
+    `first_token_ms` hasta el primer token y `token_ms` por cada token siguiente.
+    La misma entrada produce siempre la misma salida.
+    """
+
+    model: str = "fake"
+    first_token_ms: float = 300.0
+    token_ms: float = 5.0
+    output_tokens: int = 60
+    # Fracción de turnos de usuario que se responden pidiendo una herramienta (si hay herramientas bindeadas)
+    tool_call_rate: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake"
+
+    @property
+    def _identifying_params(self) -> dict[str, Any]:
+        return {"model": self.model, "first_token_ms": self.first_token_ms, "token_ms": self.token_ms}
+
+    # --- Contenido de la respuesta ---
+
+    def _respond(self, messages: list[BaseMessage], **kwargs: Any) -> AIMessage:
+        seed = _seed("\n".join(_content(m) for m in messages))
+        input_tokens = sum(len(_content(m)) // 4 + 4 for m in messages)
+
+        schema = kwargs.get("structured_schema")
+        tools = kwargs.get("tools") or []
+        tool_call = self._tool_call(messages[-1], tools, seed) if tools else None
+
+        if schema is not None:
+            content, output_tokens, calls = fake_instance(schema, seed).model_dump_json(), 20, []
+        elif tool_call is not None:
+            content, output_tokens, calls = "", 10, [tool_call]
+        else:
+            words = [FILLER[(seed + i) % len(FILLER)] for i in range(self.output_tokens)]
+            content, output_tokens, calls = " ".join(words), self.output_tokens, []
+
+        usage = {"input_tokens": input_tokens, "output_tokens": output_tokens, "total_tokens": input_tokens + output_tokens}
+        return AIMessage(
+            content=content, tool_calls=calls, usage_metadata=usage, response_metadata={"model_name": self.model}
+        )
+
+    def _tool_call(self, last: BaseMessage, tools: list[dict], seed: int) -> Optional[dict]:
+        """Solo en respuesta a un mensaje del usuario (tras el resultado de la herramienta, responde texto)."""
+        if not isinstance(last, HumanMessage) or (seed % 1000) / 1000 >= self.tool_call_rate:
+            return None
+        # Una herramienta sin argumentos obligatorios (los args de las demás no se pueden inventar)
+        candidates = [t["function"]["name"] for t in tools if not t["function"].get("parameters", {}).get("required")]
+        if not candidates:
+            return None
+        return {"name": candidates[seed % len(candidates)], "args": {}, "id": f"call_{seed:08x}", "type": "tool_call"}
+
+    def _latency(self, message: AIMessage) -> float:
+        tokens = message.usage_metadata["output_tokens"] if message.usage_metadata else 0
+        return (self.first_token_ms + self.token_ms * max(tokens - 1, 0)) / 1000
+
+    # --- Interfaz de BaseChatModel ---
+
+    def _generate(self, messages: list[BaseMessage], stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        message = self._respond(messages, **kwargs)
+        time.sleep(self._latency(message))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(self, messages: list[BaseMessage], stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        message = self._respond(messages, **kwargs)
+        await asyncio.sleep(self._latency(message))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _chunks(self, message: AIMessage) -> Iterator[AIMessageChunk]:
+        """Un chunk por palabra; el uso de tokens viaja en el último (se suma al agregar chunks)."""
+        if message.tool_calls:
+            call = message.tool_calls[0]
+            yield AIMessageChunk(
+                content="",
+                tool_call_chunks=[{"name": call["name"], "args": "{}", "id": call["id"], "index": 0}],
+                usage_metadata=message.usage_metadata,
+            )
+            return
+        words = message.content.split(" ")
+        for i, word in enumerate(words):
+            last = i == len(words) - 1
+            yield AIMessageChunk(
+                content=word if last else word + " ",
+                usage_metadata=message.usage_metadata if last else None,
+                response_metadata=message.response_metadata if last else {},
+            )
+
+    def _stream(self, messages: list[BaseMessage], stop=None, run_manager=None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        message = self._respond(messages, **kwargs)
+        for i, chunk in enumerate(self._chunks(message)):
+            time.sleep((self.first_token_ms if i == 0 else self.token_ms) / 1000)
+            if run_manager and isinstance(chunk.content, str):
+                run_manager.on_llm_new_token(chunk.content)
+            yield ChatGenerationChunk(message=chunk)
+
+    async def _astream(
+        self, messages: list[BaseMessage], stop=None, run_manager=None, **kwargs: Any
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        message = self._respond(messages, **kwargs)
+        for i, chunk in enumerate(self._chunks(message)):
+            await asyncio.sleep((self.first_token_ms if i == 0 else self.token_ms) / 1000)
+            if run_manager and isinstance(chunk.content, str):
+                await run_manager.on_llm_new_token(chunk.content)
+            yield ChatGenerationChunk(message=chunk)
+
+    def bind_tools(self, tools: Sequence[Any], **kwargs: Any) -> Runnable:
+        return self.bind(tools=[convert_to_openai_tool(t) for t in tools], **kwargs)
+
+    def with_structured_output(self, schema: Any, **kwargs: Any) -> Runnable:
+        """Solo esquemas Pydantic (los que usa la app). La llamada pasa por el modelo, con sus callbacks."""
+        if not (isinstance(schema, type) and issubclass(schema, BaseModel)):
+            raise NotImplementedError("FakeChatModel.with_structured_output solo soporta modelos Pydantic")
+        return self.bind(structured_schema=schema) | RunnableLambda(
+            lambda message: schema.model_validate_json(message.content)
+        )
+
+
+class FakeEmbeddings(Embeddings):
+    """
+    Embeddings locales y deterministas: hashing trick con signo sobre los mismos tokens
+    que el índice léxico, normalizado L2. Textos que comparten palabras quedan cerca,
+    así la recuperación (umbral de similitud, fusión híbrida) se comporta de forma realista.
+    Cada llamada (un texto o un lote) cuesta `latency_ms`.
+    """
+
+    def __init__(self, dim: int = 768, latency_ms: float = 80.0):
+        self.dim = dim
+        self.latency_ms = latency_ms
+
+    def _vector(self, text: str) -> list[float]:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for token in tokenize(text) or [text]:
+            h = _seed(token)
+            vector[h % self.dim] += 1.0 if (h >> 31) & 1 else -1.0
+        norm = np.linalg.norm(vector)
+        if norm == 0:
+            vector[_seed(text) % self.dim] = norm = 1.0
+        return (vector / norm).tolist()
+
+    def embed_documents(self, texts: list[str], **kwargs: Any) -> list[list[float]]:
+        time.sleep(self.latency_ms / 1000)
+        return [self._vector(t) for t in texts]
+
+    def embed_query(self, text: str, **kwargs: Any) -> list[float]:
+        time.sleep(self.latency_ms / 1000)
+        return self._vector(text)
+
+    async def aembed_documents(self, texts: list[str], **kwargs: Any) -> list[list[float]]:
+        await asyncio.sleep(self.latency_ms / 1000)
+        return [self._vector(t) for t in texts]
+
+    async def aembed_query(self, text: str, **kwargs: Any) -> list[float]:
+        await asyncio.sleep(self.latency_ms / 1000)
+        return self._vector(text)
@@ -0,0 +1,107 @@
+import logging
+from typing import Any, Optional
+
+import faiss
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Tipos de índice soportados:
+# - flat:  búsqueda exacta. Costo lineal por consulta, vectores float32 completos.
+# - hnsw:  grafo navegable. Consultas sub-lineales; no soporta borrar vectores.
+# - ivfpq: listas invertidas + product quantization. Requiere entrenamiento;
+#          comprime cada vector a `pq_m` bytes (con 8 bits por sub-cuantizador).
+INDEX_KINDS = ("flat", "hnsw", "ivfpq")
+
+# Mínimo de puntos de entrenamiento por centroide que recomienda FAISS
+TRAIN_POINTS_PER_CENTROID = 39
+
+
+def ivf_nlist(n_vectors: int, configured: int) -> int:
+    """Cantidad de listas del IVF: la configurada, o ~4·sqrt(n) (regla práctica de FAISS)."""
+    if configured > 0:
+        return configured
+    return max(1, int(4 * np.sqrt(n_vectors)))
+
+
+def min_train_size(kind: str, params: dict[str, Any], n_vectors: int) -> int:
+    """Vectores necesarios para entrenar el índice (0 si no requiere entrenamiento)."""
+    if kind != "ivfpq":
+        return 0
+    nlist = ivf_nlist(n_vectors, params.get("nlist", 0))
+    return max(nlist * TRAIN_POINTS_PER_CENTROID, 2 ** params.get("pq_nbits", 8))
+
+
+def resolve_kind(kind: str, params: dict[str, Any], n_vectors: int) -> str:
+    """Con muy pocos vectores un índice entrenado no tiene sentido (ni se puede entrenar): se usa flat."""
+    if kind not in INDEX_KINDS:
+        raise ValueError(f"Tipo de índice desconocido: '{kind}' (opciones: {', '.join(INDEX_KINDS)})")
+    if n_vectors < min_train_size(kind, params, n_vectors):
+        return "flat"
+    return kind
+
+
+def factory_string(kind: str, dim: int, params: dict[str, Any], n_vectors: int) -> str:
+    if kind == "flat":
+        return "Flat"
+    if kind == "hnsw":
+        return f"HNSW{params.get('hnsw_m', 32)}"
+    pq_m = params.get("pq_m", 16)
+    if dim % pq_m:
+        raise ValueError(f"pq_m={pq_m} debe dividir la dimensión de los vectores ({dim})")
+    return f"IVF{ivf_nlist(n_vectors, params.get('nlist', 0))},PQ{pq_m}x{params.get('pq_nbits', 8)}"
+
+
+def build_index(kind: str, vectors: np.ndarray, params: dict[str, Any], n_total: Optional[int] = None) -> faiss.Index:
+    """
+    Crea un índice vacío del tipo pedido (métrica L2, igual que el flat por defecto de
+    LangChain) y lo entrena con `vectors` si hace falta. No agrega los vectores.
+    `n_total`: vectores que va a tener el índice, si `vectors` es solo una muestra (define nlist).
+    """
+    n_vectors, dim = vectors.shape
+    index = faiss.index_factory(dim, factory_string(kind, dim, params, n_total or n_vectors), faiss.METRIC_L2)
+
+    if kind == "hnsw":
+        index.hnsw.efConstruction = params.get("ef_construction", 200)
+
+    if not index.is_trained:
+        max_train = params.get("max_train_points", 100_000)
+        sample = vectors
+        if n_vectors > max_train:
+            rng = np.random.default_rng(0)
+            sample = vectors[rng.choice(n_vectors, max_train, replace=False)]
+        logger.info(f"🏋️ Entrenando índice {kind} con {len(sample)} vectores...")
+        index.train(np.ascontiguousarray(sample, dtype=np.float32))
+
+    apply_search_params(index, params)
+    return index
+
+
+def apply_search_params(index: faiss.Index, params: dict[str, Any]):
+    """Parámetros de búsqueda (no afectan al contenido, se ajustan también al cargar de disco)."""
+    space = faiss.ParameterSpace()
+    if isinstance(index, faiss.IndexHNSW):
+        space.set_index_parameter(index, "efSearch", params.get("ef_search", 64))
+    elif faiss.try_extract_index_ivf(index) is not None:
+        space.set_index_parameter(index, "nprobe", params.get("nprobe", 16))
+
+
+def index_kind(index: faiss.Index) -> str:
+    if isinstance(index, faiss.IndexHNSW):
+        return "hnsw"
+    if faiss.try_extract_index_ivf(index) is not None:
+        return "ivfpq"
+    return "flat"
+
+
+def supports_incremental_delete(index: faiss.Index) -> bool:
+    """
+    Solo el flat compacta posiciones al borrar, que es lo que asume el mapeo
+    posición -> id de LangChain. HNSW no permite borrar; IVF conserva ids con huecos.
+    """
+    return index_kind(index) == "flat"
+
+
+def index_memory_bytes(index: faiss.Index) -> int:
+    """Tamaño serializado: buena aproximación de la memoria que ocupan vectores y estructuras."""
+    return int(faiss.serialize_index(index).nbytes)
@@ -0,0 +1,157 @@
+import os
+import json
+import time
+import fcntl
+import shutil
+import pickle
+import hashlib
+import logging
+from contextlib import contextmanager
+from typing import Any, Optional
+
+import faiss
+from langchain_core.embeddings import Embeddings
+from langchain_community.vectorstores import FAISS
+from langchain_community.docstore.in_memory import InMemoryDocstore
+
+logger = logging.getLogger(__name__)
+
+# Se incrementa cada vez que cambia el formato de los archivos en disco
+INDEX_FORMAT_VERSION = 2
+
+INDEX_FILE = "index.faiss"
+DOCSTORE_FILE = "docstore.pkl"
+MANIFEST_FILE = "manifest.json"
+CURRENT_FILE = "CURRENT"
+LOCK_FILE = ".lock"
+
+
+def params_fingerprint(params: dict[str, Any]) -> str:
+    """
+    Hash estable de los parámetros que afectan a los vectores (modelo, chunking).
+    Si cambian, el índice persistido deja de ser válido y hay que reconstruirlo.
+    Los cambios de corpus, en cambio, se aplican de forma incremental por documento.
+    """
+    payload = json.dumps({"format_version": INDEX_FORMAT_VERSION, **params}, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+@contextmanager
+def build_lock(index_dir: str):
+    """
+    Lock exclusivo entre procesos: si varios workers arrancan a la vez,
+    solo uno reconstruye el índice y el resto espera y lo carga de disco.
+    """
+    os.makedirs(index_dir, exist_ok=True)
+    with open(os.path.join(index_dir, LOCK_FILE), "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def current_version(index_dir: str) -> Optional[str]:
+    """Nombre de la versión activa (lectura barata, sirve para detectar cambios de otro worker)."""
+    try:
+        with open(os.path.join(index_dir, CURRENT_FILE)) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def read_manifest(index_dir: str) -> Optional[dict[str, Any]]:
+    """Devuelve el manifest de la versión activa, o None si no hay índice."""
+    version = current_version(index_dir)
+    if not version:
+        return None
+
+    try:
+        with open(os.path.join(index_dir, version, MANIFEST_FILE)) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    manifest["_version"] = version
+    manifest["_path"] = os.path.join(index_dir, version)
+    return manifest
+
+
+def load_index(index_dir: str, embeddings: Embeddings, fingerprint: str) -> Optional[tuple[FAISS, dict[str, Any]]]:
+    """
+    Carga el índice activo (y su manifest) si coincide con el fingerprint esperado.
+    Los vectores se mapean en memoria (mmap): el arranque no copia el índice
+    y varios workers comparten las mismas páginas del page cache.
+    """
+    manifest = read_manifest(index_dir)
+    if manifest is None:
+        return None
+
+    if manifest.get("format_version") != INDEX_FORMAT_VERSION or manifest.get("fingerprint") != fingerprint:
+        logger.info("♻️ El índice en disco está desactualizado (modelo, chunking o formato distintos).")
+        return None
+
+    path = manifest["_path"]
+    try:
+        # IO_FLAG_MMAP_IFC: los códigos se leen directo del archivo (solo lectura)
+        index = faiss.read_index(os.path.join(path, INDEX_FILE), faiss.IO_FLAG_MMAP_IFC)
+        with open(os.path.join(path, DOCSTORE_FILE), "rb") as f:
+            docstore, index_to_docstore_id = pickle.load(f)
+    except Exception as e:
+        logger.error(f"🔥 Error leyendo índice persistido en '{path}': {e}")
+        return None
+
+    return FAISS(embeddings, index, docstore, index_to_docstore_id), manifest
+
+
+def clone_vectorstore(vectorstore: FAISS) -> FAISS:
+    """
+    Copia propia (no mapeada) del índice y del docstore, para aplicar cambios
+    copy-on-write sin tocar la instancia que están usando las búsquedas en curso.
+    Un índice abierto con mmap es de solo lectura: agregarle vectores aborta el proceso.
+    """
+    index = faiss.deserialize_index(faiss.serialize_index(vectorstore.index))
+    docstore = InMemoryDocstore(dict(vectorstore.docstore._dict))  # type: ignore[attr-defined]
+    return FAISS(vectorstore.embedding_function, index, docstore, dict(vectorstore.index_to_docstore_id))
+
+
+def save_index(index_dir: str, vectorstore: FAISS, manifest: dict[str, Any]) -> str:
+    """
+    Escribe una nueva versión del índice y la activa de forma atómica.
+    Cada versión vive en su propia carpeta; CURRENT apunta a la activa.
+    Devuelve el nombre de la versión escrita.
+    """
+    os.makedirs(index_dir, exist_ok=True)
+    version = f"v{int(time.time() * 1000)}-{manifest['fingerprint'][:12]}"
+    tmp_path = os.path.join(index_dir, f".tmp-{version}")
+    final_path = os.path.join(index_dir, version)
+
+    os.makedirs(tmp_path, exist_ok=True)
+    faiss.write_index(vectorstore.index, os.path.join(tmp_path, INDEX_FILE))
+    with open(os.path.join(tmp_path, DOCSTORE_FILE), "wb") as f:
+        pickle.dump((vectorstore.docstore, vectorstore.index_to_docstore_id), f)
+    clean_manifest = {k: v for k, v in manifest.items() if not k.startswith("_")}
+    with open(os.path.join(tmp_path, MANIFEST_FILE), "w") as f:
+        json.dump({**clean_manifest, "format_version": INDEX_FORMAT_VERSION, "created_at": time.time()}, f)
+    os.rename(tmp_path, final_path)
+
+    # Swap atómico del puntero a la versión activa
+    current_tmp = os.path.join(index_dir, f".{CURRENT_FILE}.tmp")
+    with open(current_tmp, "w") as f:
+        f.write(version)
+    os.replace(current_tmp, os.path.join(index_dir, CURRENT_FILE))
+
+    _cleanup_old_versions(index_dir, keep=version)
+    return version
+
+
+def _cleanup_old_versions(index_dir: str, keep: str):
+    """
+    Borra versiones anteriores. En Linux es seguro aunque otro worker las tenga
+    mapeadas: el archivo desaparece del directorio pero las páginas siguen vivas
+    hasta que ese proceso libere el mmap.
+    """
+    for name in os.listdir(index_dir):
+        if name == keep or not name.startswith("v"):
+            continue
+        shutil.rmtree(os.path.join(index_dir, name), ignore_errors=True)
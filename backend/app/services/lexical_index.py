@@ -0,0 +1,152 @@
+import re
+import math
+import unicodedata
+from collections import Counter
+from dataclasses import dataclass
+from typing import Iterable, Optional
+
+from langchain_core.documents import Document
+
+# Parámetros estándar de BM25 (Okapi)
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# Palabras sin valor de búsqueda (español + inglés), comparadas ya sin tildes
+STOPWORDS = frozenset("""
+a al algo como con cual cuando de del donde el ella en entre es esa ese esta este esto hay la las le lo los
+me mi mis no o para pero por que se si sin sobre su sus te tu un una uno unos y ya yo
+hola buenas buenos dias tardes noches gracias favor hacer hago puedo debo tengo
+the a an and are as at be by for from how i in is it of on or that this to was what when where which who why with
+""".split())
+
+# Identificadores: palabras o números unidos por '-', '_' o '.' (ej: payment-service, lb-main-01, 2.5)
+TOKEN_RE = re.compile(r"[a-z0-9]+(?:[-_.][a-z0-9]+)*")
+
+
+def _normalize(text: str) -> str:
+    text = unicodedata.normalize("NFKD", text.lower())
+    return "".join(c for c in text if not unicodedata.combining(c))
+
+
+def tokenize(text: str) -> list[str]:
+    """
+    Tokens para el índice léxico. Un identificador compuesto genera el token
+    completo y sus partes: 'payment-service' -> payment-service, payment, service.
+    """
+    tokens: list[str] = []
+    for match in TOKEN_RE.findall(_normalize(text)):
+        parts = re.split(r"[-_.]", match)
+        if len(parts) > 1:
+            tokens.append(match)
+        tokens.extend(p for p in parts if p not in STOPWORDS)
+    return tokens
+
+
+def is_identifier(token: str) -> bool:
+    """Códigos de error, nombres de servicios, versiones: términos muy específicos."""
+    return any(c.isdigit() for c in token) or "-" in token or "_" in token
+
+
+@dataclass
+class LexicalHit:
+    chunk_id: str
+    score: float
+    # Fracción del peso (idf) de la consulta que aparece en el chunk
+    coverage: float
+    matched_identifier: bool
+
+
+class BM25Index:
+    """
+    Índice invertido con ranking BM25, en memoria, sobre los mismos chunks que FAISS.
+    Es inmutable: `with_changes` devuelve un índice nuevo que comparte las posting
+    lists que no cambiaron (copy-on-write), así las búsquedas en curso usan su
+    snapshot sin locks, igual que con el vectorstore.
+    """
+
+    def __init__(
+        self,
+        postings: Optional[dict[str, dict[str, int]]] = None,
+        lengths: Optional[dict[str, int]] = None,
+        documents: Optional[dict[str, Document]] = None,
+    ):
+        self.postings = postings or {}
+        self.lengths = lengths or {}
+        self.documents = documents or {}
+        self.total_length = sum(self.lengths.values())
+
+    @classmethod
+    def build(cls, chunks: Iterable[tuple[str, Document]]) -> "BM25Index":
+        return cls().with_changes(chunks, [])
+
+    def with_changes(self, added: Iterable[tuple[str, Document]], removed: Iterable[str]) -> "BM25Index":
+        postings = dict(self.postings)
+        lengths = dict(self.lengths)
+        documents = dict(self.documents)
+        copied: set[str] = set()
+
+        def writable(term: str) -> dict[str, int]:
+            # Solo se copia la posting list de los términos que se tocan
+            if term not in copied:
+                postings[term] = dict(postings.get(term, {}))
+                copied.add(term)
+            return postings[term]
+
+        for chunk_id in removed:
+            doc = documents.pop(chunk_id, None)
+            if doc is None:
+                continue
+            lengths.pop(chunk_id, None)
+            for term in set(tokenize(doc.page_content)):
+                plist = writable(term)
+                plist.pop(chunk_id, None)
+                if not plist:
+                    del postings[term]
+                    copied.discard(term)
+
+        for chunk_id, doc in added:
+            terms = Counter(tokenize(doc.page_content))
+            documents[chunk_id] = doc
+            lengths[chunk_id] = sum(terms.values())
+            for term, tf in terms.items():
+                writable(term)[chunk_id] = tf
+
+        return BM25Index(postings, lengths, documents)
+
+    def __len__(self) -> int:
+        return len(self.documents)
+
+    def idf(self, term: str) -> float:
+        n = len(self.documents)
+        df = len(self.postings.get(term, ()))
+        return math.log(1 + (n - df + 0.5) / (df + 0.5))
+
+    def search(self, query: str, k: int) -> tuple[list[str], list[LexicalHit]]:
+        """Devuelve (términos de la consulta, mejores k chunks por BM25)."""
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms or not self.documents:
+            return terms, []
+
+        avg_length = self.total_length / len(self.documents) or 1.0
+        weights = {term: self.idf(term) for term in terms}
+        total_weight = sum(weights.values()) or 1.0
+
+        scores: dict[str, float] = {}
+        matched: dict[str, float] = {}
+        identifiers: set[str] = set()
+        for term in terms:
+            plist = self.postings.get(term)
+            if not plist:
+                continue
+            idf = weights[term]
+            for chunk_id, tf in plist.items():
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self.lengths[chunk_id] / avg_length)
+                scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * tf * (BM25_K1 + 1) / (tf + norm)
+                matched[chunk_id] = matched.get(chunk_id, 0.0) + idf
+                if is_identifier(term):
+                    identifiers.add(chunk_id)
+
+        top = sorted(scores, key=lambda cid: scores[cid], reverse=True)[:k]
+        return terms, [
+            LexicalHit(cid, scores[cid], matched[cid] / total_weight, cid in identifiers) for cid in top
+        ]
@@ -0,0 +1,60 @@
+import json
+import hashlib
+import logging
+from typing import Any, Optional
+
+from langchain_core.messages import AIMessage, message_to_dict, messages_from_dict
+from pydantic import BaseModel
+
+from app.utils.sqlite_lru import SQLiteLRUCache
+
+logger = logging.getLogger(__name__)
+
+# Se incrementa si cambia el formato de lo guardado (las entradas viejas dejan de coincidir)
+CACHE_FORMAT_VERSION = 1
+
+
+class LLMResponseCache:
+    """
+    Cache persistente de respuestas de LLM direccionada por contenido.
+    La clave es hash(modelo, runnable, schema de salida, namespace, mensajes normalizados):
+    solo tiene sentido para llamadas deterministas (temperature=0), que son todas las del gateway.
+    - `namespace` separa respuestas que dependen de estado externo (ej: la versión del índice RAG).
+    - Respuestas que piden herramientas no se guardan: son un paso intermedio, no una respuesta.
+    """
+
+    def __init__(self, cache: SQLiteLRUCache):
+        self.cache = cache
+
+    @staticmethod
+    def key(model: str, fingerprint: str, schema: Optional[type[BaseModel]] = None, namespace: str = "") -> str:
+        schema_json = json.dumps(schema.model_json_schema(), sort_keys=True) if schema is not None else ""
+        payload = f"{CACHE_FORMAT_VERSION}\x00{model}\x00{namespace}\x00{schema_json}\x00{fingerprint}"
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    @staticmethod
+    def cacheable(response: Any) -> bool:
+        return not (isinstance(response, AIMessage) and response.tool_calls)
+
+    def get(self, key: str, schema: Optional[type[BaseModel]] = None) -> Optional[Any]:
+        blob = self.cache.get(key)
+        if blob is None:
+            return None
+        try:
+            return schema.model_validate_json(blob) if schema is not None else messages_from_dict([json.loads(blob)])[0]
+        except Exception as e:
+            # Entrada corrupta o de una versión incompatible de LangChain: se trata como miss
+            logger.warning(f"⚠️ Cache de LLM: entrada ilegible, se descarta ({e.__class__.__name__})")
+            self.cache.delete(key)
+            return None
+
+    def set(self, key: str, response: Any):
+        if isinstance(response, AIMessage):
+            # Sin id: al reutilizarla en otro thread, add_messages le asigna uno nuevo
+            blob = json.dumps(message_to_dict(response.model_copy(update={"id": None})), ensure_ascii=False).encode()
+        else:
+            blob = response.model_dump_json().encode()
+        self.cache.set(key, blob)
+
+    def stats(self) -> dict:
+        return self.cache.stats()
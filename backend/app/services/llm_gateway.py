@@ -0,0 +1,229 @@
+import json
+import random
+import asyncio
+import hashlib
+import logging
+import functools
+from typing import Any, Callable, Optional
+
+import httpx
+from langchain_core.callbacks import AsyncCallbackHandler
+from langchain_core.callbacks.manager import adispatch_custom_event
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import BaseMessage
+from langchain_core.prompt_values import PromptValue
+from langchain_core.runnables import Runnable, RunnableConfig, RunnableLambda
+from pydantic import BaseModel
+
+from app.core.config import (
+    LLM_MAX_CONCURRENCY, LLM_RETRIES, LLM_RETRY_BASE_SECONDS, LLM_RETRY_MAX_SECONDS, LLM_COALESCE,
+    LLM_CACHE_ENABLED, LLM_CACHE_PATH, LLM_CACHE_MAX_ENTRIES, LLM_CACHE_TTL_SECONDS
+)
+from app.services.llm_cache import LLMResponseCache
+from app.services.model_provider import chat_model
+from app.utils.metrics import LLM_RETRIES as LLM_RETRIES_TOTAL, LLM_COALESCED, LLM_CACHE_LOOKUPS
+from app.utils.sqlite_lru import SQLiteLRUCache
+from app.utils.tracing import Span, tracer, current_span
+
+logger = logging.getLogger(__name__)
+
+# Errores transitorios: cuota (429), sobrecarga (503) y fallas de red. El resto (ej: 400) no se reintenta.
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+RETRYABLE_MARKERS = ("RESOURCE_EXHAUSTED", "UNAVAILABLE", "DEADLINE_EXCEEDED", "429", "503")
+# Evento custom que se emite al servir una respuesta desde la cache (no hay tokens que streamear)
+CACHE_HIT_EVENT = "llm_cache_hit"
+
+
+def is_retryable(error: BaseException) -> bool:
+    if isinstance(error, (TimeoutError, ConnectionError, httpx.TransportError)):
+        return True
+    for candidate in (error, getattr(error, "response", None)):
+        for attr in ("code", "status_code"):
+            status = getattr(candidate, attr, None)
+            if isinstance(status, int) and status in RETRYABLE_STATUS:
+                return True
+    if error.__cause__ is not None and error.__cause__ is not error and is_retryable(error.__cause__):
+        return True
+    message = str(error)
+    return any(marker in message for marker in RETRYABLE_MARKERS)
+
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """Backoff exponencial con jitter completo: uniforme en [0, min(cap, base·2^intento)]."""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+def _normalize(content: Any) -> Any:
+    """Espacios repetidos, saltos de línea y bordes no cambian la respuesta: no cambian la clave."""
+    return " ".join(content.split()) if isinstance(content, str) else content
+
+
+def _fingerprint(name: str, model_input: Any) -> str:
+    """Clave de single-flight y cache: mismo runnable + mismos mensajes (las llamadas son con temperature=0)."""
+    if isinstance(model_input, PromptValue):
+        model_input = model_input.to_messages()
+    if isinstance(model_input, (list, tuple)):
+        model_input = [
+            (m.type, _normalize(m.content), getattr(m, "tool_calls", None)) if isinstance(m, BaseMessage) else _normalize(m)
+            for m in model_input
+        ]
+    else:
+        model_input = _normalize(model_input)
+    payload = json.dumps(model_input, default=str, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(f"{name}\x00{payload}".encode()).hexdigest()
+
+
+def _preview(model_input: Any) -> tuple[int, Any]:
+    """(cantidad de mensajes, último mensaje) para las trazas, sin formatear todo el historial."""
+    if isinstance(model_input, PromptValue):
+        model_input = model_input.to_messages()
+    if isinstance(model_input, (list, tuple)):
+        last = model_input[-1] if model_input else None
+        return len(model_input), getattr(last, "content", last)
+    return 1, model_input
+
+
+class _StreamWatcher(AsyncCallbackHandler):
+    """Registra si la llamada ya emitió tokens (con astream_events los recibe el cliente a medida que llegan)."""
+
+    def __init__(self):
+        self.streamed = False
+
+    async def on_llm_new_token(self, token: str, **kwargs: Any):
+        self.streamed = True
+
+
+class LLMGateway:
+    """
+    Punto único de salida hacia los LLMs. Cada llamada pasa por:
+    - Un cliente por modelo, creado una vez y compartido (reutiliza el pool de conexiones HTTP).
+    - Single-flight: requests idénticas concurrentes esperan la misma llamada en vuelo.
+    - Cache persistente opcional de respuestas (por runnable), consultada antes que todo lo demás.
+    - Un semáforo por modelo que acota las llamadas simultáneas.
+    - Reintentos con backoff exponencial y jitter ante errores transitorios (429/503/red),
+      sin ocupar un lugar del semáforo mientras se espera. Una respuesta que ya empezó a
+      streamearse no se reintenta: el cliente vería los tokens repetidos.
+    """
+
+    def __init__(self, max_concurrency: int, retries: int, base_delay: float, max_delay: float, coalesce: bool,
+                 cache: Optional[LLMResponseCache] = None):
+        self.max_concurrency = max_concurrency
+        self.cache = cache
+        self.retries = retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.coalesce = coalesce
+        self._semaphores: dict[str, asyncio.Semaphore] = {}
+        self._inflight: dict[str, asyncio.Task] = {}
+        # Getters de los clientes de cada runnable registrado (para crearlos en el warm-up)
+        self._clients: dict[str, Callable[[], Runnable]] = {}
+
+    def runnable(
+        self,
+        model: str,
+        build: Callable[[BaseChatModel], Runnable] = lambda llm: llm,
+        *,
+        name: str,
+        schema: Optional[type[BaseModel]] = None,
+        coalesce: bool = True,
+        cache: bool = False,
+        namespace: Callable[[], str] = lambda: "",
+    ) -> Runnable:
+        """
+        Runnable para componer chains una sola vez al importar (`prompt | gateway.runnable(...) | parser`).
+        `build` adapta el cliente (ej: bind_tools); con `schema` la salida es estructurada (ese modelo Pydantic).
+        El cliente se crea al primer uso. Con `cache`, las respuestas finales se persisten bajo
+        el `namespace` vigente (ej: la versión del índice del que sale el contexto del prompt).
+        """
+        if schema is not None:
+            base_build = build
+            build = lambda llm: base_build(llm).with_structured_output(schema)  # noqa: E731
+        client = functools.cache(lambda: build(chat_model(model, temperature=0)))
+        self._clients[name] = client
+
+        async def fetch(model_input: Any, config: RunnableConfig, cache_key: Optional[str]) -> Any:
+            response = await self._call(model, client(), model_input, config)
+            if cache_key is not None and self.cache.cacheable(response):
+                await asyncio.to_thread(self.cache.set, cache_key, response)
+            return response
+
+        async def respond(model_input: Any, config: RunnableConfig, span: Span) -> Any:
+            fingerprint = _fingerprint(name, model_input)
+            cache_key = None
+            if cache and self.cache is not None:
+                cache_key = self.cache.key(model, fingerprint, schema, namespace())
+                cached = await asyncio.to_thread(self.cache.get, cache_key, schema)
+                LLM_CACHE_LOOKUPS.labels(name, "miss" if cached is None else "hit").inc()
+                span.set_attribute("llm.cache", "miss" if cached is None else "hit")
+                if cached is not None:
+                    await adispatch_custom_event(CACHE_HIT_EVENT, {"runnable": name, "response": cached}, config=config)
+                    return cached
+
+            if not (coalesce and self.coalesce):
+                return await fetch(model_input, config, cache_key)
+            return await self._single_flight(model, name, fingerprint, lambda: fetch(model_input, config, cache_key))
+
+        async def call(model_input: Any, config: RunnableConfig) -> Any:
+            with tracer.span(f"llm {name}", "client", {"llm.model": model, "llm.runnable": name}) as span:
+                if span.sampled:
+                    count, last = _preview(model_input)
+                    span.set_attribute("llm.input_messages", count)
+                    span.set_attribute("llm.input", last)
+                response = await respond(model_input, config, span)
+                if span.sampled:
+                    span.set_attribute("llm.output", getattr(response, "content", response))
+                return response
+
+        return RunnableLambda(call, name=name)
+
+    def cache_stats(self) -> Optional[dict]:
+        return self.cache.stats() if self.cache is not None else None
+
+    def warm_up(self):
+        """Crea todos los clientes registrados (lo llama el lifespan, en el threadpool)."""
+        for client in self._clients.values():
+            client()
+
+    def _semaphore(self, model: str) -> asyncio.Semaphore:
+        if model not in self._semaphores:
+            self._semaphores[model] = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphores[model]
+
+    async def _single_flight(self, model: str, name: str, key: str, fetch: Callable[[], Any]) -> Any:
+        task = self._inflight.get(key)
+        if task is None:
+            # La llamada es una tarea propia: si el request que la originó se cancela, los demás siguen esperándola
+            task = asyncio.create_task(fetch())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            LLM_COALESCED.labels(model, name).inc()
+        return await asyncio.shield(task)
+
+    async def _call(self, model: str, client: Runnable, model_input: Any, config: RunnableConfig) -> Any:
+        for attempt in range(self.retries + 1):
+            watcher = _StreamWatcher()
+            try:
+                async with self._semaphore(model):
+                    return await client.with_config(callbacks=[watcher]).ainvoke(model_input, config)
+            except Exception as e:
+                if attempt == self.retries or not is_retryable(e):
+                    raise
+                if watcher.streamed:
+                    logger.warning(f"⚠️ {model}: error transitorio ({e.__class__.__name__}) a mitad del stream, no se reintenta")
+                    raise
+                delay = backoff_delay(attempt, self.base_delay, self.max_delay)
+                LLM_RETRIES_TOTAL.labels(model).inc()
+                span = current_span()
+                if span is not None:
+                    span.set_attribute("llm.retries", attempt + 1)
+                logger.warning(f"🔁 {model}: error transitorio ({e.__class__.__name__}), reintento {attempt + 1} en {delay:.2f}s")
+                await asyncio.sleep(delay)
+
+
+llm_gateway = LLMGateway(
+    LLM_MAX_CONCURRENCY, LLM_RETRIES, LLM_RETRY_BASE_SECONDS, LLM_RETRY_MAX_SECONDS, LLM_COALESCE,
+    cache=LLMResponseCache(
+        SQLiteLRUCache(LLM_CACHE_PATH, "llm_responses", LLM_CACHE_MAX_ENTRIES, ttl_seconds=LLM_CACHE_TTL_SECONDS)
+    ) if LLM_CACHE_ENABLED else None,
+)
@@ -0,0 +1,58 @@
+import functools
+
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+
+from app.core.config import (
+    GOOGLE_API_KEY, MODEL_PROVIDER, FAKE_LLM_FIRST_TOKEN_MS, FAKE_LLM_TOKEN_MS, FAKE_LLM_OUTPUT_TOKENS,
+    FAKE_LLM_TOOL_CALL_RATE, FAKE_EMBEDDING_LATENCY_MS, FAKE_EMBEDDING_DIM
+)
+from app.services.fake_models import FakeChatModel, FakeEmbeddings
+from app.utils.metrics import LLMMetricsCallback
+
+# Punto único donde se construyen los modelos: el resto de la app pide un modelo por
+# nombre y no sabe si detrás está Gemini o un fake local (MODEL_PROVIDER).
+# Los clientes se crean al primer uso (o en el warm-up) y se reutilizan: importar el
+# SDK de Gemini es, por lejos, lo más caro del arranque del proceso.
+PROVIDERS = ("google", "fake")
+
+if MODEL_PROVIDER not in PROVIDERS:
+    raise ValueError(f"MODEL_PROVIDER desconocido: '{MODEL_PROVIDER}' (opciones: {', '.join(PROVIDERS)})")
+
+
+@functools.lru_cache(maxsize=None)
+def chat_model(model: str, temperature: float = 0) -> BaseChatModel:
+    """Todas las llamadas del modelo quedan registradas en /metrics (latencia y tokens por modelo)."""
+    callbacks = [LLMMetricsCallback(model)]
+    if MODEL_PROVIDER == "fake":
+        return FakeChatModel(
+            model=model,
+            first_token_ms=FAKE_LLM_FIRST_TOKEN_MS,
+            token_ms=FAKE_LLM_TOKEN_MS,
+            output_tokens=FAKE_LLM_OUTPUT_TOKENS,
+            tool_call_rate=FAKE_LLM_TOOL_CALL_RATE,
+            callbacks=callbacks,
+        )
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    return ChatGoogleGenerativeAI(
+        model=model, temperature=temperature, google_api_key=GOOGLE_API_KEY, callbacks=callbacks,
+        # Un solo intento: los reintentos (con backoff y jitter) los hace el gateway de LLMs
+        max_retries=1,
+    )
+
+
+def embedding_model(model: str) -> Embeddings:
+    if MODEL_PROVIDER == "fake":
+        return FakeEmbeddings(dim=FAKE_EMBEDDING_DIM, latency_ms=FAKE_EMBEDDING_LATENCY_MS)
+    from langchain_google_genai import GoogleGenerativeAIEmbeddings
+    return GoogleGenerativeAIEmbeddings(model=model)
+
+
+def model_key(model: str) -> str:
+    """
+    Nombre con el que se identifican los artefactos derivados de un modelo (cache de
+    embeddings, fingerprint del índice): los vectores fake nunca se mezclan con los reales.
+    """
+    if MODEL_PROVIDER == "fake":
+        return f"fake-{model}-{FAKE_EMBEDDING_DIM}"
+    return model
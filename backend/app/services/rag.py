@@ -1,45 +1,616 @@
+import os
+import time
+import asyncio
 import logging
-from typing import Optional, List
-from app.core.config import GOOGLE_API_KEY
+import threading
+from contextlib import contextmanager
+from typing import Iterator, Optional, List
+from app.core.config import (
+    GOOGLE_API_KEY, MODEL_PROVIDER, RAG_INDEX_DIR, EMBEDDING_CACHE_PATH, EMBEDDING_CACHE_MAX_ENTRIES,
+    RAG_HYBRID_CANDIDATES, RAG_LEXICAL_MIN_COVERAGE, RAG_LEXICAL_FASTPATH, RAG_LEXICAL_FASTPATH_COVERAGE,
+    RAG_LEXICAL_REJECT_NO_OVERLAP, RAG_INDEX_TYPE, RAG_HNSW_M, RAG_HNSW_EF_CONSTRUCTION, RAG_HNSW_EF_SEARCH,
+    RAG_IVF_NLIST, RAG_IVF_NPROBE, RAG_PQ_M, RAG_PQ_NBITS
+)
+from app.services import index_store, index_factory
+from app.services.lexical_index import BM25Index, LexicalHit
+from app.services.document_store import DocumentStore, document_hash
+from app.services.embedding_cache import CachedEmbeddings
+from app.services.model_provider import embedding_model, model_key
+from app.utils.sqlite_lru import SQLiteLRUCache
+from app.utils.metrics import FAISS_SEARCH_DURATION, RAG_RETRIEVALS
 from langchain_core.documents import Document
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
 from langchain_community.vectorstores import FAISS
+from langchain_community.docstore.in_memory import InMemoryDocstore
+import faiss
+import numpy as np
 # NUEVO: Importamos el splitter
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 SIMILARITY_THRESHOLD = 0.45 
+EMBEDDING_MODEL = "text-embedding-004"
+CHUNK_SIZE = 500
+CHUNK_OVERLAP = 50
+# Cantidad de chunks que se embeben por lote al ingerir documentos
+EMBED_BATCH_SIZE = 256
+# Cada cuánto (segundos) revisamos si otro worker publicó una versión nueva del índice
+RELOAD_CHECK_INTERVAL = 2.0
+# Colección que usan las consultas que no piden otra (el índice histórico en RAG_INDEX_DIR)
+DEFAULT_COLLECTION = "default"
+# Fragmentos que se devuelven como contexto
+TOP_K = 2
+# Constante de Reciprocal Rank Fusion (valor estándar de la literatura)
+RRF_K = 60
+
+_embeddings: Optional[CachedEmbeddings] = None
+_embeddings_lock = threading.Lock()
+
+
+def shared_embeddings() -> CachedEmbeddings:
+    """
+    Cliente de embeddings del proceso, compartido por todas las colecciones (misma cache persistente).
+    Todas las llamadas de embeddings pasan por la cache; el task_type (documento vs consulta)
+    lo decide el wrapper en cada llamada.
+    """
+    global _embeddings
+    if _embeddings is None:
+        with _embeddings_lock:
+            if _embeddings is None:
+                _embeddings = CachedEmbeddings(
+                    embedding_model(EMBEDDING_MODEL),
+                    model=model_key(EMBEDDING_MODEL),
+                    cache=SQLiteLRUCache(EMBEDDING_CACHE_PATH, "embeddings", EMBEDDING_CACHE_MAX_ENTRIES),
+                )
+    return _embeddings
+
+
+def chunk_ids_for(doc_id: str, count: int) -> List[str]:
+    return [f"{doc_id}::{i}" for i in range(count)]
+
+
+# Prefijo de docstore de los chunks reemplazados durante una ingesta masiva (ver BulkSession._retire)
+STALE_PREFIX = "__stale__::"
+
+
+def is_stale_id(chunk_id: Optional[str]) -> bool:
+    """Chunk reemplazado que espera la compactación: nunca se indexa en BM25 ni se devuelve en búsquedas."""
+    return bool(chunk_id) and chunk_id.startswith(STALE_PREFIX)
+
+
+# Vectores por lote al compactar / reconstruir un índice desde la copia de trabajo
+COMPACT_SLAB = 8192
+
+
+class BulkSession:
+    """
+    Copia de trabajo del índice durante una ingesta masiva. Cada slab se agrega in-place
+    (nadie más la ve hasta `checkpoint`/`finish`), así el costo por slab no depende del
+    tamaño total del índice.
+    """
+
+    def __init__(self, service: "RAGService"):
+        self.service = service
+        self.store: Optional[FAISS] = (
+            index_store.clone_vectorstore(service.vectorstore) if service.vectorstore is not None else None
+        )
+        self.documents: dict[str, dict] = dict(service.manifest.get("documents", {}))
+        # HNSW/IVF no pueden borrar: las posiciones de los chunks reemplazados se descartan al compactar en finish().
+        # Se reconstruyen del índice: si una corrida anterior murió después de un checkpoint, sus
+        # chunks retirados siguen en la copia persistida y esta sesión es la que los descarta.
+        self.stale_positions: set[int] = {
+            pos for pos, cid in (self.store.index_to_docstore_id.items() if self.store is not None else ())
+            if is_stale_id(cid)
+        }
+        # id de chunk -> posición en el índice (solo se arma si hace falta retirar chunks)
+        self._positions: Optional[dict[str, int]] = None
+        self.chunks_added = 0
+
+    def add_slab(self, slab: List[tuple[str, Document, List[Document], List[List[float]]]]):
+        """Agrega (doc_id, documento, chunks, vectores) ya fragmentados y embebidos."""
+        self.service.document_store.upsert({doc_id: doc for doc_id, doc, _, _ in slab})
+
+        texts, metadatas, ids, vectors = [], [], [], []
+        for doc_id, doc, chunks, doc_vectors in slab:
+            previous = self.documents.get(doc_id)
+            if previous is not None:
+                if previous["hash"] == document_hash(doc):
+                    continue
+                if self.store is not None:
+                    stale_ids = chunk_ids_for(doc_id, previous["chunks"])
+                    if index_factory.supports_incremental_delete(self.store.index) and not self.stale_positions:
+                        self.store.delete(stale_ids)
+                        self._positions = None
+                    else:
+                        self._retire(stale_ids)
+            texts.extend(c.page_content for c in chunks)
+            metadatas.extend(c.metadata for c in chunks)
+            ids.extend(chunk_ids_for(doc_id, len(chunks)))
+            vectors.extend(doc_vectors)
+            self.documents[doc_id] = {"hash": document_hash(doc), "chunks": len(chunks)}
+
+        if not ids:
+            return
+        if self.store is None:
+            array = np.asarray(vectors, dtype=np.float32)
+            kind = index_factory.resolve_kind(RAG_INDEX_TYPE, self.service._faiss_params(), len(array))
+            self.store = self.service._new_store(kind, array)
+        first = len(self.store.index_to_docstore_id)
+        self.store.add_embeddings(list(zip(texts, vectors)), metadatas=metadatas, ids=ids)
+        if self._positions is not None:
+            self._positions.update((chunk_id, first + i) for i, chunk_id in enumerate(ids))
+        self.chunks_added += len(ids)
+
+    def _retire(self, chunk_ids: List[str]):
+        """
+        Borrado diferido para índices que no pueden borrar: el vector queda en su posición (el mapeo
+        posición -> id de LangChain no se mueve) y el chunk pasa a una clave propia del docstore, así
+        su id queda libre para la versión nueva. finish() descarta esas posiciones al compactar.
+        """
+        assert self.store is not None
+        if self._positions is None:
+            self._positions = {cid: pos for pos, cid in self.store.index_to_docstore_id.items()}
+        docstore = self.store.docstore._dict  # type: ignore[attr-defined]
+        for chunk_id in chunk_ids:
+            pos = self._positions.pop(chunk_id, None)
+            if pos is None:
+                continue
+            stale_key = f"{STALE_PREFIX}{pos}"
+            # El vector sigue en FAISS hasta compactar (checkpoints incluidos), pero las búsquedas lo filtran
+            stale_doc = docstore.pop(chunk_id)
+            stale_doc.id = stale_key
+            docstore[stale_key] = stale_doc
+            self.store.index_to_docstore_id[pos] = stale_key
+            self.stale_positions.add(pos)
+
+    def checkpoint(self):
+        """Persiste lo cargado hasta ahora: si el proceso muere, se retoma desde aquí."""
+        if self.store is not None:
+            manifest = self.service._build_manifest(self.store, self.documents)
+            manifest["_version"] = index_store.save_index(self.service.index_dir, self.store, manifest)
+            self.service.manifest = manifest
+
+    def finish(self):
+        if self.store is None:
+            return
+        live = self.store.index.ntotal - len(self.stale_positions)
+        target_kind = index_factory.resolve_kind(RAG_INDEX_TYPE, self.service._faiss_params(), live)
+        if self.stale_positions or index_factory.index_kind(self.store.index) != target_kind:
+            self.store = self._compact(target_kind)
+        # Se publica una sola vez, con el BM25 del mismo índice: nunca hay una versión sin índice léxico
+        self.service._publish_locked(self.store, RAGService._lexical_from_store(self.store), self.documents)
+
+    def _compact(self, target_kind: str) -> FAISS:
+        """
+        Índice `target_kind` con los vectores vigentes de la copia de trabajo, leídos de vuelta de
+        FAISS por lotes (sin volver a embeber ni a fragmentar nada). La memoria extra es un lote
+        más, a lo sumo, la muestra de entrenamiento de IVF-PQ (acotada por build_index).
+        """
+        assert self.store is not None
+        source = self.store.index
+        ivf = faiss.try_extract_index_ivf(source)
+        if ivf is not None:
+            # IVF necesita el mapa directo id -> (lista, offset) para reconstruir
+            ivf.make_direct_map()
+
+        stale = np.fromiter(self.stale_positions, dtype=np.int64, count=len(self.stale_positions))
+        live = np.setdiff1d(np.arange(source.ntotal, dtype=np.int64), stale, assume_unique=True)
+        logger.info(f"🏗️ Compactando índice a '{target_kind}' ({len(live)} vectores, {len(stale)} reemplazados).")
+
+        if index_factory.index_kind(source) == target_kind:
+            # Mismo tipo: se conserva el entrenamiento (IVF-PQ re-codifica con los mismos codebooks)
+            index = faiss.clone_index(source)
+            index.reset()
+        else:
+            params = self.service._faiss_params()
+            # Sin entrenamiento, build_index solo necesita la dimensión (un vector)
+            needs_training = index_factory.min_train_size(target_kind, params, len(live)) > 0
+            train_size = min(len(live), params.get("max_train_points", 100_000) if needs_training else 1)
+            sample = np.sort(np.random.default_rng(0).choice(live, train_size, replace=False))
+            index = index_factory.build_index(
+                target_kind, source.reconstruct_batch(sample), params, n_total=len(live)
+            )
+
+        old_mapping = self.store.index_to_docstore_id
+        mapping: dict[int, str] = {}
+        for start in range(0, len(live), COMPACT_SLAB):
+            positions = live[start:start + COMPACT_SLAB]
+            index.add(source.reconstruct_batch(positions))
+            mapping.update((start + i, old_mapping[int(pos)]) for i, pos in enumerate(positions))
+
+        docstore = self.store.docstore
+        for pos in self.stale_positions:
+            docstore._dict.pop(f"{STALE_PREFIX}{pos}", None)  # type: ignore[attr-defined]
+        self.stale_positions, self._positions = set(), None
+        return FAISS(self.store.embedding_function, index, docstore, mapping)
+
 
 class RAGService:
-    def __init__(self):
+    """
+    Una colección: índice FAISS + BM25 + DocumentStore en `index_dir`. Solo la colección por
+    defecto (`seed=True`) arranca con el corpus base; las demás empiezan vacías.
+    """
+
+    def __init__(self, name: str = DEFAULT_COLLECTION, index_dir: str = RAG_INDEX_DIR, seed: bool = True):
+        self.name = name
+        self.index_dir = index_dir
+        self.seed = seed
         self.vectorstore = None
+        # Índice BM25 sobre los mismos chunks (se reemplaza junto con el vectorstore)
+        self.lexical_index = BM25Index()
+        self.retrieval_counters = {"lexical_answered": 0, "lexical_rejected": 0, "hybrid": 0}
+        self._counters_lock = threading.Lock()
+        # Manifest de la versión cargada: parámetros + {doc_id: {hash, chunks}}
+        self.manifest: dict = {}
+        # Serializa escritores dentro del proceso; las búsquedas nunca lo toman
+        self._write_lock = threading.Lock()
+        self._last_reload_check = 0.0
+        # Hay una recarga en curso (en el threadpool): no se agenda otra
+        self._reloading = False
+        # (versión, bytes) del último cálculo de memory_bytes()
+        self._footprint: tuple[Optional[str], int] = (None, 0)
+        # Construir el servicio es barato: el cliente de embeddings y el índice se cargan
+        # en initialize() (warm-up del lifespan o primer uso), nunca al importar
+        self._init_lock = threading.Lock()
+        self._ready = threading.Event()
         
-        if not GOOGLE_API_KEY:
+        if MODEL_PROVIDER == "google" and not GOOGLE_API_KEY:
             logger.error("Falta la API Key")
-
-        self.embeddings = GoogleGenerativeAIEmbeddings(
-            model="text-embedding-004",
-            task_type="retrieval_document" 
-        )
         
         # NUEVO: Configuración del Splitter
         # Chunk size: Tamaño del fragmento (caracteres).
         # Chunk overlap: Solapamiento para no perder contexto entre cortes.
         self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=500,
-            chunk_overlap=50
+            chunk_size=CHUNK_SIZE,
+            chunk_overlap=CHUNK_OVERLAP
         )
         
-        self._initialize_knowledge_base()
+        self.document_store = DocumentStore(os.path.join(index_dir, "documents.sqlite3"))
+
+    @property
+    def embeddings(self) -> CachedEmbeddings:
+        return shared_embeddings()
+
+    @property
+    def ready(self) -> bool:
+        return self._ready.is_set()
+
+    def initialize(self):
+        """Carga (o construye) el índice. Idempotente: la primera llamada hace el trabajo, el resto espera o sale."""
+        if self._ready.is_set():
+            return
+        with self._init_lock:
+            if not self._ready.is_set():
+                self._initialize_knowledge_base()
+                self._ready.set()
+
+    async def ainitialize(self):
+        """Para el event loop: la carga (disco + embeddings) corre en el threadpool."""
+        if not self._ready.is_set():
+            await asyncio.to_thread(self.initialize)
+
+    def _index_params(self) -> dict:
+        """Parámetros que, si cambian, invalidan los vectores persistidos."""
+        return {
+            "embedding_model": model_key(EMBEDDING_MODEL),
+            "chunk_size": CHUNK_SIZE,
+            "chunk_overlap": CHUNK_OVERLAP,
+            "index_type": RAG_INDEX_TYPE,
+            "index_build": {
+                "hnsw_m": RAG_HNSW_M,
+                "ef_construction": RAG_HNSW_EF_CONSTRUCTION,
+                "nlist": RAG_IVF_NLIST,
+                "pq_m": RAG_PQ_M,
+                "pq_nbits": RAG_PQ_NBITS,
+            },
+        }
+
+    def _faiss_params(self) -> dict:
+        """Parámetros de construcción + de búsqueda (nprobe / efSearch se pueden cambiar sin reconstruir)."""
+        return {**self._index_params()["index_build"], "nprobe": RAG_IVF_NPROBE, "ef_search": RAG_HNSW_EF_SEARCH}
 
     def _initialize_knowledge_base(self):
-        """Simula la carga y procesamiento de documentos reales."""
-        logger.info("Inicializando RAG Avanzado con Gemini...")
-        
+        """
+        Carga el índice persistido en disco (mmap) si sigue vigente y lo reconcilia
+        con el DocumentStore: solo se re-fragmentan y re-embeben los documentos que cambiaron.
+        Si cambian el modelo o el chunking, se reconstruye todo desde el DocumentStore.
+        """
+        logger.info(f"Inicializando RAG Avanzado con Gemini (colección '{self.name}')...")
+
+        # Solo un worker escribe; el resto espera el lock y carga lo que éste dejó
+        with self._write_lock, index_store.build_lock(self.index_dir):
+            if self.seed:
+                self._seed_documents()
+
+            if self._reload_from_disk(reset=True):
+                logger.info("⚡ VectorStore cargado desde disco (sin llamadas de embeddings).")
+            else:
+                logger.info("🏗️ No hay índice vigente en disco, se construye desde cero.")
+
+            stored = self.document_store.hashes()
+            indexed = {doc_id: meta["hash"] for doc_id, meta in self.manifest.get("documents", {}).items()}
+            changed = [doc_id for doc_id, h in stored.items() if indexed.get(doc_id) != h]
+            removed = [doc_id for doc_id in indexed if doc_id not in stored]
+
+            if changed or removed:
+                try:
+                    self._apply_changes_locked(self.document_store.get_many(changed), removed)
+                except Exception as e:
+                    logger.error(f"🔥 Error FAISS: {e}")
+                    # Si falla (ej. sin API key) seguimos con lo que haya cargado de disco. Sin nada
+                    # cargado no hay índice que servir: la colección no queda lista (/ready lo reintenta)
+                    if self.vectorstore is None:
+                        raise
+
+    def _seed_documents(self):
+        """
+        Copia el corpus base al DocumentStore solo cuando el corpus base cambió.
+        Así un documento base borrado por la API no reaparece en cada reinicio.
+        """
+        raw_documents = self._load_raw_documents()
+        seed_hash = index_store.params_fingerprint({"seed": [document_hash(d) for d in raw_documents]})
+        if self.document_store.get_meta("seed_hash") == seed_hash:
+            return
+
+        logger.info(f"🌱 Registrando {len(raw_documents)} documentos base.")
+        self.document_store.upsert({d.metadata["source"]: d for d in raw_documents})
+        self.document_store.set_meta("seed_hash", seed_hash)
+
+    def _reload_from_disk(self, reset: bool = False) -> bool:
+        """
+        Carga la versión activa del índice si es compatible con los parámetros actuales.
+        Si no se puede cargar (carrera con la limpieza de versiones de otro worker, versión
+        corrupta o a medio escribir) se sigue sirviendo la versión en memoria; solo el
+        arranque (`reset`) vacía el estado para construir el índice desde cero.
+        """
+        loaded = index_store.load_index(
+            self.index_dir, self.embeddings, index_store.params_fingerprint(self._index_params())
+        )
+        if not loaded:
+            if reset:
+                self.vectorstore, self.manifest, self.lexical_index = None, {}, BM25Index()
+            elif self.vectorstore is not None:
+                logger.error(
+                    f"🔥 No se pudo cargar la versión publicada del índice de '{self.name}': "
+                    f"se sigue usando la versión {self.manifest.get('_version')}"
+                )
+            return False
+
+        vectorstore, manifest = loaded
+        index_factory.apply_search_params(vectorstore.index, self._faiss_params())
+        # Todo se prepara antes y se publica junto: las búsquedas ven la versión vieja o la nueva, nunca una mezcla
+        lexical_index = self._lexical_from_store(vectorstore)
+        self.vectorstore, self.manifest, self.lexical_index = vectorstore, manifest, lexical_index
+        return True
+
+    @staticmethod
+    def _lexical_from_store(vectorstore: FAISS) -> BM25Index:
+        chunks = ((cid, vectorstore.docstore.search(cid)) for cid in vectorstore.index_to_docstore_id.values())
+        return BM25Index.build((cid, doc) for cid, doc in chunks if isinstance(doc, Document) and not is_stale_id(cid))
+
+    def _reload_due(self) -> bool:
+        """¿Otro worker publicó una versión nueva del índice? (lectura barata, a lo sumo cada RELOAD_CHECK_INTERVAL)"""
+        now = time.monotonic()
+        if self._reloading or now - self._last_reload_check < RELOAD_CHECK_INTERVAL:
+            return False
+        self._last_reload_check = now
+
+        version = index_store.current_version(self.index_dir)
+        return bool(version) and version != self.manifest.get("_version")
+
+    def _maybe_reload(self):
+        """Si otro worker publicó una versión nueva del índice, la adoptamos."""
+        if self._reload_due():
+            self._reload_if_idle()
+
+    def _maybe_reload_in_background(self):
+        """
+        Versión para el event loop: la carga (índice + docstore + BM25 de todo el corpus) corre en el
+        threadpool y mientras tanto las búsquedas siguen sobre la versión anterior.
+        """
+        if self._reload_due():
+            self._reloading = True
+            asyncio.get_running_loop().run_in_executor(None, self._reload_if_idle)
+
+    def _reload_if_idle(self):
+        """Recarga salvo que haya una escritura en curso (esa ya deja publicada la versión nueva)."""
+        self._reloading = True
+        try:
+            if self._write_lock.acquire(blocking=False):
+                try:
+                    self._reload_from_disk()
+                finally:
+                    self._write_lock.release()
+        except Exception as e:
+            logger.error(f"🔥 Error recargando el índice de '{self.name}': {e}")
+        finally:
+            self._reloading = False
+
+    # --- Ingesta incremental ---
+
+    def upsert_documents(self, docs: dict[str, Document]) -> dict:
+        """Agrega o reemplaza documentos por id. Solo se embeben los chunks de los que cambiaron."""
+        self.initialize()
+        with self._write_lock, index_store.build_lock(self.index_dir):
+            self._sync_with_disk()
+            self.document_store.upsert(docs)
+            return self._apply_changes_locked(docs, [])
+
+    def delete_documents(self, doc_ids: List[str]) -> dict:
+        """Elimina documentos por id (y todos sus chunks) del índice."""
+        self.initialize()
+        with self._write_lock, index_store.build_lock(self.index_dir):
+            self._sync_with_disk()
+            self.document_store.delete(doc_ids)
+            return self._apply_changes_locked({}, doc_ids)
+
+    def list_documents(self) -> dict[str, dict]:
+        return dict(self.manifest.get("documents", {}))
+
+    def _sync_with_disk(self):
+        """Antes de escribir, partimos de la última versión publicada (puede venir de otro worker)."""
+        version = index_store.current_version(self.index_dir)
+        if version and version != self.manifest.get("_version"):
+            self._reload_from_disk()
+
+    def _apply_changes_locked(self, upserts: dict[str, Document], deletes: List[str]) -> dict:
+        """
+        Aplica cambios copy-on-write: se trabaja sobre una copia del índice y al final
+        se reemplaza la referencia. Las búsquedas en curso siguen usando la versión
+        anterior y nunca esperan a la ingesta. Requiere tener el lock de escritura.
+        """
+        indexed = self.manifest.get("documents", {})
+
+        changed = {
+            doc_id: doc for doc_id, doc in upserts.items()
+            if indexed.get(doc_id, {}).get("hash") != document_hash(doc)
+        }
+        removed = [doc_id for doc_id in deletes if doc_id in indexed]
+        summary = {
+            "upserted": sorted(changed),
+            "unchanged": sorted(set(upserts) - set(changed)),
+            "deleted": removed,
+            "chunks_added": 0,
+        }
+        if not changed and not removed:
+            return summary
+
+        # 1. Fragmentamos solo los documentos que cambiaron (ids de chunk deterministas)
+        chunks: List[Document] = []
+        chunk_ids: List[str] = []
+        chunk_counts: dict[str, int] = {}
+        for doc_id, doc in changed.items():
+            doc_chunks = self.split_document(doc_id, doc)
+            chunks.extend(doc_chunks)
+            chunk_ids.extend(chunk_ids_for(doc_id, len(doc_chunks)))
+            chunk_counts[doc_id] = len(doc_chunks)
+
+        stale_ids = [
+            chunk_id
+            for doc_id in [*changed, *removed] if doc_id in indexed
+            for chunk_id in chunk_ids_for(doc_id, indexed[doc_id]["chunks"])
+        ]
+        new_chunks = len(chunks)
+
+        # 2. ¿Alcanza con un cambio incremental o hay que reconstruir el índice?
+        # - HNSW/IVF no admiten el borrado que asume LangChain (posiciones compactas).
+        # - El tipo efectivo depende del tamaño: IVF-PQ necesita suficientes vectores para entrenar.
+        current = self.vectorstore
+        faiss_params = self._faiss_params()
+        projected = (current.index.ntotal if current else 0) - len(stale_ids) + len(chunks)
+        target_kind = index_factory.resolve_kind(RAG_INDEX_TYPE, faiss_params, projected)
+        rebuild = (
+            current is None
+            or index_factory.index_kind(current.index) != target_kind
+            or (bool(stale_ids) and not index_factory.supports_incremental_delete(current.index))
+        )
+
+        if rebuild and current is not None:
+            # Se re-indexan también los documentos que no cambiaron: sus vectores salen de la cache
+            logger.info(f"🏗️ Reconstruyendo índice '{target_kind}' ({projected} chunks).")
+            kept = [doc_id for doc_id in indexed if doc_id not in changed and doc_id not in removed]
+            for doc_id, doc in self.document_store.get_many(kept).items():
+                doc_chunks = self.split_document(doc_id, doc)
+                chunks.extend(doc_chunks)
+                chunk_ids.extend(chunk_ids_for(doc_id, len(doc_chunks)))
+                chunk_counts[doc_id] = len(doc_chunks)
+
+        # 3. Embebemos los chunks en lotes grandes (la cache evita repetir los ya vistos)
+        vectors: List[List[float]] = []
+        texts = [c.page_content for c in chunks]
+        for start in range(0, len(texts), EMBED_BATCH_SIZE):
+            vectors.extend(self.embeddings.embed_documents(texts[start:start + EMBED_BATCH_SIZE]))
+
+        text_embeddings = list(zip(texts, vectors))
+        metadatas = [c.metadata for c in chunks]
+
+        # 4. Índice nuevo, o copy-on-write sobre el actual
+        if rebuild:
+            if current is None and not chunks:
+                return summary
+            dim = current.index.d if current is not None else len(vectors[0])
+            new_store = self._new_store(target_kind, np.asarray(vectors, dtype=np.float32).reshape(-1, dim))
+            if chunks:
+                new_store.add_embeddings(text_embeddings, metadatas=metadatas, ids=chunk_ids)
+            new_lexical = BM25Index.build(zip(chunk_ids, chunks))
+        else:
+            new_lexical = self.lexical_index.with_changes(zip(chunk_ids, chunks), stale_ids)
+            new_store = index_store.clone_vectorstore(self.vectorstore)
+            if stale_ids:
+                new_store.delete(stale_ids)
+            if chunks:
+                new_store.add_embeddings(text_embeddings, metadatas=metadatas, ids=chunk_ids)
+
+        documents = {
+            doc_id: meta for doc_id, meta in indexed.items()
+            if doc_id not in removed and (not rebuild or doc_id in chunk_counts)
+        }
+        for doc_id, doc in changed.items():
+            documents[doc_id] = {"hash": document_hash(doc), "chunks": chunk_counts[doc_id]}
+
+        # 5. Persistimos la nueva versión y recién entonces la publicamos
+        self._publish_locked(new_store, new_lexical, documents)
+        summary["chunks_added"] = new_chunks
+        logger.info(
+            f"✅ Ingesta: {len(changed)} documentos actualizados ({new_chunks} chunks), {len(removed)} eliminados."
+        )
+        return summary
+
+    def split_document(self, doc_id: str, doc: Document) -> List[Document]:
+        """Chunks de un documento, marcados con su doc_id (ids deterministas: ver chunk_ids_for)."""
+        doc_chunks = self.text_splitter.split_documents([doc])
+        for chunk in doc_chunks:
+            chunk.metadata["doc_id"] = doc_id
+        return doc_chunks
+
+    def _new_store(self, kind: str, vectors: np.ndarray) -> FAISS:
+        """Vectorstore vacío con un índice del tipo pedido (entrenado con `vectors` si hace falta)."""
+        index = index_factory.build_index(kind, vectors, self._faiss_params())
+        return FAISS(self.embeddings, index, InMemoryDocstore(), {})
+
+    def _build_manifest(self, vectorstore: FAISS, documents: dict[str, dict]) -> dict:
+        params = self._index_params()
+        return {
+            **params,
+            "fingerprint": index_store.params_fingerprint(params),
+            "index_kind": index_factory.index_kind(vectorstore.index),
+            "num_documents": len(documents),
+            "num_chunks": vectorstore.index.ntotal,
+            "documents": documents,
+        }
+
+    def _publish_locked(self, vectorstore: FAISS, lexical_index: BM25Index, documents: dict[str, dict]):
+        """Persiste una versión nueva y recién entonces la publica para las búsquedas."""
+        manifest = self._build_manifest(vectorstore, documents)
+        try:
+            manifest["_version"] = index_store.save_index(self.index_dir, vectorstore, manifest)
+            logger.info(f"💾 Índice persistido (versión {manifest['_version']}).")
+        except Exception as e:
+            # El índice en memoria sigue siendo válido; solo perdemos el arranque rápido
+            logger.error(f"🔥 Error persistiendo índice: {e}")
+
+        self.lexical_index = lexical_index
+        self.vectorstore, self.manifest = vectorstore, manifest
+
+    # --- Ingesta masiva ---
+
+    @contextmanager
+    def bulk_session(self) -> Iterator["BulkSession"]:
+        """
+        Sesión de ingesta masiva (CLI): toma los locks durante toda la carga y agrega
+        slabs sobre una única copia de trabajo, sin clonar ni persistir el índice en cada lote.
+        """
+        self.initialize()
+        with self._write_lock, index_store.build_lock(self.index_dir):
+            self._sync_with_disk()
+            session = BulkSession(self)
+            yield session
+            session.finish()
+
+    def _load_raw_documents(self) -> List[Document]:
+        """Corpus base inicial. Su 'source' funciona como id del documento."""
         # Simulamos documentos "largos" (Raw Text)
-        raw_documents = [
+        return [
             Document(
                 page_content="""TITULO: ERROR 503 EN SERVICIOS DE PAGOS.
                 Este error suele ocurrir durante eventos de alto tráfico como CyberMonday.
@@ -76,37 +647,152 @@ class RAGService:
             )
         ]
 
-        # PASO CRÍTICO: Splitting
-        # Aquí convertimos 3 documentos largos en quizás 5 o 6 chunks manejables
-        logger.info("🔪 Fragmentando documentos...")
-        split_docs = self.text_splitter.split_documents(raw_documents)
-        
-        logger.info(f"Generados {len(split_docs)} chunks a partir de {len(raw_documents)} documentos originales.")
+    def search(self, query: str) -> Optional[str]:
+        self.initialize()
+        self._maybe_reload()
+
+        # Tomamos una referencia local: si una ingesta hace el swap en medio, no nos afecta
+        vectorstore, lexical_index = self.vectorstore, self.lexical_index
+        if not vectorstore: return None
+
+        decided, context, lexical_hits = self._lexical_stage(lexical_index, query)
+        if decided:
+            return context
+
+        embedding = self.embeddings.embed_query(query)
+        return self._hybrid_search(vectorstore, lexical_index, embedding, lexical_hits)
+
+    async def asearch(self, query: str) -> Optional[str]:
+        """
+        Versión async: el embedding de la consulta es una llamada de red no bloqueante
+        y la búsqueda FAISS (CPU) corre en el threadpool, fuera del event loop.
+        """
+        await self.ainitialize()
+        self._maybe_reload_in_background()
 
+        vectorstore, lexical_index = self.vectorstore, self.lexical_index
+        if not vectorstore: return None
+
+        # La etapa léxica es un par de lookups en memoria: corre directo en el loop
+        decided, context, lexical_hits = self._lexical_stage(lexical_index, query)
+        if decided:
+            return context
+
+        embedding = await self.embeddings.aembed_query(query)
+        return await asyncio.to_thread(self._hybrid_search, vectorstore, lexical_index, embedding, lexical_hits)
+
+    def _count(self, key: str):
+        with self._counters_lock:
+            self.retrieval_counters[key] += 1
+        RAG_RETRIEVALS.labels(key).inc()
+
+    def index_stats(self) -> dict:
+        vectorstore = self.vectorstore
+        if vectorstore is None:
+            return {"kind": None, "vectors": 0}
+        return {
+            "configured": RAG_INDEX_TYPE,
+            "kind": index_factory.index_kind(vectorstore.index),
+            "vectors": vectorstore.index.ntotal,
+            "disk_bytes": self._index_file_size(),
+        }
+
+    def memory_bytes(self) -> int:
+        """
+        Memoria aproximada de la colección cargada: índice + docstore de la versión activa (tamaño en
+        disco, que con mmap es lo que termina en el page cache). Se recalcula solo al cambiar la versión.
+        """
+        version = self.manifest.get("_version")
+        if version is None or self._footprint[0] == version:
+            return self._footprint[1]
+        path = os.path.join(self.index_dir, version)
         try:
-            # Indexamos los fragmentos (chunks), no los documentos enteros
-            self.vectorstore = FAISS.from_documents(split_docs, self.embeddings)
-            logger.info("✅ VectorStore listo.")
-        except Exception as e:
-            logger.error(f"🔥 Error FAISS: {e}")
-            self.vectorstore = None
+            size = sum(
+                os.path.getsize(os.path.join(path, f)) for f in (index_store.INDEX_FILE, index_store.DOCSTORE_FILE)
+            )
+        except OSError:
+            size = 0
+        self._footprint = (version, size)
+        return size
 
-    def search(self, query: str) -> Optional[str]:
-        if not self.vectorstore: return None
+    def _index_file_size(self) -> Optional[int]:
+        """Tamaño del índice persistido (con mmap, es lo que ocupa en el page cache)."""
+        version = self.manifest.get("_version")
+        try:
+            return os.path.getsize(os.path.join(self.index_dir, version, index_store.INDEX_FILE)) if version else None
+        except OSError:
+            return None
 
-        self.embeddings.task_type = "retrieval_query"
-        
-        # Ahora al buscar, recuperamos fragmentos específicos
-        results = self.vectorstore.similarity_search_with_relevance_scores(query, k=2)
-        
-        valid_docs = []
-        for doc, score in results:
+    def retrieval_stats(self) -> dict:
+        with self._counters_lock:
+            counters = dict(self.retrieval_counters)
+        total = sum(counters.values())
+        skipped = counters["lexical_answered"] + counters["lexical_rejected"]
+        return {**counters, "embedding_skip_rate": round(skipped / total, 3) if total else 0.0}
+
+    def _lexical_stage(self, lexical_index: BM25Index, query: str) -> tuple[bool, Optional[str], List[LexicalHit]]:
+        """
+        Atajo sin red antes de embeber la consulta. Devuelve (decidido, contexto, hits léxicos):
+        - La consulta no tiene ningún término útil (vacía, solo stopwords): no hay nada que buscar.
+        - Con RAG_LEXICAL_REJECT_NO_OVERLAP, tampoco si ningún término existe en el corpus
+          (por defecto esas siguen a FAISS: sinónimos, otro idioma).
+        - Match fuerte (identificador exacto como '503' o 'payment-service' y alta cobertura):
+          se responde con los chunks léxicos.
+        Si no decide, los hits se reutilizan en la fusión híbrida.
+        """
+        terms, hits = lexical_index.search(query, RAG_HYBRID_CANDIDATES)
+
+        if not terms or (RAG_LEXICAL_REJECT_NO_OVERLAP and not hits and len(lexical_index)):
+            logger.info("⚡ Consulta sin términos útiles (o sin términos del corpus): se descarta sin embeber.")
+            self._count("lexical_rejected")
+            return True, None, hits
+
+        if RAG_LEXICAL_FASTPATH and hits and hits[0].matched_identifier and hits[0].coverage >= RAG_LEXICAL_FASTPATH_COVERAGE:
+            strong = [h for h in hits[:TOP_K] if h.coverage >= RAG_LEXICAL_FASTPATH_COVERAGE]
+            for hit in strong:
+                source = lexical_index.documents[hit.chunk_id].metadata.get('source', 'desconocido')
+                logger.info(f"⚡ Match léxico en '{source}' (BM25: {hit.score:.2f}, cobertura: {hit.coverage:.2f})")
+            self._count("lexical_answered")
+            return True, "\n\n".join(lexical_index.documents[h.chunk_id].page_content for h in strong), hits
+
+        return False, None, hits
+
+    def _hybrid_search(
+        self, vectorstore: FAISS, lexical_index: BM25Index, embedding: List[float], lexical_hits: List[LexicalHit]
+    ) -> Optional[str]:
+        """
+        Fusiona FAISS y BM25 con Reciprocal Rank Fusion. Solo son elegibles los chunks
+        que superan el umbral de similitud o tienen buena cobertura léxica.
+        """
+        self._count("hybrid")
+        relevance_score_fn = vectorstore._select_relevance_score_fn()
+        with FAISS_SEARCH_DURATION.labels(index_factory.index_kind(vectorstore.index)).time():
+            results = vectorstore.similarity_search_with_score_by_vector(embedding, k=RAG_HYBRID_CANDIDATES)
+
+        fused: dict[str, float] = {}
+        docs: dict[str, Document] = {}
+        eligible: set[str] = set()
+
+        for rank, (doc, distance) in enumerate(results):
+            chunk_id = doc.id or doc.page_content
+            if is_stale_id(chunk_id):
+                # Vector de un chunk reemplazado en un checkpoint de ingesta masiva (aún sin compactar)
+                continue
+            fused[chunk_id] = fused.get(chunk_id, 0.0) + 1 / (RRF_K + rank + 1)
+            docs[chunk_id] = doc
+            score = relevance_score_fn(distance)
             if score >= SIMILARITY_THRESHOLD:
-                # Podemos usar la metadata para enriquecer la respuesta si quisiéramos
-                source = doc.metadata.get('source', 'desconocido')
-                logger.info(f"✅ Match en '{source}' (Score: {score:.3f})")
-                valid_docs.append(doc.page_content)
-        
-        return "\n\n".join(valid_docs) if valid_docs else None
+                logger.info(f"✅ Match en '{doc.metadata.get('source', 'desconocido')}' (Score: {score:.3f})")
+                eligible.add(chunk_id)
+
+        for rank, hit in enumerate(lexical_hits):
+            doc = lexical_index.documents.get(hit.chunk_id)
+            if doc is None:
+                continue
+            fused[hit.chunk_id] = fused.get(hit.chunk_id, 0.0) + 1 / (RRF_K + rank + 1)
+            docs.setdefault(hit.chunk_id, doc)
+            if hit.coverage >= RAG_LEXICAL_MIN_COVERAGE:
+                eligible.add(hit.chunk_id)
 
-rag_service = RAGService()
\ No newline at end of file
+        ranked = sorted(eligible, key=lambda cid: fused[cid], reverse=True)[:TOP_K]
+        return "\n\n".join(docs[cid].page_content for cid in ranked) if ranked else None
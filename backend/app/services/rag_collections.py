@@ -0,0 +1,172 @@
+import os
+import re
+import time
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, asdict
+from typing import Optional
+
+from app.core.config import RAG_INDEX_DIR, RAG_COLLECTIONS_DIR, RAG_COLLECTIONS_MEMORY_MB, RAG_PINNED_COLLECTIONS
+from app.schemas.rag_schemas import COLLECTION_NAME_PATTERN
+from app.services.rag import RAGService, DEFAULT_COLLECTION
+from app.utils.metrics import RAG_COLLECTION_EVENTS
+
+logger = logging.getLogger(__name__)
+
+_COLLECTION_NAME = re.compile(COLLECTION_NAME_PATTERN)
+
+
+class UnknownCollection(KeyError):
+    """La colección no existe (se crea al cargarle documentos)."""
+
+
+@dataclass
+class CollectionStats:
+    hits: int = 0
+    loads: int = 0
+    evictions: int = 0
+    last_load_seconds: Optional[float] = None
+    last_used: Optional[float] = None
+
+
+class CollectionManager:
+    """
+    Colecciones RAG con nombre, cada una con su índice, BM25 y documentos persistidos por separado.
+    - Se cargan al primer uso (las fijadas, en el warm-up) y quedan en memoria en orden LRU.
+    - Si la memoria estimada de las cargadas supera el presupuesto, se descargan las menos usadas
+      que no estén fijadas. Las búsquedas en curso conservan su referencia: descargar nunca las corta.
+    Así la memoria de cada worker escala con las colecciones que se usan, no con el corpus total.
+    """
+
+    def __init__(self, base_dir: str, memory_budget_bytes: int, pinned: list[str]):
+        self.base_dir = base_dir
+        self.memory_budget_bytes = memory_budget_bytes
+        self.pinned = set(pinned)
+        for name in self.pinned:
+            self.validate_name(name)
+        # nombre -> servicio cargado, del menos al más recientemente usado
+        self._loaded: OrderedDict[str, RAGService] = OrderedDict()
+        self._stats: dict[str, CollectionStats] = {}
+        self._load_locks: dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def validate_name(name: str):
+        if not _COLLECTION_NAME.match(name):
+            raise ValueError(f"Nombre de colección inválido: '{name}' (minúsculas, dígitos, '-' y '_')")
+
+    def path_for(self, name: str) -> str:
+        return RAG_INDEX_DIR if name == DEFAULT_COLLECTION else os.path.join(self.base_dir, name)
+
+    def exists(self, name: str) -> bool:
+        return name == DEFAULT_COLLECTION or os.path.isdir(self.path_for(name))
+
+    def names(self) -> list[str]:
+        """Colecciones en disco (la por defecto siempre existe)."""
+        try:
+            on_disk = [n for n in os.listdir(self.base_dir) if _COLLECTION_NAME.match(n) and n != DEFAULT_COLLECTION]
+        except OSError:
+            on_disk = []
+        return [DEFAULT_COLLECTION, *sorted(on_disk)]
+
+    # --- Acceso ---
+
+    def get(self, name: str = DEFAULT_COLLECTION, create: bool = False) -> RAGService:
+        """Colección cargada y lista para buscar. Con `create`, una colección nueva empieza vacía."""
+        self.validate_name(name)
+        service = self._touch(name)
+        if service is not None:
+            return service
+        if not create and not self.exists(name):
+            raise UnknownCollection(name)
+
+        with self._lock:
+            load_lock = self._load_locks.setdefault(name, threading.Lock())
+        # Un lock por colección: la carga de una no frena a las búsquedas sobre las demás
+        with load_lock:
+            service = self._touch(name)
+            if service is not None:
+                return service
+
+            start = time.perf_counter()
+            service = RAGService(name, self.path_for(name), seed=name == DEFAULT_COLLECTION)
+            service.initialize()
+            elapsed = time.perf_counter() - start
+
+            with self._lock:
+                stats = self._stats.setdefault(name, CollectionStats())
+                stats.loads += 1
+                stats.last_load_seconds = round(elapsed, 3)
+                stats.last_used = time.time()
+                self._loaded[name] = service
+                self._enforce_budget_locked(keep=name)
+            RAG_COLLECTION_EVENTS.labels(name, "load").inc()
+            logger.info(f"📚 Colección '{name}' cargada en {elapsed:.2f}s ({service.memory_bytes() / 2**20:.1f} MB).")
+            return service
+
+    async def aget(self, name: str = DEFAULT_COLLECTION, create: bool = False) -> RAGService:
+        """Para el event loop: si ya está cargada sale directo; si no, la carga corre en el threadpool."""
+        service = self._touch(name) if _COLLECTION_NAME.match(name) else None
+        return service if service is not None else await asyncio.to_thread(self.get, name, create)
+
+    def _touch(self, name: str) -> Optional[RAGService]:
+        with self._lock:
+            service = self._loaded.get(name)
+            if service is None:
+                return None
+            self._loaded.move_to_end(name)
+            stats = self._stats[name]
+            stats.hits += 1
+            stats.last_used = time.time()
+            # Tras una ingesta la colección puede haber crecido
+            self._enforce_budget_locked(keep=name)
+        RAG_COLLECTION_EVENTS.labels(name, "hit").inc()
+        return service
+
+    def _enforce_budget_locked(self, keep: str):
+        """Descarga las colecciones menos usadas (no fijadas) hasta entrar en el presupuesto."""
+        if self.memory_budget_bytes <= 0:
+            return
+        total = sum(s.memory_bytes() for s in self._loaded.values())
+        for name in list(self._loaded):
+            if total <= self.memory_budget_bytes:
+                return
+            if name == keep or name in self.pinned:
+                continue
+            total -= self._loaded.pop(name).memory_bytes()
+            self._stats[name].evictions += 1
+            RAG_COLLECTION_EVENTS.labels(name, "evict").inc()
+            logger.info(f"♻️ Colección '{name}' descargada (presupuesto de {self.memory_budget_bytes / 2**20:.0f} MB).")
+
+    # --- Ciclo de vida ---
+
+    def warm_up(self):
+        """Carga las colecciones fijadas (lo llama el warm-up del lifespan)."""
+        for name in self.pinned:
+            if self.exists(name):
+                self.get(name)
+
+    def stats(self) -> dict:
+        with self._lock:
+            loaded = dict(self._loaded)
+            stats = {name: asdict(s) for name, s in self._stats.items()}
+        collections = {}
+        for name in self.names():
+            service = loaded.get(name)
+            collections[name] = {
+                "loaded": service is not None,
+                "pinned": name in self.pinned,
+                "memory_bytes": service.memory_bytes() if service is not None else 0,
+                "documents": service.manifest.get("num_documents", 0) if service is not None else None,
+                **stats.get(name, asdict(CollectionStats())),
+            }
+        return {
+            "memory_budget_bytes": self.memory_budget_bytes,
+            "loaded_bytes": sum(c["memory_bytes"] for c in collections.values()),
+            "collections": collections,
+        }
+
+
+rag_collections = CollectionManager(RAG_COLLECTIONS_DIR, RAG_COLLECTIONS_MEMORY_MB * 2**20, RAG_PINNED_COLLECTIONS)
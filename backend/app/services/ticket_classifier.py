@@ -0,0 +1,224 @@
+import re
+import zlib
+import random
+import logging
+import threading
+import unicodedata
+from typing import Optional
+
+import numpy as np
+
+from app.core.config import (
+    FASTPATH_ENABLED, FASTPATH_THRESHOLD, FASTPATH_MIN_SIMILARITY, FASTPATH_SHADOW_RATE, FASTPATH_MAX_EXAMPLES
+)
+
+logger = logging.getLogger(__name__)
+
+# Dimensión del espacio de hashing (potencia de 2). Chica a propósito: el kNN es un producto matriz-vector.
+N_FEATURES = 2 ** 11
+K_NEIGHBORS = 5
+
+# Separadores de cláusulas: un ticket puede traer dos problemas ("olvidé la clave y el servidor da 500")
+CLAUSE_SEPARATORS = re.compile(r"[,.;:!?]+|\b(?:y|e|pero|aunque|ademas|tambien|and|but|also)\b")
+
+# Frase de 'reason' para decisiones locales (el LLM genera la suya propia)
+FASTPATH_REASONS = {
+    "general": "Saludo o consulta que no requiere soporte (clasificación local).",
+    "user-issue": "Problema de acceso, cuenta o facturación del usuario (clasificación local).",
+    "technical-issue": "Reporte de error o fallo del software (clasificación local).",
+}
+
+# Tickets etiquetados que sirven de base al clasificador local
+SEED_EXAMPLES: list[tuple[str, str]] = [
+    ("hola", "general"),
+    ("hola, buenos días", "general"),
+    ("buenas tardes", "general"),
+    ("gracias!", "general"),
+    ("muchas gracias por la ayuda", "general"),
+    ("hola, cómo estás?", "general"),
+    ("qué tal?", "general"),
+    ("hello", "general"),
+    ("hi there", "general"),
+    ("thanks a lot", "general"),
+    ("adiós, saludos", "general"),
+    ("quién ganó el partido de ayer?", "general"),
+    ("olvidé mi contraseña", "user-issue"),
+    ("me olvidé la clave", "user-issue"),
+    ("no puedo entrar a mi cuenta, me olvidé la clave", "user-issue"),
+    ("no recuerdo mi contraseña", "user-issue"),
+    ("cómo cambio mi contraseña?", "user-issue"),
+    ("quiero resetear mi contraseña", "user-issue"),
+    ("no puedo iniciar sesión", "user-issue"),
+    ("mi cuenta está bloqueada", "user-issue"),
+    ("forgot my password", "user-issue"),
+    ("i can't log in to my account", "user-issue"),
+    ("tengo una duda con mi factura", "user-issue"),
+    ("me cobraron dos veces", "user-issue"),
+    ("cómo descargo mi factura?", "user-issue"),
+    ("error 500 al guardar", "technical-issue"),
+    ("la página devuelve error 500", "technical-issue"),
+    ("error 404 en la página de pagos", "technical-issue"),
+    ("el servidor responde 503", "technical-issue"),
+    ("la aplicación se cae al abrir el reporte", "technical-issue"),
+    ("la app se cierra sola", "technical-issue"),
+    ("el botón de pagar no hace nada", "technical-issue"),
+    ("hay un bug en el formulario de registro", "technical-issue"),
+    ("la api devuelve timeout", "technical-issue"),
+    ("el sistema está caído", "technical-issue"),
+    ("internal server error when saving", "technical-issue"),
+    ("the checkout page crashes", "technical-issue"),
+]
+
+
+def _normalize(text: str) -> str:
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def vectorize(text: str) -> np.ndarray:
+    """
+    Hashing trick sobre palabras + n-gramas de caracteres (3 a 5), normalizado L2.
+    No necesita vocabulario ni entrenamiento, y es robusto a typos y conjugaciones.
+    """
+    norm = _normalize(text)
+    vector = np.zeros(N_FEATURES, dtype=np.float32)
+
+    words = re.findall(r"\w+", norm)
+    features = [f"w:{w}" for w in words]
+    padded = f" {norm} "
+    for n in (3, 4, 5):
+        features.extend(f"c:{padded[i:i + n]}" for i in range(len(padded) - n + 1))
+
+    for feature in features:
+        h = zlib.crc32(feature.encode())
+        # El bit alto decide el signo: reduce el sesgo de las colisiones
+        vector[h % N_FEATURES] += 1.0 if h & 0x80000000 else -1.0
+
+    norm_value = np.linalg.norm(vector)
+    return vector / norm_value if norm_value else vector
+
+
+class TicketClassifier:
+    """
+    Pre-clasificador local: kNN (coseno) sobre tickets ya etiquetados.
+    Solo decide cuando está muy seguro; si no, el ticket sigue al LLM.
+    Aprende de las decisiones del LLM (hasta FASTPATH_MAX_EXAMPLES ejemplos).
+    """
+
+    def __init__(self, examples: list[tuple[str, str]]):
+        self._lock = threading.Lock()
+        self._texts = [text for text, _ in examples]
+        self._labels = [label for _, label in examples]
+        self._matrix = np.stack([vectorize(text) for text in self._texts])
+        self._seed_count = len(examples)
+
+        self.counters = {"fast_path": 0, "llm": 0, "shadow": 0, "agree": 0, "disagree": 0}
+
+    def predict(self, text: str) -> tuple[str, float, float]:
+        """Devuelve (categoría, confianza del voto, similitud del vecino más cercano)."""
+        with self._lock:
+            matrix, labels = self._matrix, self._labels
+
+        sims = matrix @ vectorize(text)
+        top = np.argsort(sims)[::-1][:K_NEIGHBORS]
+
+        votes: dict[str, float] = {}
+        for i in top:
+            votes[labels[i]] = votes.get(labels[i], 0.0) + max(float(sims[i]), 0.0)
+
+        total = sum(votes.values())
+        if total == 0:
+            return "general", 0.0, 0.0
+
+        label = max(votes, key=lambda k: votes[k])
+        return label, votes[label] / total, float(sims[top[0]])
+
+    def mixed_signals(self, text: str, label: str) -> bool:
+        """
+        ¿Alguna cláusula del ticket apunta con confianza a otra categoría? El voto del ticket
+        entero lo decide la cláusula más parecida a un ejemplo y esconde la otra señal.
+        Un saludo o agradecimiento ('general') junto a un problema real no cuenta como conflicto.
+        """
+        clauses = [c.strip() for c in CLAUSE_SEPARATORS.split(_normalize(text)) if c.strip()]
+        if len(clauses) < 2:
+            return False
+        for clause in clauses:
+            clause_label, confidence, _ = self.predict(clause)
+            conflicting = clause_label != label and (clause_label != "general" or label == "general")
+            if conflicting and confidence >= FASTPATH_THRESHOLD:
+                return True
+        return False
+
+    def fast_path_prediction(self, text: str) -> Optional[tuple[str, float]]:
+        """(categoría, confianza) con la que el fast-path decidiría el ticket (sin muestreo shadow), o None."""
+        label, confidence, similarity = self.predict(text)
+        if confidence < FASTPATH_THRESHOLD or similarity < FASTPATH_MIN_SIMILARITY:
+            return None
+        if self.mixed_signals(text, label):
+            return None
+        return label, confidence
+
+    def decide(self, text: str) -> Optional[tuple[str, str, float]]:
+        """
+        Si el ticket es 'obvio' devuelve (categoría, reason, confianza).
+        Devuelve None para derivar al LLM (poca confianza o señales de más de una categoría).
+        """
+        if not FASTPATH_ENABLED:
+            return None
+
+        prediction = self.fast_path_prediction(text)
+        if prediction is None:
+            return None
+        label, confidence = prediction
+
+        # Muestreo "shadow": una fracción de los aciertos locales también va al LLM
+        # para poder medir el acuerdo entre ambos
+        if FASTPATH_SHADOW_RATE and random.random() < FASTPATH_SHADOW_RATE:
+            with self._lock:
+                self.counters["shadow"] += 1
+            return None
+
+        return label, FASTPATH_REASONS[label], confidence
+
+    def record(self, source: str, text: str, llm_label: Optional[str] = None):
+        """
+        Registra una decisión. Si vino del LLM la aprende y, si el fast-path la hubiera tomado
+        (muestreo shadow, o el fast-path deshabilitado), compara ambas: el acuerdo mide la
+        precisión del fast-path, no la de cualquier predicción local de baja confianza.
+        """
+        with self._lock:
+            self.counters["fast_path" if source == "fast-path" else "llm"] += 1
+
+        if llm_label is None:
+            return
+
+        prediction = self.fast_path_prediction(text)
+        with self._lock:
+            if prediction is not None:
+                self.counters["agree" if prediction[0] == llm_label else "disagree"] += 1
+
+            # Aprendizaje online: agregamos el ticket etiquetado por el LLM a la memoria del kNN
+            if len(self._labels) < FASTPATH_MAX_EXAMPLES and text not in self._texts:
+                self._texts = [*self._texts, text]
+                self._labels = [*self._labels, llm_label]
+                self._matrix = np.vstack([self._matrix, vectorize(text)])
+
+    def stats(self) -> dict:
+        with self._lock:
+            c = dict(self.counters)
+            examples = len(self._labels)
+        decided = c["fast_path"] + c["llm"]
+        compared = c["agree"] + c["disagree"]
+        return {
+            **c,
+            "enabled": FASTPATH_ENABLED,
+            "threshold": FASTPATH_THRESHOLD,
+            "fast_path_rate": round(c["fast_path"] / decided, 3) if decided else 0.0,
+            "agreement_rate": round(c["agree"] / compared, 3) if compared else None,
+            "examples": examples,
+            "learned_examples": examples - self._seed_count,
+        }
+
+
+ticket_classifier = TicketClassifier(SEED_EXAMPLES)
@@ -1,9 +1,35 @@
-import math
 from datetime import datetime
+from typing import Callable
 import pytz
-from langchain_core.tools import tool
+from langchain_core.tools import tool, BaseTool
+from app.core.config import REACT_TOOL_TIMEOUT_SECONDS
 from app.core.settings import settings
+from app.utils.safe_math import safe_eval, MathError
 
+# Registro de herramientas del agente: la lista que se bindea al modelo
+# y el timeout propio de cada una (lo aplica el nodo que las ejecuta)
+tools: list[BaseTool] = []
+TOOL_TIMEOUTS: dict[str, float] = {}
+
+def register_tool(timeout: float = REACT_TOOL_TIMEOUT_SECONDS) -> Callable[[BaseTool], BaseTool]:
+    """
+    Registra una herramienta para el agente:
+
+        @register_tool(timeout=2.0)
+        @tool
+        def mi_herramienta(...): ...
+    """
+    def decorator(agent_tool: BaseTool) -> BaseTool:
+        tools.append(agent_tool)
+        TOOL_TIMEOUTS[agent_tool.name] = timeout
+        return agent_tool
+    return decorator
+
+def now_in_configured_timezone() -> datetime:
+    """Fecha y hora actual en la zona horaria configurada en el sistema."""
+    return datetime.now(pytz.timezone(settings.get_timezone()))
+
+@register_tool(timeout=2.0)
 @tool
 def datetime_info() -> str:
     """
@@ -11,33 +37,29 @@ def datetime_info() -> str:
     Usa la zona horaria configurada en el sistema.
     """
     try:
-        tz_str = settings.get_timezone()
-        tz = pytz.timezone(tz_str)
-        now = datetime.now(tz)
-        return f"Fecha y hora actual ({tz_str}): {now.isoformat()}"
+        now = now_in_configured_timezone()
+        return f"Fecha y hora actual ({settings.get_timezone()}): {now.isoformat()}"
     except Exception as e:
         return f"Error obteniendo fecha: {str(e)}"
 
+@register_tool(timeout=5.0)
 @tool
 def math_calculator(expression: str) -> str:
     """
     Calculadora matemática útil para realizar operaciones numéricas.
     Esta herramienta solo acepta números como input.
-    Soporta operaciones básicas (+, -, *, /) y funciones avanzadas de la librería math 
+    Soporta operaciones básicas (+, -, *, /) y funciones avanzadas de la librería math
     como 'log', 'sin', 'cos', 'sqrt', 'pow', etc.
     Ejemplo: 'math.log(10)' o '20 ** 2'.
     """
     try:
-        # Por seguridad, limitamos el entorno de ejecución
-        # Solo permitimos el módulo 'math'
-        allowed_globals = {"__builtins__": None, "math": math}
-        
-        # Evaluamos la expresión matemática
-        result = eval(expression, allowed_globals)
+        # Evaluador con lista blanca sobre el AST (sin eval), con límites de tamaño y tiempo
+        result = safe_eval(expression)
         return str(result)
-    except Exception as e:
+    except MathError as e:
         return f"Error matemático: {str(e)}. Asegúrate de usar sintaxis Python válida (ej: math.log(10))"
 
+@register_tool(timeout=2.0)
 @tool
 def convert_date_to_timestamp(date_string: str) -> str:
     """
@@ -55,5 +77,37 @@ def convert_date_to_timestamp(date_string: str) -> str:
     except Exception as e:
         return f"Error inesperado: {str(e)}"
 
-# Lista de herramientas para exportar
-tools = [datetime_info, math_calculator, convert_date_to_timestamp]
\ No newline at end of file
+# --- Herramientas fusionadas ---
+# Cadenas deterministas (fecha -> timestamp -> cálculo) resueltas en un único paso de
+# herramienta: cada paso intermedio que se ahorra es un round-trip menos al LLM.
+
+@register_tool(timeout=2.0)
+@tool
+def current_timestamp() -> str:
+    """
+    Devuelve el timestamp Unix actual (segundos desde 1970-01-01 UTC) junto con
+    la fecha y hora en la zona horaria configurada. Equivale a usar `datetime_info`
+    y luego `convert_date_to_timestamp`, pero en un solo paso.
+    """
+    try:
+        now = now_in_configured_timezone()
+        return f"Timestamp actual: {now.timestamp()} (fecha y hora en {settings.get_timezone()}: {now.isoformat()})"
+    except Exception as e:
+        return f"Error obteniendo fecha: {str(e)}"
+
+@register_tool(timeout=5.0)
+@tool
+def date_calculator(expression: str) -> str:
+    """
+    Calculadora con la fecha actual incorporada: la variable `now` vale el timestamp
+    Unix actual (en segundos). Úsala para cualquier cálculo que involucre la fecha u
+    hora actual, sin pasos previos. Soporta las mismas operaciones que `math_calculator`.
+    Ejemplos: 'now + 3600' (dentro de una hora), 'now / 86400' (días desde 1970),
+    'math.log(now)'.
+    """
+    try:
+        now = now_in_configured_timezone().timestamp()
+        result = safe_eval(expression, variables={"now": now})
+        return f"{result} (calculado con now={now})"
+    except MathError as e:
+        return f"Error matemático: {str(e)}. Asegúrate de usar sintaxis Python válida (ej: now + 3600)"
@@ -0,0 +1,297 @@
+import math
+import time
+import asyncio
+import functools
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator, Optional, Sequence
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+
+# Métricas en memoria del proceso, expuestas en /metrics con el formato de texto de
+# Prometheus (sin dependencias extra). Con varios workers cada uno expone las suyas:
+# Prometheus las distingue por instancia y se agregan al consultar.
+
+# Buckets (segundos) por defecto de Prometheus, y variantes para etapas muy rápidas o muy lentas
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+FAST_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1)
+LLM_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 15.0, 30.0, 60.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: list["_Metric"] = []
+        self._lock = threading.Lock()
+
+    def register(self, metric: "_Metric"):
+        with self._lock:
+            self._metrics.append(metric)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics)
+        return "".join(metric.render() for metric in metrics)
+
+
+REGISTRY = Registry()
+
+
+class _Metric:
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), registry: Registry = REGISTRY):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: dict[tuple[str, ...], Any] = {}
+        self._lock = threading.Lock()
+        registry.register(self)
+
+    def labels(self, *values: Any) -> Any:
+        if len(values) != len(self.labelnames):
+            raise ValueError(f"{self.name} espera las etiquetas {self.labelnames}")
+        key = tuple(str(v) for v in values)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _new_child(self) -> Any:
+        raise NotImplementedError
+
+    def _samples(self, labels: tuple[str, ...], child: Any) -> Iterator[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        with self._lock:
+            children = sorted(self._children.items())
+        for labels, child in children:
+            lines.extend(self._samples(labels, child))
+        return "\n".join(lines) + "\n"
+
+
+class _CounterChild:
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self.value += amount
+
+
+class Counter(_Metric):
+    """Contador monótono. Por convención de Prometheus el nombre termina en `_total`."""
+
+    type_name = "counter"
+
+    def _new_child(self) -> _CounterChild:
+        return _CounterChild()
+
+    def _samples(self, labels, child) -> Iterator[str]:
+        yield f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(child.value)}"
+
+
+class _HistogramChild:
+    def __init__(self, buckets: tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = next((i for i, bound in enumerate(self.buckets) if value <= bound), len(self.buckets))
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    @contextmanager
+    def time(self) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS, registry: Registry = REGISTRY):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self) -> _HistogramChild:
+        return _HistogramChild(self.buckets)
+
+    def _samples(self, labels, child) -> Iterator[str]:
+        with child._lock:
+            counts, total = list(child.counts), child.sum
+        cumulative = 0
+        for bound, count in zip(self.buckets + (math.inf,), counts):
+            cumulative += count
+            le = f'le="{_format_value(bound)}"'
+            yield f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}"
+        yield f"{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(total)}"
+        yield f"{self.name}_count{_format_labels(self.labelnames, labels)} {cumulative}"
+
+
+# --- Métricas de la app ---
+
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "Latencia de los endpoints (hasta el último byte de la respuesta).",
+    ("method", "route", "status"),
+)
+GRAPH_NODE_DURATION = Histogram(
+    "graph_node_duration_seconds", "Duración de cada nodo de los grafos de LangGraph.", ("graph", "node", "status"),
+    buckets=FAST_BUCKETS[:4] + DEFAULT_BUCKETS,
+)
+LLM_REQUEST_DURATION = Histogram(
+    "llm_request_duration_seconds", "Latencia de las llamadas a LLMs.", ("model", "status"), buckets=LLM_BUCKETS,
+)
+LLM_TOKENS = Counter("llm_tokens_total", "Tokens consumidos por modelo.", ("model", "type"))
+LLM_RETRIES = Counter("llm_retries_total", "Reintentos del gateway de LLMs ante errores transitorios.", ("model",))
+LLM_COALESCED = Counter(
+    "llm_coalesced_total", "Requests que reutilizaron una llamada idéntica en vuelo (single-flight).", ("model", "runnable"),
+)
+LLM_CACHE_LOOKUPS = Counter(
+    "llm_cache_lookups_total", "Consultas a la cache persistente de respuestas de LLM.", ("runnable", "result"),
+)
+EMBEDDING_REQUEST_DURATION = Histogram(
+    "embedding_request_duration_seconds", "Latencia de las llamadas al proveedor de embeddings.", ("model", "task"),
+)
+EMBEDDING_TEXTS = Counter(
+    "embedding_texts_total", "Textos embebidos según de dónde salió el vector (cache o proveedor).", ("model", "source"),
+)
+FAISS_SEARCH_DURATION = Histogram(
+    "faiss_search_duration_seconds", "Tiempo de búsqueda en el índice FAISS.", ("index",), buckets=FAST_BUCKETS,
+)
+RAG_RETRIEVALS = Counter("rag_retrievals_total", "Búsquedas RAG por camino de resolución.", ("path",))
+RAG_COLLECTION_EVENTS = Counter(
+    "rag_collection_events_total", "Accesos a colecciones RAG (hit = ya cargada, load) y descargas (evict).",
+    ("collection", "event"),
+)
+RATE_LIMIT_REJECTIONS = Counter("rate_limit_rejections_total", "Requests rechazadas (429) por el rate limiter.", ("route",))
+TRACE_SPANS = Counter("trace_spans_total", "Spans muestreados según terminaron escritos o descartados.", ("result",))
+
+
+def instrument_node(graph: str, node: str, fn: Callable) -> Callable:
+    """Envuelve un nodo de LangGraph (sync o async) para medir su duración y abrir su span."""
+    # Import diferido: tracing depende de este módulo (contador de spans)
+    from app.utils.tracing import tracer
+
+    span_name = f"{graph}.{node}"
+
+    if asyncio.iscoroutinefunction(fn):
+        @functools.wraps(fn)
+        async def async_wrapper(*args, **kwargs):
+            start, status = time.perf_counter(), "error"
+            try:
+                with tracer.span(span_name):
+                    result = await fn(*args, **kwargs)
+                status = "ok"
+                return result
+            finally:
+                GRAPH_NODE_DURATION.labels(graph, node, status).observe(time.perf_counter() - start)
+        return async_wrapper
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        start, status = time.perf_counter(), "error"
+        try:
+            with tracer.span(span_name):
+                result = fn(*args, **kwargs)
+            status = "ok"
+            return result
+        finally:
+            GRAPH_NODE_DURATION.labels(graph, node, status).observe(time.perf_counter() - start)
+    return wrapper
+
+
+class LLMMetricsCallback(BaseCallbackHandler):
+    """Callback de LangChain que registra latencia, errores y tokens de cada llamada al modelo."""
+
+    # Se ejecuta en el mismo hilo/loop que la llamada (sin pasar por un executor): solo toca contadores
+    run_inline = True
+
+    def __init__(self, model: str):
+        self.model = model
+        self._starts: dict[UUID, float] = {}
+
+    def on_chat_model_start(self, serialized: dict, messages: list, *, run_id: UUID, **kwargs: Any):
+        self._starts[run_id] = time.perf_counter()
+
+    def on_llm_start(self, serialized: dict, prompts: list[str], *, run_id: UUID, **kwargs: Any):
+        self._starts[run_id] = time.perf_counter()
+
+    def _finish(self, run_id: UUID, status: str) -> Optional[float]:
+        start = self._starts.pop(run_id, None)
+        if start is not None:
+            LLM_REQUEST_DURATION.labels(self.model, status).observe(time.perf_counter() - start)
+        return start
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any):
+        self._finish(run_id, "ok")
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+                if usage:
+                    LLM_TOKENS.labels(self.model, "prompt").inc(usage.get("input_tokens", 0))
+                    LLM_TOKENS.labels(self.model, "completion").inc(usage.get("output_tokens", 0))
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any):
+        self._finish(run_id, "error")
+
+
+class MetricsMiddleware:
+    """
+    Middleware ASGI (no BaseHTTPMiddleware, que agrega overhead y rompe el streaming).
+    Mide hasta que se envía el último chunk, así /react/chat/stream cuenta entero.
+    La etiqueta es el template de la ruta ('/rag/documents/{doc_id}'), no el path, para acotar la cardinalidad.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = "500"
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = str(message["status"])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            HTTP_REQUEST_DURATION.labels(scope["method"], path, status).observe(time.perf_counter() - start)
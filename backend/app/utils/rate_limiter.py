@@ -1,27 +1,92 @@
-import time
-from fastapi import HTTPException
+import math
+import threading
+from typing import Optional
+from fastapi import HTTPException, Request, Response
 
-# Variables globales para el estado del rate limit
-# (En producción esto iría en Redis, pero en memoria sirve para el ejercicio)
-request_counts = {}
-LIMIT_PER_MINUTE = 10
+from app.core.config import RATE_LIMITS
+from app.core.state_store import StateStore, state_store
+from app.utils.metrics import RATE_LIMIT_REJECTIONS
 
-def check_rate_limit(client_ip: str):
+PERIODS = {"second": 1, "minute": 60, "hour": 3600}
+
+
+def parse_limit(spec: str) -> tuple[int, float]:
+    """'10/minute' -> (10, 60.0)"""
+    count, _, period = spec.partition("/")
+    return int(count), float(PERIODS[period.strip()])
+
+
+class GCRALimiter:
+    """
+    Rate limit con GCRA (Generic Cell Rate Algorithm), equivalente a un token bucket.
+    Por cada clave guardamos un único float (TAT: theoretical arrival time), así que
+    cada chequeo es O(1) en tiempo y memoria, sin listas de timestamps.
+
+    El TAT vive en el state store (namespace por ruta): con el backend `sqlite` todos los
+    workers comparten el mismo límite. Una clave cuyo TAT ya pasó está "llena" otra vez,
+    así que vence en ese momento; el store además aplica un tope duro de claves.
+    El reloj es `time.time()` (el mismo para todos los procesos del nodo).
+    """
+
+    def __init__(self, name: str, limit: int, period: float, store: StateStore):
+        self.namespace = f"ratelimit:{name}"
+        self.limit = limit
+        self.period = period
+        self.store = store
+        # Intervalo entre requests "ideales" y tolerancia de ráfaga (limit requests seguidas)
+        self.interval = period / limit
+        self.tolerance = period - self.interval
+
+    def hit(self, key: str) -> tuple[bool, int, float]:
+        """Registra una request. Devuelve (permitida, requests restantes, segundos para reintentar)."""
+        def step(stored: Optional[float], now: float):
+            tat = max(stored if stored is not None else now, now)
+
+            if tat - now > self.tolerance:
+                return None, None, (False, 0, tat - now - self.tolerance)
+
+            new_tat = tat + self.interval
+            # Cuántos intervalos "libres" quedan dentro de la ventana (el epsilon absorbe errores de float)
+            remaining = math.floor((self.period - (new_tat - now)) / self.interval + 1e-9)
+            return new_tat, new_tat, (True, max(remaining, 0), 0.0)
+
+        return self.store.update(self.namespace, key, step)
+
+
+# Un limitador por ruta, creados bajo demanda
+_limiters: dict[str, GCRALimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(route: str) -> GCRALimiter:
+    with _limiters_lock:
+        if route not in _limiters:
+            limit, period = parse_limit(RATE_LIMITS.get(route, RATE_LIMITS["default"]))
+            _limiters[route] = GCRALimiter(route, limit, period, state_store)
+        return _limiters[route]
+
+
+class RateLimit:
     """
-    Verifica si una IP ha excedido el límite de solicitudes por minuto.
-    Lanza HTTPException 429 si se excede.
+    Dependencia de FastAPI con límite por ruta e IP:
+
+        @router.post("/chat", dependencies=[Depends(RateLimit("react_chat"))])
+
+    Responde 429 con `Retry-After` cuando se excede el límite.
     """
-    current_time = time.time()
-    
-    if client_ip not in request_counts:
-        request_counts[client_ip] = []
-    
-    # Filtramos: mantenemos solo los timestamps de los últimos 60 segundos
-    # (Borramos lo viejo)
-    request_counts[client_ip] = [t for t in request_counts[client_ip] if current_time - t < 60]
-    
-    if len(request_counts[client_ip]) >= LIMIT_PER_MINUTE:
-        raise HTTPException(status_code=429, detail="Rate limit exceeded. Try again later.")
-    
-    # Registramos la nueva solicitud
-    request_counts[client_ip].append(current_time)
\ No newline at end of file
+
+    def __init__(self, route: str):
+        self.route = route
+
+    def __call__(self, request: Request, response: Response):
+        client_ip = request.client.host if request.client else "unknown"
+        limiter = get_limiter(self.route)
+        allowed, remaining, retry_after = limiter.hit(client_ip)
+
+        headers = {"X-RateLimit-Limit": str(limiter.limit), "X-RateLimit-Remaining": str(remaining)}
+        if not allowed:
+            RATE_LIMIT_REJECTIONS.labels(self.route).inc()
+            headers["Retry-After"] = str(max(1, math.ceil(retry_after)))
+            raise HTTPException(status_code=429, detail="Rate limit exceeded. Try again later.", headers=headers)
+
+        response.headers.update(headers)
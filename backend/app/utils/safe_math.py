@@ -0,0 +1,276 @@
+import ast
+import math
+import time
+import logging
+import operator
+import threading
+import multiprocessing
+from functools import lru_cache
+from multiprocessing.pool import Pool
+from typing import Any, Callable, Optional
+
+from app.core.config import (
+    MATH_MAX_EXPRESSION_LENGTH, MATH_MAX_EXPONENT, MATH_MAX_INT_BITS,
+    MATH_TIMEOUT_SECONDS, MATH_CACHE_SIZE, MATH_POOL_SIZE
+)
+
+logger = logging.getLogger(__name__)
+
+# Profundidad máxima del árbol de la expresión (evita recursión descontrolada al compilar)
+MAX_DEPTH = 50
+
+Number = int | float
+# (deadline, variables) -> resultado
+Evaluator = Callable[[float, dict[str, Number]], Number]
+
+
+class MathError(ValueError):
+    """Expresión no permitida, fuera de límites o con error de cálculo."""
+
+
+def _check_int(value: Any) -> Any:
+    if isinstance(value, int) and value.bit_length() > MATH_MAX_INT_BITS:
+        raise MathError(f"El resultado supera el tamaño máximo permitido ({MATH_MAX_INT_BITS} bits)")
+    return value
+
+
+def _bits(value: Any) -> int:
+    return abs(int(value)).bit_length() if isinstance(value, int) else 0
+
+
+def _safe_pow(base: Number, exponent: Number, modulo: Optional[int] = None) -> Number:
+    if isinstance(exponent, (int, float)) and abs(exponent) > MATH_MAX_EXPONENT:
+        raise MathError(f"Exponente demasiado grande (máximo {MATH_MAX_EXPONENT})")
+    if modulo is not None:
+        return pow(base, exponent, modulo)  # type: ignore[call-overload]
+    # Estimación previa del tamaño: 2**exp * bits(base) no se calcula si no entra
+    if isinstance(base, int) and isinstance(exponent, int) and exponent > 0 and _bits(base) * exponent > MATH_MAX_INT_BITS:
+        raise MathError(f"El resultado supera el tamaño máximo permitido ({MATH_MAX_INT_BITS} bits)")
+    return base ** exponent
+
+
+def _safe_mul(a: Any, b: Any) -> Any:
+    if _bits(a) + _bits(b) > MATH_MAX_INT_BITS + 1:
+        raise MathError(f"El resultado supera el tamaño máximo permitido ({MATH_MAX_INT_BITS} bits)")
+    return a * b
+
+
+def _bounded_int_arg(func: Callable[..., Any], limit: int) -> Callable[..., Any]:
+    """Funciones combinatorias: el costo crece con el argumento, así que se acota antes de llamar."""
+    def wrapper(*args: Any) -> Any:
+        if any(isinstance(a, int) and abs(a) > limit for a in args):
+            raise MathError(f"Argumento demasiado grande para {func.__name__} (máximo {limit})")
+        return func(*args)
+    wrapper.__name__ = func.__name__
+    return wrapper
+
+
+def _safe_round(number: Number, ndigits: Optional[int] = None) -> Number:
+    """round(entero, -n) calcula 10**n internamente: `ndigits` se acota igual que un exponente."""
+    if isinstance(ndigits, int) and abs(ndigits) > MATH_MAX_EXPONENT:
+        raise MathError(f"Cantidad de dígitos demasiado grande para round (máximo {MATH_MAX_EXPONENT})")
+    return round(number, ndigits)
+
+
+_BIN_OPS: dict[type, Callable[[Any, Any], Any]] = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: _safe_mul,
+    ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv,
+    ast.Mod: operator.mod,
+    ast.Pow: _safe_pow,
+}
+_UNARY_OPS: dict[type, Callable[[Any], Any]] = {ast.UAdd: operator.pos, ast.USub: operator.neg}
+
+# Todo el módulo math (sin privados), con las funciones costosas acotadas
+FUNCTIONS: dict[str, Callable[..., Any]] = {
+    name: getattr(math, name)
+    for name in dir(math)
+    if not name.startswith("_") and callable(getattr(math, name))
+}
+FUNCTIONS.update({
+    "factorial": _bounded_int_arg(math.factorial, 1000),
+    "comb": _bounded_int_arg(math.comb, 5000),
+    "perm": _bounded_int_arg(math.perm, 1000),
+    "abs": abs,
+    "round": _safe_round,
+    "min": min,
+    "max": max,
+    "pow": _safe_pow,
+})
+CONSTANTS: dict[str, float] = {"pi": math.pi, "e": math.e, "tau": math.tau, "inf": math.inf, "nan": math.nan}
+
+
+def _compile_node(node: ast.AST, names: frozenset[str], depth: int = 0) -> Evaluator:
+    """
+    Traduce un nodo del AST (ya validado contra la lista blanca) a una clausura.
+    Cada clausura recibe el deadline y lo chequea: ninguna operación individual
+    puede ser costosa gracias a los límites de tamaño, así que el tiempo total queda acotado.
+    `names` son las variables que se podrán pasar al evaluar (ej: 'now').
+    """
+    if depth > MAX_DEPTH:
+        raise MathError("Expresión demasiado anidada")
+
+    if isinstance(node, ast.Expression):
+        return _compile_node(node.body, names, depth + 1)
+
+    if isinstance(node, ast.Constant):
+        if isinstance(node.value, bool) or not isinstance(node.value, (int, float)):
+            raise MathError(f"Constante no permitida: {node.value!r}")
+        value = _check_int(node.value)
+        return lambda deadline, env: value
+
+    if isinstance(node, ast.Name):
+        if node.id in names:
+            variable = node.id
+            return lambda deadline, env: env[variable]
+        if node.id not in CONSTANTS:
+            raise MathError(f"Nombre no permitido: {node.id}")
+        value = CONSTANTS[node.id]
+        return lambda deadline, env: value
+
+    if isinstance(node, ast.Attribute):
+        # Solo 'math.<constante>' (las funciones se resuelven en ast.Call)
+        if not (isinstance(node.value, ast.Name) and node.value.id == "math" and node.attr in CONSTANTS):
+            raise MathError("Solo se permite acceder a constantes de 'math' (ej: math.pi)")
+        value = CONSTANTS[node.attr]
+        return lambda deadline, env: value
+
+    if isinstance(node, ast.UnaryOp) and type(node.op) in _UNARY_OPS:
+        unary = _UNARY_OPS[type(node.op)]
+        operand = _compile_node(node.operand, names, depth + 1)
+
+        def unary_eval(deadline: float, env: dict[str, Number]) -> Number:
+            return unary(operand(deadline, env))
+        return unary_eval
+
+    if isinstance(node, ast.BinOp) and type(node.op) in _BIN_OPS:
+        binary = _BIN_OPS[type(node.op)]
+        left = _compile_node(node.left, names, depth + 1)
+        right = _compile_node(node.right, names, depth + 1)
+
+        def binary_eval(deadline: float, env: dict[str, Number]) -> Number:
+            a, b = left(deadline, env), right(deadline, env)
+            if time.monotonic() > deadline:
+                raise MathError("Tiempo de cálculo excedido")
+            return _check_int(binary(a, b))
+        return binary_eval
+
+    if isinstance(node, ast.Call):
+        func = node.func
+        if isinstance(func, ast.Attribute) and isinstance(func.value, ast.Name) and func.value.id == "math":
+            name = func.attr
+        elif isinstance(func, ast.Name):
+            name = func.id
+        else:
+            raise MathError("Llamada no permitida")
+        if name not in FUNCTIONS:
+            raise MathError(f"Función no permitida: {name}")
+        if node.keywords:
+            raise MathError("No se permiten argumentos con nombre")
+
+        target = FUNCTIONS[name]
+        args = [_compile_node(arg, names, depth + 1) for arg in node.args]
+
+        def call_eval(deadline: float, env: dict[str, Number]) -> Number:
+            values = [arg(deadline, env) for arg in args]
+            if time.monotonic() > deadline:
+                raise MathError("Tiempo de cálculo excedido")
+            return _check_int(target(*values))
+        return call_eval
+
+    raise MathError(f"Operación no permitida: {type(node).__name__}")
+
+
+@lru_cache(maxsize=MATH_CACHE_SIZE)
+def compile_expression(expression: str, names: frozenset[str] = frozenset()) -> Evaluator:
+    """Parsea, valida y compila una expresión. Cacheado por texto (el agente repite mucho las mismas)."""
+    if len(expression) > MATH_MAX_EXPRESSION_LENGTH:
+        raise MathError(f"Expresión demasiado larga (máximo {MATH_MAX_EXPRESSION_LENGTH} caracteres)")
+    try:
+        tree = ast.parse(expression.strip(), mode="eval")
+    except (SyntaxError, ValueError, RecursionError) as e:
+        raise MathError(f"Sintaxis inválida: {e}") from None
+    return _compile_node(tree, names)
+
+
+def evaluate_local(
+    expression: str, timeout: float = MATH_TIMEOUT_SECONDS, variables: Optional[dict[str, Number]] = None
+) -> Number:
+    """Evalúa en el proceso actual."""
+    variables = variables or {}
+    evaluator = compile_expression(expression, frozenset(variables))
+    try:
+        return evaluator(time.monotonic() + timeout, variables)
+    except MathError:
+        raise
+    except (ArithmeticError, TypeError, ValueError) as e:
+        raise MathError(str(e)) from None
+
+
+class MathProcessPool:
+    """
+    Pool de procesos pre-creado para evaluar expresiones aisladas del servidor.
+    Si una expresión excede el tiempo, el pool se termina (matando al worker
+    colgado) y se vuelve a crear: una expresión patológica no bloquea a nadie más.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self._lock = threading.Lock()
+        self._pool: Optional[Pool] = None
+        self._generation = 0
+        self.restarts = 0
+
+    def _get_pool(self) -> tuple[Pool, int]:
+        with self._lock:
+            if self._pool is None:
+                # 'spawn' evita heredar hilos y locks del servidor al crear los workers
+                self._pool = multiprocessing.get_context("spawn").Pool(self.size)
+                # Calentamiento: el arranque de los workers no cuenta contra el timeout de nadie
+                self._pool.apply(evaluate_local, ("0",))
+            return self._pool, self._generation
+
+    def start(self):
+        """Crea y calienta los workers por adelantado (warm-up del lifespan)."""
+        self._get_pool()
+
+    def _restart(self, generation: int):
+        with self._lock:
+            # Si otra tarea ya reinició el pool, no lo volvemos a matar
+            if generation != self._generation or self._pool is None:
+                return
+            self._pool.terminate()
+            self._pool = None
+            self._generation += 1
+            self.restarts += 1
+        logger.warning("⚠️ Expresión matemática excedió el tiempo: pool de cálculo reiniciado.")
+
+    def evaluate(
+        self, expression: str, timeout: float = MATH_TIMEOUT_SECONDS, variables: Optional[dict[str, Number]] = None
+    ) -> Number:
+        pool, generation = self._get_pool()
+        result = pool.apply_async(evaluate_local, (expression, timeout, variables))
+        try:
+            # Margen extra para el ida y vuelta entre procesos
+            return result.get(timeout + 0.5)
+        except multiprocessing.TimeoutError:
+            self._restart(generation)
+            raise MathError("Tiempo de cálculo excedido") from None
+
+    def close(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.terminate()
+                self._pool = None
+
+
+math_pool = MathProcessPool(MATH_POOL_SIZE) if MATH_POOL_SIZE > 0 else None
+
+
+def safe_eval(expression: str, variables: Optional[dict[str, Number]] = None) -> Number:
+    """Punto de entrada: usa el pool de procesos si está habilitado, si no evalúa en el proceso."""
+    if math_pool is not None:
+        return math_pool.evaluate(expression, variables=variables)
+    return evaluate_local(expression, variables=variables)
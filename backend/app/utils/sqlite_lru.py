@@ -0,0 +1,142 @@
+import os
+import time
+import sqlite3
+import threading
+from typing import Iterable, Optional
+
+
+class SQLiteLRUCache:
+    """
+    Cache clave -> bytes persistido en un archivo SQLite.
+    - Tamaño acotado: al superar `max_entries` se desalojan las entradas
+      menos usadas recientemente (LRU por `last_access`).
+    - TTL opcional: las entradas más viejas que `ttl_seconds` se ignoran y se purgan.
+    - Lecturas y escrituras en lote para no pagar un round-trip por clave.
+    Es seguro entre hilos (un lock por instancia) y entre procesos (WAL).
+    """
+
+    # Cada cuántos segundos, como mucho, se purgan los vencidos (las lecturas ya los ignoran)
+    TTL_PURGE_INTERVAL = 60.0
+
+    def __init__(self, path: str, table: str, max_entries: int, ttl_seconds: Optional[float] = None):
+        if not table.isidentifier():
+            raise ValueError(f"Nombre de tabla inválido: {table}")
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.table = table
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._last_ttl_purge = 0.0
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} ("
+            "key TEXT PRIMARY KEY, value BLOB NOT NULL, "
+            "created_at REAL NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_last_access ON {table}(last_access)")
+        self._conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_created_at ON {table}(created_at)")
+        self._conn.commit()
+
+    def get_many(self, keys: list[str]) -> dict[str, bytes]:
+        """Devuelve solo las claves presentes (y vigentes) y refresca su acceso."""
+        if not keys:
+            return {}
+
+        now = time.time()
+        found: dict[str, bytes] = {}
+        unique_keys = list(dict.fromkeys(keys))
+
+        with self._lock:
+            # SQLite limita la cantidad de parámetros por sentencia
+            for start in range(0, len(unique_keys), 500):
+                chunk = unique_keys[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT key, value, created_at FROM {self.table} WHERE key IN ({placeholders})",
+                    chunk,
+                ).fetchall()
+                for key, value, created_at in rows:
+                    if self.ttl_seconds is None or now - created_at < self.ttl_seconds:
+                        found[key] = value
+
+            if found:
+                self._conn.executemany(
+                    f"UPDATE {self.table} SET last_access = ? WHERE key = ?",
+                    [(now, key) for key in found],
+                )
+                self._conn.commit()
+
+            self.hits += sum(1 for key in keys if key in found)
+            self.misses += sum(1 for key in keys if key not in found)
+
+        return found
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.get_many([key]).get(key)
+
+    def set_many(self, items: Iterable[tuple[str, bytes]]):
+        now = time.time()
+        rows = [(key, value, now, now) for key, value in items]
+        if not rows:
+            return
+
+        with self._lock:
+            self._conn.executemany(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, created_at, last_access) VALUES (?, ?, ?, ?)",
+                rows,
+            )
+            self._evict()
+            self._conn.commit()
+
+    def set(self, key: str, value: bytes):
+        self.set_many([(key, value)])
+
+    def delete(self, key: str):
+        with self._lock:
+            self._conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute(f"DELETE FROM {self.table}")
+            self._conn.commit()
+
+    def _evict(self):
+        """Purga vencidos (periódicamente) y, si sobra, los menos usados. Se llama con el lock tomado."""
+        now = time.time()
+        if self.ttl_seconds is not None and now - self._last_ttl_purge >= self.TTL_PURGE_INTERVAL:
+            self._last_ttl_purge = now
+            cursor = self._conn.execute(
+                f"DELETE FROM {self.table} WHERE created_at < ?", (now - self.ttl_seconds,)
+            )
+            self.evictions += max(cursor.rowcount, 0)
+
+        (count,) = self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()
+        overflow = count - self.max_entries
+        if overflow > 0:
+            self._conn.execute(
+                f"DELETE FROM {self.table} WHERE key IN "
+                f"(SELECT key FROM {self.table} ORDER BY last_access LIMIT ?)",
+                (overflow,),
+            )
+            self.evictions += overflow
+
+    def stats(self) -> dict:
+        with self._lock:
+            (size,) = self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()
+        total = self.hits + self.misses
+        return {
+            "entries": size,
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "evictions": self.evictions,
+        }
@@ -0,0 +1,11 @@
+import json
+from typing import Any
+
+
+def sse_event(event: str, data: dict[str, Any]) -> str:
+    """Formatea un evento Server-Sent Events."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+
+# Headers para que proxies intermedios no bufferizen el stream
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
@@ -0,0 +1,292 @@
+import os
+import json
+import time
+import queue
+import atexit
+import random
+import reprlib
+import logging
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Iterator, Optional
+
+from app.core.config import (
+    TRACE_ENABLED, TRACE_SAMPLE_RATE, TRACE_EXPORT_PATH, TRACE_MAX_ATTRIBUTE_CHARS, TRACE_QUEUE_SIZE,
+    TRACE_FILE_MAX_BYTES
+)
+from app.utils.metrics import TRACE_SPANS
+
+# Trazas por request: cada request HTTP abre un span raíz y los nodos de los grafos, las llamadas
+# a LLMs y las herramientas abren spans hijos. El span activo viaja en un ContextVar (sobrevive a
+# los awaits y se copia a las tareas y al threadpool). En el camino del request solo se crean objetos
+# chicos y se recortan atributos; el JSON y el disco quedan para un hilo aparte.
+
+logger = logging.getLogger(__name__)
+
+SPAN_KINDS = {
+    "internal": "SPAN_KIND_INTERNAL",
+    "server": "SPAN_KIND_SERVER",
+    "client": "SPAN_KIND_CLIENT",
+}
+
+_current_span: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+
+# repr acotado: nunca formatea colecciones u objetos enteros para después recortarlos
+_repr = reprlib.Repr()
+_repr.maxstring = _repr.maxother = TRACE_MAX_ATTRIBUTE_CHARS
+_repr.maxlist = _repr.maxtuple = _repr.maxdict = _repr.maxset = 20
+_repr.maxlevel = 3
+
+
+def truncate(value: Any, limit: int = TRACE_MAX_ATTRIBUTE_CHARS) -> Any:
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    text = value if isinstance(value, str) else _repr.repr(value)
+    return text if len(text) <= limit else f"{text[:limit]}…[+{len(text) - limit}]"
+
+
+@dataclass
+class Span:
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str]
+    sampled: bool
+    kind: str = "internal"
+    start_ns: int = field(default_factory=time.time_ns)
+    end_ns: Optional[int] = None
+    attributes: dict[str, Any] = field(default_factory=dict)
+    error: Optional[str] = None
+
+    def set_attribute(self, key: str, value: Any):
+        """No hace nada si el request no fue muestreado: los no muestreados no pagan el recorte."""
+        if self.sampled:
+            self.attributes[key] = truncate(value)
+
+    def to_otlp(self) -> dict:
+        return {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_id or "",
+            "name": self.name,
+            "kind": SPAN_KINDS.get(self.kind, "SPAN_KIND_INTERNAL"),
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns or self.start_ns),
+            "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in self.attributes.items()],
+            "status": {"code": "STATUS_CODE_ERROR", "message": self.error} if self.error else {"code": "STATUS_CODE_OK"},
+        }
+
+
+def _otlp_value(value: Any) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": "" if value is None else str(value)}
+
+
+def _new_id(bits: int) -> str:
+    return f"{random.getrandbits(bits):0{bits // 4}x}"
+
+
+class JsonlSpanExporter:
+    """
+    Escribe los spans terminados en un archivo JSONL con el formato OTLP/JSON (una línea por lote,
+    como el file exporter del OpenTelemetry Collector: se puede reenviar tal cual a un backend OTLP).
+    El request solo encola: si la cola se llena, el span se descarta y se cuenta.
+    """
+
+    def __init__(self, path: str, max_queue: int, max_bytes: int, service_name: str = "ai-engineer-test-api"):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.service_name = service_name
+        self._queue: queue.Queue[Optional[Span]] = queue.Queue(maxsize=max_queue)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def export(self, span: Span):
+        if self._thread is None:
+            self._start()
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            TRACE_SPANS.labels("dropped").inc()
+
+    def _start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._thread = threading.Thread(target=self._run, name="span-exporter", daemon=True)
+            self._thread.start()
+            atexit.register(self.shutdown)
+
+    def _run(self):
+        stop = False
+        while not stop:
+            batch = [self._queue.get()]
+            # Se escribe todo lo que ya esté encolado de una vez (una línea y un write por lote)
+            while len(batch) < 512:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if None in batch:
+                stop = True
+                batch = [s for s in batch if s is not None]
+            if batch:
+                self._write(batch)
+
+    def _write(self, spans: list[Span]):
+        line = json.dumps({
+            "resourceSpans": [{
+                "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": self.service_name}}]},
+                "scopeSpans": [{"scope": {"name": "app.tracing"}, "spans": [s.to_otlp() for s in spans]}],
+            }]
+        }, ensure_ascii=False, default=str)
+        try:
+            if os.path.exists(self.path) and os.path.getsize(self.path) > self.max_bytes:
+                os.replace(self.path, f"{self.path}.1")
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+            TRACE_SPANS.labels("exported").inc(len(spans))
+        except OSError as e:
+            TRACE_SPANS.labels("dropped").inc(len(spans))
+            logger.warning(f"⚠️ No se pudieron escribir {len(spans)} spans: {e}")
+
+    def shutdown(self, timeout: float = 2.0):
+        """Escribe lo pendiente y detiene el hilo (lo llama el lifespan al apagar, y atexit)."""
+        thread = self._thread
+        if thread is None or not thread.is_alive():
+            return
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            return
+        thread.join(timeout)
+
+
+class Tracer:
+    def __init__(self, enabled: bool, sample_rate: float, exporter: JsonlSpanExporter):
+        self.enabled = enabled
+        self.sample_rate = sample_rate
+        self.exporter = exporter
+
+    @contextmanager
+    def span(self, name: str, kind: str = "internal", attributes: Optional[dict[str, Any]] = None, *,
+             trace_id: Optional[str] = None, parent_id: Optional[str] = None,
+             sampled: Optional[bool] = None) -> Iterator[Span]:
+        """
+        Abre un span hijo del activo (o raíz, si no hay). En la raíz se decide el muestreo,
+        salvo que venga dado (ej: de un header `traceparent`); los hijos heredan la decisión.
+        """
+        parent = _current_span.get()
+        if parent is not None and trace_id is None:
+            trace_id, parent_id, sampled = parent.trace_id, parent.span_id, parent.sampled
+        if sampled is None:
+            sampled = self.enabled and random.random() < self.sample_rate
+
+        span = Span(name, trace_id or _new_id(128), _new_id(64), parent_id, self.enabled and sampled, kind)
+        if attributes:
+            for key, value in attributes.items():
+                span.set_attribute(key, value)
+
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.error = truncate(f"{e.__class__.__name__}: {e}")
+            raise
+        finally:
+            _current_span.reset(token)
+            span.end_ns = time.time_ns()
+            if span.sampled:
+                self.exporter.export(span)
+
+    def shutdown(self):
+        self.exporter.shutdown()
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def annotate(**attributes: Any):
+    """Agrega atributos al span activo (si hay uno y fue muestreado). Un `__` en el nombre se escribe como '.'."""
+    span = _current_span.get()
+    if span is not None and span.sampled:
+        for key, value in attributes.items():
+            span.set_attribute(key.replace("__", "."), value)
+
+
+def parse_traceparent(header: Optional[str]) -> Optional[tuple[str, str, bool]]:
+    """Header W3C `traceparent` (00-<trace_id>-<span_id>-<flags>) -> (trace_id, span_id padre, muestreado)."""
+    if not header:
+        return None
+    parts = header.strip().split("-")
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    try:
+        flags = int(parts[3], 16)
+        int(parts[1], 16), int(parts[2], 16)
+    except ValueError:
+        return None
+    return parts[1], parts[2], bool(flags & 1)
+
+
+class TraceContextFilter(logging.Filter):
+    """Agrega trace_id/span_id del span activo a cada registro de log (para correlacionar logs y trazas)."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        span = _current_span.get()
+        record.trace_id = span.trace_id if span else "-"
+        record.span_id = span.span_id if span else "-"
+        return True
+
+
+# Sondas y scraping: muchísimos requests sin interés para trazar
+UNTRACED_PATHS = {"/health", "/ready", "/metrics"}
+
+
+class TracingMiddleware:
+    """
+    Middleware ASGI que abre el span raíz de cada request (continuando el `traceparent` entrante si
+    viene) y devuelve el id de traza en el header `x-trace-id`. Igual que MetricsMiddleware, el nombre
+    usa el template de la ruta y el span dura hasta el último chunk de la respuesta.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not tracer.enabled or scope["path"] in UNTRACED_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers") or [])
+        incoming = parse_traceparent(headers.get(b"traceparent", b"").decode("latin-1"))
+        trace_id, parent_id, sampled = incoming or (None, None, None)
+
+        with tracer.span(scope["method"], "server", trace_id=trace_id, parent_id=parent_id, sampled=sampled) as span:
+            async def send_wrapper(message):
+                if message["type"] == "http.response.start":
+                    span.set_attribute("http.status_code", message["status"])
+                    message["headers"] = [*message.get("headers", []), (b"x-trace-id", span.trace_id.encode())]
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                route = getattr(scope.get("route"), "path", None) or "unmatched"
+                span.name = f"{scope['method']} {route}"
+                span.set_attribute("http.method", scope["method"])
+                span.set_attribute("http.route", route)
+
+
+tracer = Tracer(
+    TRACE_ENABLED, TRACE_SAMPLE_RATE, JsonlSpanExporter(TRACE_EXPORT_PATH, TRACE_QUEUE_SIZE, TRACE_FILE_MAX_BYTES)
+)
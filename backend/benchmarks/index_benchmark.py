@@ -0,0 +1,136 @@
+"""
+Benchmark de tipos de índice FAISS (recall vs latencia vs memoria) con vectores sintéticos.
+
+Usa la misma fábrica de índices que RAGService, así que los números corresponden a lo que
+se obtiene con RAG_INDEX_TYPE / RAG_HNSW_* / RAG_IVF_* / RAG_PQ_*.
+
+Uso (desde backend/):
+    python -m benchmarks.index_benchmark
+    python -m benchmarks.index_benchmark --n 200000 --dim 768 --queries 1000 --json resultados.json
+"""
+import sys
+import json
+import time
+import argparse
+from pathlib import Path
+
+import faiss
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from app.services import index_factory  # noqa: E402
+
+# (nombre, tipo, parámetros de construcción, parámetros de búsqueda a barrer)
+CONFIGS = [
+    ("flat", "flat", {}, [{}]),
+    ("hnsw32", "hnsw", {"hnsw_m": 32, "ef_construction": 200}, [{"ef_search": ef} for ef in (16, 64, 256)]),
+    ("ivfpq", "ivfpq", {"pq_m": 16, "pq_nbits": 8}, [{"nprobe": p} for p in (4, 16, 64)]),
+]
+
+
+def synthetic_vectors(n: int, dim: int, n_queries: int, seed: int = 0) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Vectores normalizados agrupados en clusters (más parecido a embeddings reales que
+    ruido uniforme, donde ningún índice aproximado funciona bien). Las consultas son
+    puntos cercanos a vectores del corpus.
+    """
+    rng = np.random.default_rng(seed)
+    n_clusters = max(1, n // 500)
+    centers = rng.standard_normal((n_clusters, dim)).astype(np.float32)
+    data = centers[rng.integers(0, n_clusters, n)] + 0.5 * rng.standard_normal((n, dim)).astype(np.float32)
+    queries = data[rng.choice(n, n_queries, replace=False)] + 0.1 * rng.standard_normal((n_queries, dim)).astype(np.float32)
+    faiss.normalize_L2(data)
+    faiss.normalize_L2(queries)
+    return data, queries
+
+
+def recall_at_k(found: np.ndarray, truth: np.ndarray, k: int) -> float:
+    hits = sum(len(set(f[:k]) & set(t[:k])) for f, t in zip(found, truth))
+    return hits / (len(truth) * k)
+
+
+def measure(index: faiss.Index, queries: np.ndarray, k: int) -> tuple[np.ndarray, list[float]]:
+    """Una consulta a la vez, como en el servicio (latencia por request, no throughput por lotes)."""
+    found = np.empty((len(queries), k), dtype=np.int64)
+    latencies = []
+    for i, query in enumerate(queries):
+        start = time.perf_counter()
+        _, ids = index.search(query.reshape(1, -1), k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        found[i] = ids[0]
+    return found, latencies
+
+
+def run(n: int, dim: int, n_queries: int, k: int, threads: int) -> list[dict]:
+    build_threads = faiss.omp_get_max_threads()
+    data, queries = synthetic_vectors(n, dim, n_queries)
+
+    # Ground truth exacto
+    exact = faiss.IndexFlatL2(dim)
+    exact.add(data)
+    _, truth = exact.search(queries, k)
+
+    results = []
+    for name, kind, build_params, search_sweep in CONFIGS:
+        if kind == "ivfpq" and dim % build_params["pq_m"]:
+            print(f"⏭️  {name}: pq_m={build_params['pq_m']} no divide dim={dim}, se omite")
+            continue
+        if n < index_factory.min_train_size(kind, build_params, n):
+            print(f"⏭️  {name}: hacen falta al menos {index_factory.min_train_size(kind, build_params, n)} vectores")
+            continue
+
+        # Construcción/entrenamiento con todos los hilos; las consultas con los pedidos
+        faiss.omp_set_num_threads(build_threads)
+        start = time.perf_counter()
+        index = index_factory.build_index(kind, data, build_params)
+        index.add(data)
+        build_seconds = time.perf_counter() - start
+        memory = index_factory.index_memory_bytes(index)
+        faiss.omp_set_num_threads(threads)
+
+        for search_params in search_sweep:
+            index_factory.apply_search_params(index, {**build_params, **search_params})
+            found, latencies = measure(index, queries, k)
+            results.append({
+                "index": name,
+                "search_params": search_params,
+                f"recall@{k}": round(recall_at_k(found, truth, k), 4),
+                "p50_ms": round(float(np.percentile(latencies, 50)), 4),
+                "p99_ms": round(float(np.percentile(latencies, 99)), 4),
+                "memory_mb": round(memory / 2 ** 20, 2),
+                "build_seconds": round(build_seconds, 2),
+            })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall@k, latencia p50/p99 y memoria por tipo de índice FAISS.")
+    parser.add_argument("--n", type=int, default=100_000, help="Vectores en el corpus")
+    parser.add_argument("--dim", type=int, default=768, help="Dimensión (768 = text-embedding-004)")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--threads", type=int, default=1, help="Hilos de FAISS (1 = latencia por consulta realista)")
+    parser.add_argument("--json", type=str, default=None, help="Guardar resultados en este archivo")
+    args = parser.parse_args()
+
+    print(f"📊 n={args.n} dim={args.dim} consultas={args.queries} k={args.k}")
+    results = run(args.n, args.dim, args.queries, args.k, args.threads)
+
+    header = f"{'índice':<8} {'búsqueda':<18} {'recall@' + str(args.k):>10} {'p50 ms':>8} {'p99 ms':>8} {'MB':>9} {'build s':>8}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        params = ",".join(f"{k}={v}" for k, v in r["search_params"].items()) or "-"
+        print(
+            f"{r['index']:<8} {params:<18} {r[f'recall@{args.k}']:>10.4f} {r['p50_ms']:>8.3f} "
+            f"{r['p99_ms']:>8.3f} {r['memory_mb']:>9.2f} {r['build_seconds']:>8.2f}"
+        )
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"config": vars(args), "results": results}, f, indent=2)
+        print(f"💾 Resultados guardados en {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,272 @@
+"""
+Test de carga offline de la API: sin API key, sin red y sin servidor.
+
+La app corre en este mismo proceso (httpx + ASGITransport) con MODEL_PROVIDER=fake:
+LLMs y embeddings locales deterministas con latencia simulada (FAKE_*). Cada endpoint se
+mide a varios niveles de concurrencia y se reporta throughput, latencia p50/p95/p99 y el
+lag del event loop (cuánto se atrasa un timer de 10 ms: si algo bloquea el loop, sube
+para todos los requests en vuelo). El resultado es JSON para comparar entre commits.
+
+Uso (desde backend/):
+    python -m benchmarks.load_benchmark
+    python -m benchmarks.load_benchmark --concurrency 1 16 64 --requests 300 --json actual.json
+    python -m benchmarks.load_benchmark --compare base.json --max-regression 0.15
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import platform
+import tempfile
+import itertools
+import contextlib
+import subprocess
+from collections import Counter
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BACKEND_DIR))
+
+# Preguntas con y sin respuesta en el corpus base (ejercitan el atajo léxico, la búsqueda híbrida y el rechazo)
+RAG_QUESTIONS = [
+    "¿Qué hago con un error 503 en payment-service?",
+    "¿Cuántas réplicas necesita el servicio de pagos durante CyberMonday?",
+    "El balanceador LB-Main-01 está saturado, ¿cómo escalo?",
+    "¿Cómo reseteo la contraseña de un usuario?",
+    "¿Cuál es la capital de Francia?",
+    "latencia alta en CloudWatch, ¿es un bloqueo?",
+]
+# Tickets obvios (fast-path local) y ambiguos (van al LLM)
+TICKETS = [
+    "hola, buenos días",
+    "olvidé mi contraseña",
+    "error 500 al guardar",
+    "el reporte mensual muestra montos distintos a los del panel de control",
+    "necesito que revisen por qué la integración con el proveedor tarda tanto",
+    "no me llegan las notificaciones desde la última actualización",
+]
+CHAT_QUESTIONS = [
+    "¿Qué hora es?",
+    "Calcula la raíz cuadrada de 1764",
+    "¿Cuántos días faltan para fin de año?",
+    "Hola, ¿quién eres?",
+    "Calcula el logaritmo natural de 1000",
+]
+
+# Escenario -> (ruta, payload para el request i del worker w)
+SCENARIOS = {
+    "rag_query": ("/rag/query", lambda i, w, level: {"question": RAG_QUESTIONS[i % len(RAG_QUESTIONS)]}),
+    "agent_process": ("/agent/process", lambda i, w, level: {"text": TICKETS[i % len(TICKETS)]}),
+    # Un thread por worker: su historial crece como el de un usuario real, sin turnos concurrentes en el mismo thread
+    "react_chat": (
+        "/react/chat",
+        lambda i, w, level: {"question": CHAT_QUESTIONS[i % len(CHAT_QUESTIONS)], "thread_id": f"bench-c{level}-w{w}"},
+    ),
+}
+
+
+def configure_environment(args: argparse.Namespace) -> str:
+    """Variables que lee app.core.config: hay que fijarlas antes de importar la app."""
+    data_dir = args.data_dir or tempfile.mkdtemp(prefix="load_benchmark_")
+    os.environ["MODEL_PROVIDER"] = "fake"
+    os.environ["DATA_DIR"] = data_dir
+    os.environ["FAKE_LLM_FIRST_TOKEN_MS"] = str(args.llm_first_token_ms)
+    os.environ["FAKE_LLM_TOKEN_MS"] = str(args.llm_token_ms)
+    os.environ["FAKE_LLM_OUTPUT_TOKENS"] = str(args.llm_output_tokens)
+    os.environ["FAKE_LLM_TOOL_CALL_RATE"] = str(args.tool_call_rate)
+    os.environ["FAKE_EMBEDDING_LATENCY_MS"] = str(args.embedding_latency_ms)
+    # Las preguntas se repiten: con la cache de respuestas se mediría casi solo la cache
+    os.environ["LLM_CACHE_ENABLED"] = "true" if args.llm_cache else "false"
+    # Los logs INFO de los nodos no se miden ni ensucian la salida
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    return data_dir
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def percentiles(samples: list[float], points=(50, 95, 99)) -> dict[str, float]:
+    if not samples:
+        return {f"p{p}": 0.0 for p in points} | {"max": 0.0}
+    values = np.percentile(samples, points)
+    return {f"p{p}": round(float(v), 2) for p, v in zip(points, values)} | {"max": round(max(samples), 2)}
+
+
+class LoopLagMonitor:
+    """Mide el atraso de un sleep periódico: es el tiempo que el loop estuvo ocupado sin ceder el control."""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.samples: list[float] = []
+        self._task: asyncio.Task | None = None
+
+    async def _run(self):
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, (time.perf_counter() - start - self.interval) * 1000))
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> dict[str, float]:
+        if self._task:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+        return percentiles(self.samples, (50, 99))
+
+
+async def run_level(client, scenario: str, concurrency: int, n_requests: int, warmup: int) -> dict:
+    path, payload = SCENARIOS[scenario]
+
+    # Calentamiento (caches, primeras compilaciones): no se mide
+    for i in range(warmup):
+        await client.post(path, json=payload(i, 0, concurrency))
+
+    counter = itertools.count()
+    latencies: list[float] = []
+    statuses: Counter[str] = Counter()
+
+    async def worker(worker_id: int):
+        while (i := next(counter)) < n_requests:
+            start = time.perf_counter()
+            try:
+                response = await client.post(path, json=payload(i, worker_id, concurrency))
+                statuses[str(response.status_code)] += 1
+            except Exception as e:
+                statuses[type(e).__name__] += 1
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    monitor = LoopLagMonitor()
+    monitor.start()
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(w) for w in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    loop_lag = await monitor.stop()
+
+    errors = n_requests - statuses.get("200", 0)
+    return {
+        "endpoint": scenario,
+        "concurrency": concurrency,
+        "requests": n_requests,
+        "errors": errors,
+        "statuses": dict(statuses),
+        "seconds": round(elapsed, 3),
+        "throughput_rps": round(n_requests / elapsed, 2),
+        "latency_ms": percentiles(latencies) | {"mean": round(float(np.mean(latencies)), 2)},
+        "loop_lag_ms": loop_lag,
+    }
+
+
+async def run(args: argparse.Namespace) -> list[dict]:
+    import httpx
+    from app.core import config
+
+    if not args.keep_rate_limits:
+        # El rate limiter se mediría a sí mismo (todas las requests llegan desde la misma IP)
+        config.RATE_LIMITS.update({route: "1000000/second" for route in config.RATE_LIMITS})
+
+    from app.main import app
+
+    results = []
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app), httpx.AsyncClient(
+        transport=transport, base_url="http://benchmark", timeout=args.timeout
+    ) as client:
+        for scenario in args.endpoints:
+            for concurrency in args.concurrency:
+                result = await run_level(client, scenario, concurrency, args.requests, args.warmup)
+                print(
+                    f"{scenario:<14} c={concurrency:<4} {result['throughput_rps']:>8.1f} req/s  "
+                    f"p50={result['latency_ms']['p50']:.0f}ms p95={result['latency_ms']['p95']:.0f}ms "
+                    f"p99={result['latency_ms']['p99']:.0f}ms  lag p99={result['loop_lag_ms']['p99']:.1f}ms  "
+                    f"errores={result['errors']}",
+                    file=sys.stderr,
+                )
+                results.append(result)
+    return results
+
+
+def compare(results: list[dict], baseline_path: str, max_regression: float | None) -> bool:
+    """Imprime la variación contra una corrida anterior. False si algo empeoró más que `max_regression`."""
+    with open(baseline_path) as f:
+        baseline = {(r["endpoint"], r["concurrency"]): r for r in json.load(f)["results"]}
+
+    ok = True
+    print(f"\n📈 Comparación contra {baseline_path}", file=sys.stderr)
+    for r in results:
+        base = baseline.get((r["endpoint"], r["concurrency"]))
+        if base is None:
+            continue
+        p95_delta = r["latency_ms"]["p95"] / max(base["latency_ms"]["p95"], 1e-9) - 1
+        rps_delta = r["throughput_rps"] / max(base["throughput_rps"], 1e-9) - 1
+        regressed = max_regression is not None and (p95_delta > max_regression or -rps_delta > max_regression)
+        ok = ok and not regressed
+        print(
+            f"{'❌' if regressed else '  '} {r['endpoint']:<14} c={r['concurrency']:<4} "
+            f"p95 {p95_delta:+.1%}  throughput {rps_delta:+.1%}",
+            file=sys.stderr,
+        )
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Throughput, latencia p50/p95/p99 y lag del event loop por endpoint.")
+    parser.add_argument("--endpoints", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, default=200, help="Requests medidos por endpoint y nivel")
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--llm-first-token-ms", type=float, default=300.0)
+    parser.add_argument("--llm-token-ms", type=float, default=5.0)
+    parser.add_argument("--llm-output-tokens", type=int, default=60)
+    parser.add_argument("--tool-call-rate", type=float, default=0.3)
+    parser.add_argument("--embedding-latency-ms", type=float, default=80.0)
+    parser.add_argument("--data-dir", type=str, default=None, help="Default: directorio temporal nuevo (índice y caches en frío)")
+    parser.add_argument("--llm-cache", action="store_true", help="Activar la cache persistente de respuestas de LLM")
+    parser.add_argument("--keep-rate-limits", action="store_true", help="No desactivar el rate limiting")
+    parser.add_argument("--json", type=str, default=None, help="Guardar resultados en este archivo (default: stdout)")
+    parser.add_argument("--compare", type=str, default=None, help="JSON de una corrida anterior")
+    parser.add_argument("--max-regression", type=float, default=None, help="Ej: 0.15 -> sale con código 1 si p95 o throughput empeoran >15%%")
+    args = parser.parse_args()
+
+    data_dir = configure_environment(args)
+    results = asyncio.run(run(args))
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "data_dir": data_dir,
+        },
+        "config": {k: v for k, v in vars(args).items() if k not in ("json", "compare", "data_dir")},
+        "results": results,
+    }
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"💾 Resultados guardados en {args.json}", file=sys.stderr)
+    else:
+        print(json.dumps(report, indent=2))
+
+    if args.compare and not compare(results, args.compare, args.max_regression):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,7 @@
+import os
+import tempfile
+
+# Antes de importar `app`: proveedor de modelos falso y datos en un directorio temporal
+os.environ.setdefault("MODEL_PROVIDER", "fake")
+os.environ.setdefault("DATA_DIR", tempfile.mkdtemp(prefix="backend-tests-"))
+os.environ.setdefault("LOG_LEVEL", "WARNING")
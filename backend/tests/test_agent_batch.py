@@ -0,0 +1,72 @@
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+from langchain_core.runnables import Runnable
+
+from app.graphs import incident_agent
+from app.main import app
+from app.routers import agent_router
+from app.schemas.graph_schemas import ClassificationOutput
+from app.services import ticket_classifier
+
+
+class FakeClassifier(Runnable):
+    """Cadena de clasificación falsa: registra el tamaño de cada tanda y falla en los tickets con 'boom'."""
+
+    def __init__(self):
+        self.batches: list[int] = []
+
+    def invoke(self, input, config=None, **kwargs):
+        raise AssertionError("el triaje masivo debe clasificar por tandas")
+
+    async def abatch(self, inputs, config=None, *, return_exceptions=False, **kwargs):
+        self.batches.append(len(inputs))
+        return [
+            RuntimeError("503 UNAVAILABLE") if "boom" in i["input_text"]
+            else ClassificationOutput(category="technical-issue", reason="falla del sistema")
+            for i in inputs
+        ]
+
+
+@pytest.fixture
+def classifier(monkeypatch):
+    fake = FakeClassifier()
+    monkeypatch.setattr(incident_agent, "classification_chain", fake)
+    monkeypatch.setattr(agent_router, "BATCH_LLM_CHUNK_SIZE", 2)
+    # Sin muestreo shadow: los tickets obvios siempre salen por el fast-path
+    monkeypatch.setattr(ticket_classifier, "FASTPATH_SHADOW_RATE", 0.0)
+    return fake
+
+
+def post_batch(texts: list[str]):
+    return TestClient(app).post("/agent/process/batch", json={"tickets": [{"text": t} for t in texts]})
+
+
+def test_batch_classifies_in_chunks_and_isolates_failures(classifier):
+    texts = [
+        "hola",
+        "el reporte mensual sale con columnas desordenadas",
+        "boom en el módulo de exportación",
+        "el reporte mensual sale con columnas desordenadas",
+        "la sincronización con el ERP quedó trabada",
+    ]
+    response = post_batch(texts)
+    assert response.status_code == 200
+
+    lines = {line["index"]: line for line in map(json.loads, response.text.splitlines())}
+    assert sorted(lines) == list(range(len(texts)))
+    assert lines[0]["decision_source"] == "fast-path"
+    assert lines[1]["classification"] == lines[3]["classification"] == "technical-issue"
+    assert lines[1]["decision_source"] == "llm"
+    assert lines[2]["status"] == "error" and "503" in lines[2]["detail"]
+    assert lines[4]["status"] == "ok"
+    # 3 tickets distintos para el LLM (el duplicado se clasifica una vez), en tandas de 2
+    assert classifier.batches == [2, 1]
+
+
+def test_batch_size_is_limited(classifier, monkeypatch):
+    monkeypatch.setattr(agent_router, "BATCH_MAX_TICKETS", 3)
+    response = post_batch(["a", "b", "c", "d"])
+    assert response.status_code == 413
+    assert classifier.batches == []
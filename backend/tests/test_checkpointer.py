@@ -0,0 +1,110 @@
+import operator
+from typing import Annotated, TypedDict
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.graph import END, StateGraph
+from langgraph.graph.message import add_messages
+
+from app.services.checkpointer import SqliteCheckpointer
+
+
+class State(TypedDict):
+    messages: Annotated[list, add_messages]
+    # Canal que casi nunca cambia: no debe re-escribirse en cada paso
+    profile: str
+    turns: Annotated[int, operator.add]
+
+
+def reply(state: State):
+    return {"messages": [AIMessage(f"respuesta {len(state['messages'])}")], "turns": 1}
+
+
+@pytest.fixture
+def checkpointer(tmp_path):
+    return SqliteCheckpointer(str(tmp_path / "checkpoints.sqlite3"), ttl_seconds=None, max_threads=None,
+                              keep_per_thread=3)
+
+
+@pytest.fixture
+def graph(checkpointer):
+    workflow = StateGraph(State)
+    workflow.add_node("reply", reply)
+    workflow.set_entry_point("reply")
+    workflow.add_edge("reply", END)
+    return workflow.compile(checkpointer=checkpointer)
+
+
+def run_turns(graph, thread_id: str, turns: int):
+    config = {"configurable": {"thread_id": thread_id}}
+    graph.invoke({"messages": [HumanMessage("hola")], "profile": "cliente-premium"}, config)
+    for i in range(turns - 1):
+        graph.invoke({"messages": [HumanMessage(f"pregunta {i}")]}, config)
+    return config
+
+
+def blob_versions(checkpointer, thread_id: str, channel: str) -> int:
+    (count,) = checkpointer._conn.execute(
+        "SELECT COUNT(*) FROM blobs WHERE thread_id = ? AND channel = ?", (thread_id, channel)
+    ).fetchone()
+    return count
+
+
+def test_state_round_trips_through_channel_blobs(graph, checkpointer):
+    config = run_turns(graph, "t1", 5)
+    state = graph.get_state(config).values
+    assert len(state["messages"]) == 10
+    assert state["messages"][-1].content == "respuesta 9"
+    assert state["profile"] == "cliente-premium"
+    assert state["turns"] == 5
+
+    # Un proceso nuevo (otra instancia sobre el mismo archivo) retoma el thread
+    reopened = SqliteCheckpointer(checkpointer._conn.execute("PRAGMA database_list").fetchone()[2],
+                                  ttl_seconds=None, max_threads=None)
+    assert len(reopened.get_tuple(config).checkpoint["channel_values"]["messages"]) == 10
+
+
+def test_checkpoint_rows_do_not_grow_with_history(graph, checkpointer):
+    run_turns(graph, "t1", 20)
+    sizes = [len(blob) for (blob,) in checkpointer._conn.execute(
+        "SELECT checkpoint FROM checkpoints WHERE thread_id = 't1' ORDER BY checkpoint_id"
+    )]
+    # Sin channel_values adentro, la fila del checkpoint no depende del largo del historial
+    assert max(sizes) - min(sizes) < 200
+
+
+def test_unchanged_channels_are_written_once_and_old_versions_pruned(graph, checkpointer):
+    run_turns(graph, "t1", 20)
+    assert blob_versions(checkpointer, "t1", "profile") == 1
+    # Solo sobreviven las versiones que referencian los últimos `keep_per_thread` checkpoints
+    assert blob_versions(checkpointer, "t1", "messages") <= checkpointer.keep_per_thread
+    (checkpoints,) = checkpointer._conn.execute("SELECT COUNT(*) FROM checkpoints WHERE thread_id = 't1'").fetchone()
+    assert checkpoints == checkpointer.keep_per_thread
+
+
+def test_delete_thread_removes_its_blobs_only(graph, checkpointer):
+    run_turns(graph, "t1", 3)
+    run_turns(graph, "t2", 3)
+    checkpointer.delete_thread("t1")
+    assert blob_versions(checkpointer, "t1", "messages") == 0
+    assert blob_versions(checkpointer, "t2", "messages") > 0
+    assert checkpointer.get_tuple({"configurable": {"thread_id": "t1"}}) is None
+
+
+def test_checkpoints_with_inline_channel_values_still_load(checkpointer):
+    # Formato anterior: el checkpoint completo (con channel_values) en la fila
+    checkpoint = {
+        "v": 1, "id": "1ef0000000000000", "ts": "2026-01-01T00:00:00+00:00",
+        "channel_values": {"messages": [HumanMessage("hola", id="m1")]},
+        "channel_versions": {"messages": "00000000000000000000000000000001.0"},
+        "versions_seen": {}, "pending_sends": [],
+    }
+    type_, blob = checkpointer.serde.dumps_typed(checkpoint)
+    meta_type, meta = checkpointer.serde.dumps_typed({})
+    checkpointer._conn.execute(
+        "INSERT INTO checkpoints VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        ("viejo", "", checkpoint["id"], None, type_, blob, meta_type, meta),
+    )
+    loaded = checkpointer.get_tuple({"configurable": {"thread_id": "viejo"}}).checkpoint
+    assert loaded["channel_values"]["messages"][0].content == "hola"
+    assert checkpointer.list_messages("viejo").messages[0]["content"] == "hola"
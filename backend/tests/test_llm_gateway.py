@@ -0,0 +1,125 @@
+import asyncio
+
+import pytest
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage
+
+from app.services import llm_gateway as gateway_module
+from app.services.llm_gateway import LLMGateway, is_retryable
+
+
+class ScriptedModel(GenericFakeChatModel):
+    """Modelo falso: cuenta llamadas, tarda `delay` y falla (antes o a mitad del stream) según el guion."""
+
+    calls: int = 0
+    in_flight: int = 0
+    max_in_flight: int = 0
+    delay: float = 0.05
+    failures: list = []
+    fail_after_tokens: int = 0
+
+    async def _astream(self, *args, **kwargs):
+        self.calls += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+            failure = self.failures.pop(0) if self.failures else None
+            emitted = 0
+            async for chunk in super()._astream(*args, **kwargs):
+                if failure is not None and emitted == self.fail_after_tokens:
+                    raise failure
+                emitted += 1
+                yield chunk
+        finally:
+            self.in_flight -= 1
+
+    async def _agenerate(self, *args, **kwargs):
+        from langchain_core.language_models.chat_models import agenerate_from_stream
+        return await agenerate_from_stream(self._astream(*args, **kwargs))
+
+
+def make_model(**kwargs) -> ScriptedModel:
+    return ScriptedModel(messages=iter([AIMessage("hola mundo lindo")] * 20), **kwargs)
+
+
+def gateway_for(model: ScriptedModel, monkeypatch, **kwargs) -> LLMGateway:
+    monkeypatch.setattr(gateway_module, "chat_model", lambda name, temperature=0: model)
+    options = {"max_concurrency": 8, "retries": 2, "base_delay": 0.0, "max_delay": 0.0, "coalesce": True}
+    return LLMGateway(**{**options, **kwargs})
+
+
+def test_is_retryable():
+    assert is_retryable(TimeoutError())
+    assert is_retryable(RuntimeError("429 RESOURCE_EXHAUSTED"))
+    assert not is_retryable(ValueError("400 INVALID_ARGUMENT"))
+
+
+def test_identical_concurrent_calls_are_coalesced(monkeypatch):
+    model = make_model()
+    runnable = gateway_for(model, monkeypatch).runnable("m", name="t")
+
+    async def main():
+        return await asyncio.gather(*(runnable.ainvoke("misma pregunta") for _ in range(5)))
+
+    responses = asyncio.run(main())
+    assert model.calls == 1
+    assert {r.content for r in responses} == {"hola mundo lindo"}
+
+
+def test_concurrency_is_capped_per_model(monkeypatch):
+    model = make_model()
+    runnable = gateway_for(model, monkeypatch, max_concurrency=2).runnable("m", name="t")
+
+    async def main():
+        await asyncio.gather(*(runnable.ainvoke(f"pregunta {i}") for i in range(6)))
+
+    asyncio.run(main())
+    assert model.calls == 6
+    assert model.max_in_flight == 2
+
+
+def test_transient_errors_are_retried(monkeypatch):
+    model = make_model(failures=[TimeoutError("boom"), RuntimeError("503 UNAVAILABLE")])
+    runnable = gateway_for(model, monkeypatch).runnable("m", name="t")
+    assert asyncio.run(runnable.ainvoke("x")).content == "hola mundo lindo"
+    assert model.calls == 3
+
+
+def test_non_retryable_errors_surface_immediately(monkeypatch):
+    model = make_model(failures=[ValueError("400 INVALID_ARGUMENT")])
+    runnable = gateway_for(model, monkeypatch).runnable("m", name="t")
+    with pytest.raises(ValueError):
+        asyncio.run(runnable.ainvoke("x"))
+    assert model.calls == 1
+
+
+async def stream_tokens(runnable) -> list[str]:
+    tokens = []
+    async for event in runnable.astream_events("x", version="v2"):
+        if event["event"] == "on_chat_model_stream":
+            tokens.append(event["data"]["chunk"].content)
+    return tokens
+
+
+def test_stream_is_retried_before_the_first_token(monkeypatch):
+    model = make_model(failures=[TimeoutError("boom")], fail_after_tokens=0)
+    runnable = gateway_for(model, monkeypatch).runnable("m", name="t")
+    assert "".join(asyncio.run(stream_tokens(runnable))) == "hola mundo lindo"
+    assert model.calls == 2
+
+
+def test_stream_is_not_replayed_after_tokens_were_sent(monkeypatch):
+    model = make_model(failures=[TimeoutError("boom")], fail_after_tokens=2)
+    runnable = gateway_for(model, monkeypatch).runnable("m", name="t")
+    tokens = []
+
+    async def main():
+        async for event in runnable.astream_events("x", version="v2"):
+            if event["event"] == "on_chat_model_stream":
+                tokens.append(event["data"]["chunk"].content)
+
+    with pytest.raises(TimeoutError):
+        asyncio.run(main())
+    assert model.calls == 1
+    assert tokens == ["hola", " "]
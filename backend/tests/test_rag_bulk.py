@@ -0,0 +1,60 @@
+import pytest
+from langchain_core.documents import Document
+
+from app.services import rag
+from app.services.rag import RAGService, is_stale_id
+
+OLD_TEXT = "ERROR 503 en payment-service: reiniciar el balanceador LB-Main-01."
+NEW_TEXT = "ERROR 503 en payment-service: escalar los pods a 5 réplicas con kubectl."
+
+
+class Crash(Exception):
+    pass
+
+
+@pytest.fixture(autouse=True)
+def hnsw(monkeypatch):
+    # HNSW no puede borrar: los chunks reemplazados se retiran y se descartan al compactar
+    monkeypatch.setattr(rag, "RAG_INDEX_TYPE", "hnsw")
+
+
+def slab(service: RAGService, doc_id: str, text: str) -> list:
+    doc = Document(page_content=text, metadata={"source": doc_id})
+    chunks = service.split_document(doc_id, doc)
+    return [(doc_id, doc, chunks, service.embeddings.embed_documents([c.page_content for c in chunks]))]
+
+
+def stale_ids(service: RAGService) -> list[str]:
+    return [cid for cid in service.vectorstore.index_to_docstore_id.values() if is_stale_id(cid)]
+
+
+def test_checkpoint_crash_resume_finish_drops_replaced_chunks(tmp_path):
+    index_dir = str(tmp_path / "index")
+    first = RAGService("bulk", index_dir, seed=False)
+    with first.bulk_session() as session:
+        session.add_slab(slab(first, "pagos", OLD_TEXT))
+
+    # Se reemplaza el documento, se persiste un checkpoint y el proceso muere antes de finish()
+    with pytest.raises(Crash):
+        with first.bulk_session() as session:
+            session.add_slab(slab(first, "pagos", NEW_TEXT))
+            session.checkpoint()
+            raise Crash()
+
+    # Otro worker que carga el checkpoint no ve el chunk reemplazado (ni en BM25 ni en FAISS)
+    reader = RAGService("bulk", index_dir, seed=False)
+    reader.initialize()
+    assert stale_ids(reader)
+    assert all(not is_stale_id(cid) for cid in reader.lexical_index.documents)
+    assert reader.search("ERROR 503 payment-service") == NEW_TEXT
+
+    # Una sesión nueva retoma el checkpoint y compacta las posiciones retiradas
+    resumed = RAGService("bulk", index_dir, seed=False)
+    with resumed.bulk_session():
+        pass
+
+    assert stale_ids(resumed) == []
+    store = resumed.vectorstore
+    assert store.index.ntotal == len(store.index_to_docstore_id) == len(store.docstore._dict)
+    assert len(resumed.lexical_index) == store.index.ntotal
+    assert resumed.search("ERROR 503 payment-service") == NEW_TEXT
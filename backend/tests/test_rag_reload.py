@@ -0,0 +1,80 @@
+import asyncio
+import os
+
+import pytest
+from langchain_core.documents import Document
+
+from app.services import index_store
+from app.services.rag import RAGService
+
+PAYMENTS = "ERROR 503 en payment-service: escalar los pods a 5 réplicas con kubectl."
+KEYS = "Rotación de API keys de Stripe cada 90 días en Secrets Manager."
+
+
+def doc(doc_id: str, text: str) -> dict[str, Document]:
+    return {doc_id: Document(page_content=text, metadata={"source": doc_id})}
+
+
+def break_current_version(index_dir: str):
+    """Versión publicada ilegible (ej. otro worker la limpió o quedó a medio escribir)."""
+    path = index_store.read_manifest(index_dir)["_path"]
+    os.remove(os.path.join(path, index_store.INDEX_FILE))
+
+
+@pytest.fixture
+def writer_and_reader(tmp_path):
+    index_dir = str(tmp_path / "index")
+    writer = RAGService("reload", index_dir, seed=False)
+    writer.initialize()
+    writer.upsert_documents(doc("pagos", PAYMENTS))
+    reader = RAGService("reload", index_dir, seed=False)
+    reader.initialize()
+    return writer, reader
+
+
+def test_failed_reload_keeps_serving_current_version(writer_and_reader):
+    writer, reader = writer_and_reader
+    version = reader.manifest["_version"]
+
+    writer.upsert_documents(doc("keys", KEYS))
+    break_current_version(writer.index_dir)
+    reader._last_reload_check = 0.0
+    reader._maybe_reload()
+
+    assert reader.manifest["_version"] == version
+    assert reader.vectorstore is not None
+    assert reader.search("ERROR 503 payment-service") == PAYMENTS
+
+    # La siguiente versión buena se adopta normalmente
+    writer.upsert_documents(doc("otro", "Runbook de la VPN corporativa."))
+    reader._last_reload_check = 0.0
+    reader._maybe_reload()
+    assert reader.manifest["_version"] == writer.manifest["_version"]
+    assert set(reader.list_documents()) == {"pagos", "keys", "otro"}
+
+
+def test_background_reload_failure_keeps_current_version(writer_and_reader):
+    writer, reader = writer_and_reader
+    version = reader.manifest["_version"]
+    writer.upsert_documents(doc("keys", KEYS))
+    break_current_version(writer.index_dir)
+
+    async def search_during_reload():
+        reader._last_reload_check = 0.0
+        answer = await reader.asearch("ERROR 503 payment-service")
+        while reader._reloading:
+            await asyncio.sleep(0.01)
+        return answer
+
+    assert asyncio.run(search_during_reload()) == PAYMENTS
+    assert reader.manifest["_version"] == version
+    assert reader.search("ERROR 503 payment-service") == PAYMENTS
+
+
+def test_cold_start_without_usable_version_builds_from_document_store(writer_and_reader):
+    writer, _ = writer_and_reader
+    break_current_version(writer.index_dir)
+
+    fresh = RAGService("reload", writer.index_dir, seed=False)
+    fresh.initialize()
+    assert fresh.search("ERROR 503 payment-service") == PAYMENTS
@@ -0,0 +1,73 @@
+import time
+
+import pytest
+
+from app.core.state_store import MemoryStateStore, SqliteStateStore
+from app.utils.rate_limiter import GCRALimiter, parse_limit
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = Clock()
+    monkeypatch.setattr(time, "time", fake)
+    return fake
+
+
+def test_parse_limit():
+    assert parse_limit("10/minute") == (10, 60.0)
+    assert parse_limit("3 / second") == (3, 1.0)
+
+
+def test_burst_up_to_limit_then_reject(clock):
+    limiter = GCRALimiter("test", 5, 60.0, MemoryStateStore(max_keys=100))
+
+    results = [limiter.hit("1.2.3.4") for _ in range(5)]
+    assert all(allowed for allowed, _, _ in results)
+    assert [remaining for _, remaining, _ in results] == [4, 3, 2, 1, 0]
+
+    allowed, remaining, retry_after = limiter.hit("1.2.3.4")
+    assert not allowed and remaining == 0
+    # Se libera un lugar cada period/limit segundos
+    assert retry_after == pytest.approx(12.0)
+
+
+def test_capacity_refills_at_the_emission_interval(clock):
+    limiter = GCRALimiter("test", 5, 60.0, MemoryStateStore(max_keys=100))
+    for _ in range(5):
+        limiter.hit("ip")
+
+    clock.now += 11.9
+    assert not limiter.hit("ip")[0]
+    clock.now += 0.2
+    assert limiter.hit("ip")[0]
+    assert not limiter.hit("ip")[0]
+
+    # Con la ventana completa de reposo vuelve la ráfaga entera
+    clock.now += 60.0
+    assert sum(limiter.hit("ip")[0] for _ in range(6)) == 5
+
+
+def test_keys_are_independent(clock):
+    limiter = GCRALimiter("test", 1, 60.0, MemoryStateStore(max_keys=100))
+    assert limiter.hit("a")[0]
+    assert not limiter.hit("a")[0]
+    assert limiter.hit("b")[0]
+
+
+def test_limit_is_shared_between_workers_with_sqlite_store(clock, tmp_path):
+    path = str(tmp_path / "state.sqlite3")
+    worker_a = GCRALimiter("shared", 3, 60.0, SqliteStateStore(path, max_keys=100))
+    worker_b = GCRALimiter("shared", 3, 60.0, SqliteStateStore(path, max_keys=100))
+
+    assert worker_a.hit("ip")[0]
+    assert worker_b.hit("ip")[0]
+    assert worker_a.hit("ip")[0]
+    assert not worker_b.hit("ip")[0]
@@ -0,0 +1,149 @@
+from typing import Annotated, TypedDict
+
+import pytest
+from fastapi.testclient import TestClient
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from langgraph.graph import END, StateGraph
+from langgraph.graph.message import add_messages
+
+from app.main import app
+from app.routers import react_router
+from app.services.checkpointer import SqliteCheckpointer
+
+
+class State(TypedDict):
+    messages: Annotated[list, add_messages]
+
+
+def reply(state: State):
+    # Cada turno: llamada a herramienta + resultado + respuesta con texto
+    turn = len(state["messages"])
+    call_id = f"call-{turn}"
+    return {"messages": [
+        AIMessage("", tool_calls=[{"name": "get_weather", "args": {"city": "Lima"}, "id": call_id}]),
+        ToolMessage("18°C", tool_call_id=call_id),
+        AIMessage(f"respuesta {turn}"),
+    ]}
+
+
+@pytest.fixture
+def memory(tmp_path, monkeypatch):
+    checkpointer = SqliteCheckpointer(str(tmp_path / "checkpoints.sqlite3"), ttl_seconds=None,
+                                      max_threads=None, keep_per_thread=3)
+    monkeypatch.setattr(react_router, "memory", checkpointer)
+    return checkpointer
+
+
+@pytest.fixture
+def graph(memory):
+    workflow = StateGraph(State)
+    workflow.add_node("reply", reply)
+    workflow.set_entry_point("reply")
+    workflow.add_edge("reply", END)
+    return workflow.compile(checkpointer=memory)
+
+
+@pytest.fixture
+def client():
+    return TestClient(app)
+
+
+def chat(graph, thread_id: str, text: str):
+    graph.invoke({"messages": [HumanMessage(text)]}, {"configurable": {"thread_id": thread_id}})
+
+
+def test_unknown_thread_is_404(memory, client):
+    assert client.get("/react/context/nadie").status_code == 404
+
+
+def test_etag_returns_304_until_the_thread_changes(graph, client):
+    chat(graph, "t1", "hola")
+    first = client.get("/react/context/t1")
+    assert first.status_code == 200
+    etag = first.headers["ETag"]
+    assert etag.startswith('W/"')
+
+    cached = client.get("/react/context/t1", headers={"If-None-Match": etag})
+    assert cached.status_code == 304
+    assert cached.headers["ETag"] == etag
+    assert cached.content == b""
+
+    # Un paso nuevo cambia la versión: el ETag viejo ya no sirve
+    chat(graph, "t1", "otra pregunta")
+    fresh = client.get("/react/context/t1", headers={"If-None-Match": etag})
+    assert fresh.status_code == 200
+    assert fresh.headers["ETag"] != etag
+    assert len(fresh.json()) == 8
+
+
+def test_pages_backwards_with_prev_cursor(graph, client):
+    for i in range(3):
+        chat(graph, "t1", f"pregunta {i}")
+    full = client.get("/react/context/t1").json()
+    assert len(full) == 12
+
+    last = client.get("/react/context/t1", params={"limit": 5})
+    assert last.json() == full[-5:]
+    assert last.headers["X-Prev-Cursor"] == full[-5]["id"]
+    assert last.headers["X-Has-More-After"] == "false"
+
+    previous = client.get("/react/context/t1", params={"limit": 5, "before": last.headers["X-Prev-Cursor"]})
+    assert previous.json() == full[-10:-5]
+
+    oldest = client.get("/react/context/t1", params={"limit": 5, "before": previous.headers["X-Prev-Cursor"]})
+    assert oldest.json() == full[:2]
+    assert "X-Prev-Cursor" not in oldest.headers
+
+
+def test_next_cursor_returns_only_new_messages(graph, client):
+    chat(graph, "t1", "hola")
+    first = client.get("/react/context/t1")
+    cursor = first.headers["X-Next-Cursor"]
+    assert cursor == first.json()[-1]["id"]
+
+    nothing_new = client.get("/react/context/t1", params={"after": cursor})
+    assert nothing_new.json() == []
+    # Sin mensajes nuevos, el cursor se mantiene para la próxima consulta
+    assert nothing_new.headers["X-Next-Cursor"] == cursor
+
+    chat(graph, "t1", "otra pregunta")
+    new = client.get("/react/context/t1", params={"after": cursor, "limit": 2})
+    assert [m["content"] for m in new.json()] == ["otra pregunta", ""]
+    assert new.headers["X-Has-More-After"] == "true"
+
+    rest = client.get("/react/context/t1", params={"after": new.headers["X-Next-Cursor"]})
+    assert [m["type"] for m in rest.json()] == ["tool", "ai"]
+    assert rest.headers["X-Has-More-After"] == "false"
+
+
+def test_types_filter_drops_tool_steps(graph, client):
+    chat(graph, "t1", "hola")
+    chat(graph, "t1", "otra pregunta")
+    messages = client.get("/react/context/t1", params=[("types", "human"), ("types", "ai")]).json()
+    assert [(m["type"], m["content"]) for m in messages] == [
+        ("human", "hola"), ("ai", "respuesta 1"),
+        ("human", "otra pregunta"), ("ai", "respuesta 5"),
+    ]
+
+    # El filtro también se aplica a los cursores: la página anterior no trae pasos de herramientas
+    page = client.get("/react/context/t1", params=[("types", "human"), ("types", "ai"), ("limit", "2")])
+    assert page.json() == messages[-2:]
+    older = client.get("/react/context/t1", params=[("types", "human"), ("types", "ai"),
+                                                   ("before", page.headers["X-Prev-Cursor"])])
+    assert older.json() == messages[:2]
+    assert "X-Prev-Cursor" not in older.headers
+
+
+def test_cursor_from_another_thread_is_400(graph, client):
+    chat(graph, "t1", "hola")
+    chat(graph, "t2", "hola")
+    foreign = client.get("/react/context/t2").json()[0]["id"]
+    assert client.get("/react/context/t1", params={"before": foreign}).status_code == 400
+    assert client.get("/react/context/t1", params={"after": "no-existe"}).status_code == 400
+
+
+def test_reset_context_deletes_history(graph, client):
+    chat(graph, "t1", "hola")
+    assert client.delete("/react/context/t1").json()["status"] == "success"
+    assert client.get("/react/context/t1").status_code == 404
+    assert client.delete("/react/context/t1").json()["status"] == "warning"
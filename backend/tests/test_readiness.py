@@ -0,0 +1,79 @@
+import asyncio
+
+import pytest
+from langchain_core.documents import Document
+
+from app.core import readiness as readiness_module
+from app.core.readiness import Readiness
+from app.services import rag
+from app.services.rag import RAGService
+
+PAYMENTS = "ERROR 503 en payment-service: escalar los pods a 5 réplicas con kubectl."
+
+
+class FlakyEmbeddings:
+    """Embeddings que fallan las primeras `failures` llamadas (ej. proveedor caído o sin API key)."""
+
+    def __init__(self, inner, failures: int):
+        self.inner = inner
+        self.failures = failures
+
+    def embed_documents(self, texts):
+        if self.failures > 0:
+            self.failures -= 1
+            raise RuntimeError("503 UNAVAILABLE")
+        return self.inner.embed_documents(texts)
+
+    def __getattr__(self, name):
+        return getattr(self.inner, name)
+
+
+@pytest.fixture(autouse=True)
+def fast_retries(monkeypatch):
+    monkeypatch.setattr(readiness_module, "READINESS_RETRY_INITIAL", 0.01)
+    monkeypatch.setattr(readiness_module, "READINESS_RETRY_MAX", 0.02)
+
+
+@pytest.fixture
+def flaky_service(tmp_path, monkeypatch):
+    embeddings = FlakyEmbeddings(rag.shared_embeddings(), failures=2)
+    monkeypatch.setattr(rag, "shared_embeddings", lambda: embeddings)
+    service = RAGService("ready", str(tmp_path / "index"), seed=False)
+    service.document_store.upsert({"pagos": Document(page_content=PAYMENTS, metadata={"source": "pagos"})})
+    return service
+
+
+def test_failed_first_build_does_not_mark_collection_ready(flaky_service):
+    with pytest.raises(RuntimeError):
+        flaky_service.initialize()
+    assert not flaky_service.ready
+    assert flaky_service.vectorstore is None
+
+
+def test_readiness_retries_required_component_until_index_is_built(flaky_service):
+    readiness = Readiness()
+    readiness.register("rag_index", flaky_service.initialize)
+
+    asyncio.run(readiness.warm_up())
+
+    report = readiness.report()
+    assert readiness.ready
+    assert report["components"]["rag_index"]["attempts"] == 3
+    assert report["components"]["rag_index"]["error"] is None
+    assert flaky_service.search("ERROR 503 payment-service") == PAYMENTS
+
+
+def test_optional_component_failure_is_not_retried():
+    calls = []
+
+    def broken():
+        calls.append(1)
+        raise RuntimeError("sin pool")
+
+    readiness = Readiness()
+    readiness.register("math_pool", broken, required=False)
+    asyncio.run(readiness.warm_up())
+
+    assert readiness.ready
+    assert readiness.summary() == {"math_pool": "failed"}
+    assert len(calls) == 1
@@ -0,0 +1,137 @@
+import math
+import time
+
+import pytest
+
+from app.utils.safe_math import MathError, MathProcessPool, evaluate_local
+
+
+@pytest.mark.parametrize("expression, expected", [
+    ("2 + 3 * 4", 14),
+    ("20 ** 2", 400),
+    ("-7 // 2", -4),
+    ("math.sqrt(16)", 4.0),
+    ("log(e)", 1.0),
+    ("math.pi * 2", math.tau),
+    ("pow(2, 10, 1000)", 24),
+    ("factorial(10)", 3628800),
+])
+def test_allowed_expressions(expression, expected):
+    assert evaluate_local(expression) == pytest.approx(expected)
+
+
+def test_variables():
+    assert evaluate_local("now + 60", variables={"now": 1000}) == 1060
+
+
+@pytest.mark.parametrize("expression", [
+    "__import__('os')",
+    "open('/etc/passwd')",
+    "eval('1')",
+    "lambda: 1",
+    "[1, 2]",
+    "{1: 2}",
+    "'texto'",
+    "True",
+    "1 < 2",
+    "1 if 1 else 2",
+    "(x := 1)",
+    "f'{1}'",
+    "[x for x in (1, 2)]",
+    "math.sqrt(x=4)",
+    "now",  # variable no declarada
+])
+def test_rejected_nodes(expression):
+    with pytest.raises(MathError):
+        evaluate_local(expression)
+
+
+@pytest.mark.parametrize("expression", [
+    "math.__dict__",
+    "math.__builtins__",
+    "math.__loader__",
+    "math.sqrt.__globals__",
+    "math.pi.__class__",
+    "(1).__class__",
+    "().__class__.__bases__[0].__subclasses__()",
+    "math.os",
+    "__builtins__",
+    "math.__import__('os')",
+    "math.sqrt.__call__(4)",
+])
+def test_attribute_and_dunder_access(expression):
+    with pytest.raises(MathError):
+        evaluate_local(expression)
+
+
+@pytest.mark.parametrize("expression", [
+    "2 ** 100000",
+    "9 ** 9 ** 9",
+    "10 ** 5000",
+    "pow(10, 100000)",
+    "2 ** -100000",
+    "(10 ** 1000) * (10 ** 1000)",
+    "factorial(100000)",
+    "comb(10 ** 6, 500)",
+])
+def test_huge_results_are_rejected(expression):
+    with pytest.raises(MathError):
+        evaluate_local(expression)
+
+
+@pytest.mark.parametrize("expression", [
+    "round(5, -10 ** 8)",
+    "round(5, -(10 ** 8))",
+    "round(1.5, -10 ** 8)",
+    "round(5, 10 ** 8)",
+])
+def test_round_ndigits_is_bounded(expression):
+    # round(entero, -n) arma 10**n dentro de CPython, donde el deadline no llega
+    start = time.monotonic()
+    with pytest.raises(MathError, match="round"):
+        evaluate_local(expression)
+    assert time.monotonic() - start < 0.5
+
+
+def test_round_within_limits():
+    assert evaluate_local("round(2.675, 2)") == round(2.675, 2)
+    assert evaluate_local("round(123456, -3)") == 123000
+    assert evaluate_local("round(7.5)") == 8
+
+
+def test_syntax_error_and_length_limit():
+    with pytest.raises(MathError, match="Sintaxis"):
+        evaluate_local("2 +")
+    with pytest.raises(MathError, match="demasiado larga"):
+        evaluate_local("1 + " * 1000 + "1")
+
+
+def test_deadline_is_enforced():
+    with pytest.raises(MathError, match="Tiempo de cálculo excedido"):
+        evaluate_local("1 + 1", timeout=-1)
+
+
+def test_arithmetic_errors_are_math_errors():
+    with pytest.raises(MathError):
+        evaluate_local("1 / 0")
+    with pytest.raises(MathError):
+        evaluate_local("math.sqrt(-1)")
+
+
+def test_process_pool_timeout_restarts_pool():
+    pool = MathProcessPool(1)
+    try:
+        assert pool.evaluate("6 * 7") == 42
+        with pytest.raises(MathError, match="Tiempo de cálculo excedido"):
+            pool.evaluate("1 + 1", timeout=-0.5)
+        # Después de un timeout el pool sigue atendiendo (reiniciado si hizo falta)
+        assert pool.evaluate("2 ** 10") == 1024
+    finally:
+        pool.close()
+
+
+def test_math_calculator_tool_reports_errors():
+    from app.tools.agent_tools import math_calculator
+
+    assert math_calculator.invoke({"expression": "20 ** 2"}) == "400"
+    assert math_calculator.invoke({"expression": "__import__('os').system('id')"}).startswith("Error matemático")
@@ -0,0 +1,45 @@
+import pytest
+
+from app.services import ticket_classifier as classifier_module
+from app.services.ticket_classifier import SEED_EXAMPLES, TicketClassifier
+
+
+@pytest.fixture
+def classifier(monkeypatch):
+    monkeypatch.setattr(classifier_module, "FASTPATH_SHADOW_RATE", 0.0)
+    return TicketClassifier(SEED_EXAMPLES)
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("olvidé mi contraseña", "user-issue"),
+    ("hola! olvidé mi contraseña", "user-issue"),
+    ("no puedo entrar a mi cuenta, me olvidé la clave", "user-issue"),
+    ("error 500 al guardar y la app se cierra sola", "technical-issue"),
+    ("hola, buenos días", "general"),
+])
+def test_obvious_tickets_take_the_fast_path(classifier, text, expected):
+    decision = classifier.decide(text)
+    assert decision is not None and decision[0] == expected
+
+
+@pytest.mark.parametrize("text", [
+    "olvidé mi contraseña y ahora el servidor devuelve 500",
+    "no recuerdo mi contraseña y la página da error 404",
+])
+def test_mixed_signal_tickets_go_to_the_llm(classifier, text):
+    assert classifier.decide(text) is None
+
+
+def test_agreement_only_counts_fast_path_eligible_predictions(classifier):
+    # Predicción local de baja confianza: el fast-path no la hubiera tomado, no cuenta para el acuerdo
+    classifier.record("llm", "necesito que alguien me llame por lo del contrato", llm_label="general")
+    # Ticket mixto: tampoco hubiera ido por el fast-path
+    classifier.record("llm", "olvidé mi contraseña y ahora el servidor devuelve 500", llm_label="technical-issue")
+    assert classifier.stats()["agreement_rate"] is None
+
+    # Ticket obvio que igual fue al LLM (shadow): sí se compara
+    classifier.record("llm", "me cobraron dos veces", llm_label="user-issue")
+    classifier.record("llm", "la página devuelve error 500", llm_label="general")
+    stats = classifier.stats()
+    assert (stats["agree"], stats["disagree"]) == (1, 1)
+    assert stats["agreement_rate"] == 0.5
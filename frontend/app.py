@@ -1,7 +1,7 @@
 import os
 import streamlit as st
-import requests
 import json
+from backend_client import BackendClient, BackendError
 
 # --- Configuración de la Página ---
 st.set_page_config(
@@ -12,23 +12,25 @@ st.set_page_config(
 
 DEFAULT_API_URL = os.getenv("BACKEND_URL", "http://backend:8000")
 
+@st.cache_resource
+def get_client(base_url: str) -> BackendClient:
+    """Un cliente (y su pool de conexiones keep-alive) por URL, compartido entre sesiones y reruns."""
+    return BackendClient(base_url)
+
 # --- Configuración Lateral (Sidebar) ---
 with st.sidebar:
     st.header("⚙️ Configuración")
     # Nota: Si usas Docker interno, la URL por defecto suele ser http://backend:8000
     API_URL = st.text_input("URL del Backend", DEFAULT_API_URL)
     USER_ID = st.text_input("ID de Usuario / Thread", "default_user")
+    client = get_client(API_URL)
     
     st.divider()
     st.markdown("### Estado del Sistema")
     if st.button("Verificar Conexión"):
-        try:
-            r = requests.get(f"{API_URL}/docs")
-            if r.status_code == 200:
-                st.success("Backend Online 🟢")
-            else:
-                st.error(f"Error: {r.status_code}")
-        except:
+        if client.health():
+            st.success("Backend Online 🟢")
+        else:
             st.error("Backend Offline 🔴")
 
 st.title("🤖 AI Engineer Challenge: Panel de Control")
@@ -45,24 +47,39 @@ with tab1:
     st.info("Este agente busca información en manuales técnicos indexados.")
     
     query_rag = st.text_input("Tu pregunta técnica:", "Cómo configuro la conexión wifi?")
+    collection = st.text_input("Colección (base de conocimiento del equipo):", "default")
     
     if st.button("Consultar RAG", type="primary"):
-        with st.spinner("Buscando en vector store..."):
-            try:
-                payload = {"question": query_rag}
-                response = requests.post(f"{API_URL}/rag/query", json=payload)
+        # Streaming: la respuesta se va mostrando mientras el modelo la genera
+        status_box = st.empty()
+        answer_box = st.empty()
+        status_box.info("Buscando en vector store...")
+        try:
+            answer = ""
+            data = None
+            
+            for event, payload in client.stream_rag(query_rag, collection):
+                if event == "token":
+                    answer += payload["delta"]
+                    answer_box.markdown(answer + "▌")
+                elif event == "done":
+                    data = payload
+                elif event == "error":
+                    st.error(payload.get("detail", "Error desconocido"))
+            
+            status_box.empty()
+            if data:
+                st.success("Respuesta Generada:")
+                answer_box.markdown(data["answer"])
                 
-                if response.status_code == 200:
-                    data = response.json()
-                    st.success("Respuesta Generada:")
-                    st.write(data["answer"])
-                    
-                    with st.expander("Ver Fuentes y Metadata"):
-                        st.json(data)
-                else:
-                    st.error(f"Error {response.status_code}: {response.text}")
-            except Exception as e:
-                st.error(f"Error de conexión: {e}")
+                with st.expander("Ver Fuentes y Metadata"):
+                    st.json(data)
+        except BackendError as e:
+            status_box.empty()
+            st.error(str(e))
+        except Exception as e:
+            status_box.empty()
+            st.error(f"Error de conexión: {e}")
 
 # ==========================================
 # TAB 2: Incident Agent (Ejercicio 2) - CORREGIDO
@@ -76,12 +93,9 @@ with tab2:
     if st.button("Analizar Incidente", type="primary"):
         with st.spinner("Analizando y clasificando..."):
             try:
-                payload = {"text": incident_text}
-                response = requests.post(f"{API_URL}/agent/process", json=payload)
+                data = client.process_incident(incident_text)
                 
-                if response.status_code == 200:
-                    data = response.json()
-                    
+                if data:
                     st.success("Análisis Completado")
 
                     # --- ZONA SEGURA DE RENDERIZADO (FIX) ---
@@ -114,10 +128,9 @@ with tab2:
                         st.warning(f"Datos recibidos pero hubo un error visualizando los detalles: {parse_error}")
                     # ----------------------------------------
 
-                else:
-                    st.error(f"Error del Servidor {response.status_code}")
-                    st.write(response.text)
-
+            except BackendError as e:
+                st.error(f"Error del Servidor {e.status_code}")
+                st.write(e.detail)
             except Exception as e:
                 st.error(f"Error de conexión o ejecución: {e}")
 
@@ -133,7 +146,7 @@ with tab3:
     with col_del:
         if st.button("🗑️ Borrar Memoria"):
             try:
-                requests.delete(f"{API_URL}/react/context/{USER_ID}")
+                client.reset_history(USER_ID)
                 st.session_state.messages = [] # Limpiar UI también
                 st.success("Memoria reiniciada.")
                 st.rerun()
@@ -144,23 +157,14 @@ with tab3:
     if "messages" not in st.session_state:
         st.session_state.messages = []
         
-        # Intentar cargar historial del backend al inicio
+        # Intentar cargar historial del backend al inicio (el backend filtra: solo humano/IA)
         try:
-            hist_resp = requests.get(f"{API_URL}/react/context/{USER_ID}")
-            if hist_resp.status_code == 200:
-                history_data = hist_resp.json()
-                for msg in history_data:
-                    # Adaptar formato de LangGraph al de Streamlit
-                    if msg.get("type") == "human":
-                        role = "user"
-                    elif msg.get("type") == "ai":
-                        role = "assistant"
-                    else:
-                        continue # Ignorar mensajes de sistema o herramientas por ahora
-                        
-                    st.session_state.messages.append({"role": role, "content": msg["content"]})
-        except:
-            pass # Si falla (ej. 404), empezamos vacío
+            for msg in client.history(USER_ID):
+                # Adaptar formato de LangGraph al de Streamlit
+                role = "user" if msg.get("type") == "human" else "assistant"
+                st.session_state.messages.append({"role": role, "content": msg["content"]})
+        except Exception:
+            pass # Si falla, empezamos vacío
 
     # 3. Mostrar mensajes del historial
     for message in st.session_state.messages:
@@ -174,27 +178,45 @@ with tab3:
         with st.chat_message("user"):
             st.markdown(prompt)
 
-        # Llamar al backend
+        # Llamar al backend (streaming SSE: los tokens se muestran apenas llegan)
         with st.chat_message("assistant"):
-            with st.spinner("Pensando y calculando..."):
-                try:
-                    payload = {"question": prompt, "thread_id": USER_ID}
-                    response = requests.post(f"{API_URL}/react/chat", json=payload)
+            tools_box = st.status("Pensando y calculando...", expanded=False)
+            answer_box = st.empty()
+            try:
+                answer = ""
+                final = None
+                
+                for event, data in client.stream_chat(prompt, USER_ID):
+                    if event == "token":
+                        answer += data["delta"]
+                        answer_box.markdown(answer + "▌")
+                    elif event == "tool_start":
+                        tools_box.update(label=f"🔧 Usando `{data['tool']}`...", state="running")
+                        tools_box.write(f"🔧 **{data['tool']}** ← `{data.get('input')}`")
+                    elif event == "tool_end":
+                        tools_box.write(f"✅ **{data['tool']}** → `{data.get('output')}`")
+                    elif event == "done":
+                        final = data
+                    elif event == "error":
+                        st.error(data.get("detail", "Error desconocido"))
+                
+                if final:
+                    # La respuesta completa reemplaza a lo acumulado en el stream
+                    answer = final["answer"]
+                    answer_box.markdown(answer)
+                    tools_box.update(label="Listo", state="complete")
                     
-                    if response.status_code == 200:
-                        data = response.json()
-                        answer = data["answer"]
-                        
-                        # Mostrar respuesta
-                        st.markdown(answer)
-                        
-                        # Guardar en historial local
-                        st.session_state.messages.append({"role": "assistant", "content": answer})
-                        
-                        # Mostrar metadata técnica (Tokens, tiempo)
-                        with st.expander("Detalles Técnicos (Traza)"):
-                            st.json(data.get("metadata", {}))
-                    else:
-                        st.error(f"Error {response.status_code}")
-                except Exception as e:
-                    st.error(f"Error de conexión: {e}")
\ No newline at end of file
+                    # Guardar en historial local
+                    st.session_state.messages.append({"role": "assistant", "content": answer})
+                    
+                    # Mostrar metadata técnica (Tokens, tiempo)
+                    with st.expander("Detalles Técnicos (Traza)"):
+                        st.json(final.get("metadata", {}))
+                else:
+                    tools_box.update(label="Error", state="error")
+            except BackendError as e:
+                tools_box.update(label="Error", state="error")
+                st.error(str(e))
+            except Exception as e:
+                tools_box.update(label="Error", state="error")
+                st.error(f"Error de conexión: {e}")
@@ -0,0 +1,195 @@
+"""
+Cliente HTTP del panel hacia el backend.
+
+- Una sola `requests.Session` por URL (la comparte toda la app de Streamlit): conexiones
+  keep-alive reutilizadas en vez de un handshake TCP por llamada.
+- Timeouts explícitos de conexión y de lectura en todas las llamadas.
+- Lecturas cacheadas con TTL: el health check y el historial del chat. El historial se
+  refresca de forma incremental (solo los mensajes nuevos, con ETag / If-None-Match).
+- Streaming (SSE) de /react/chat y /rag/query, con fallback al endpoint clásico si el
+  backend no lo ofrece.
+"""
+import os
+import json
+import time
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Iterator, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+CONNECT_TIMEOUT = float(os.getenv("BACKEND_CONNECT_TIMEOUT", "3"))
+READ_TIMEOUT = float(os.getenv("BACKEND_READ_TIMEOUT", "60"))
+CACHE_TTL_SECONDS = float(os.getenv("BACKEND_CACHE_TTL", "5"))
+POOL_SIZE = int(os.getenv("BACKEND_POOL_SIZE", "32"))
+
+# Mensajes que se muestran en el chat (sin los pasos de herramientas)
+CHAT_MESSAGE_TYPES = ("human", "ai")
+
+
+class BackendError(Exception):
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(f"Error {status_code}: {detail}")
+        self.status_code = status_code
+        self.detail = detail
+
+
+def iter_sse(response: requests.Response) -> Iterator[tuple[str, dict]]:
+    """Parsea un stream Server-Sent Events y devuelve tuplas (evento, data)."""
+    event, data_lines = "message", []
+    for line in response.iter_lines(decode_unicode=True):
+        if not line:
+            # Línea vacía = fin del evento
+            if data_lines:
+                yield event, json.loads("\n".join(data_lines))
+            event, data_lines = "message", []
+        elif line.startswith("event:"):
+            event = line[len("event:"):].strip()
+        elif line.startswith("data:"):
+            data_lines.append(line[len("data:"):].strip())
+
+
+@dataclass
+class _History:
+    messages: list[dict] = field(default_factory=list)
+    etag: Optional[str] = None
+    # Id del último mensaje recibido: el próximo refresco pide solo lo posterior
+    cursor: Optional[str] = None
+    fetched_at: float = 0.0
+
+
+class BackendClient:
+    def __init__(self, base_url: str, connect_timeout: float = CONNECT_TIMEOUT,
+                 read_timeout: float = READ_TIMEOUT, cache_ttl: float = CACHE_TTL_SECONDS):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = (connect_timeout, read_timeout)
+        self.cache_ttl = cache_ttl
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=POOL_SIZE)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self._lock = threading.Lock()
+        self._health: tuple[float, bool] = (0.0, False)
+        self._histories: dict[str, _History] = {}
+
+    def _url(self, path: str) -> str:
+        return f"{self.base_url}{path}"
+
+    def _request(self, method: str, path: str, **kwargs: Any) -> requests.Response:
+        return self.session.request(method, self._url(path), timeout=self.timeout, **kwargs)
+
+    @staticmethod
+    def _check(response: requests.Response) -> requests.Response:
+        if response.status_code >= 400:
+            try:
+                detail = response.json().get("detail", response.text)
+            except ValueError:
+                detail = response.text
+            raise BackendError(response.status_code, str(detail))
+        return response
+
+    # --- Salud ---
+
+    def health(self) -> bool:
+        """Liveness del backend (`/health`, liviano), cacheado unos segundos."""
+        checked_at, online = self._health
+        if time.monotonic() - checked_at < self.cache_ttl:
+            return online
+        try:
+            online = self._request("GET", "/health").status_code == 200
+        except requests.RequestException:
+            online = False
+        self._health = (time.monotonic(), online)
+        return online
+
+    # --- RAG y triaje ---
+
+    def query_rag(self, question: str, collection: str = "default") -> dict:
+        payload = {"question": question, "collection": collection}
+        return self._check(self._request("POST", "/rag/query", json=payload)).json()
+
+    def stream_rag(self, question: str, collection: str = "default") -> Iterator[tuple[str, dict]]:
+        """Eventos (`token` | `done` | `error`) de la respuesta del RAG a medida que se genera."""
+        yield from self._stream("/rag/query/stream", "/rag/query", {"question": question, "collection": collection})
+
+    def process_incident(self, text: str) -> dict:
+        return self._check(self._request("POST", "/agent/process", json={"text": text})).json()
+
+    # --- Agente ReAct ---
+
+    def stream_chat(self, question: str, thread_id: str) -> Iterator[tuple[str, dict]]:
+        """Eventos (`token` | `tool_start` | `tool_end` | `done` | `error`) de un turno del agente."""
+        yield from self._stream(
+            "/react/chat/stream", "/react/chat", {"question": question, "thread_id": thread_id}
+        )
+        # El turno agregó mensajes: el próximo history() los trae (solo el delta)
+        self._expire_history(thread_id)
+
+    def history(self, thread_id: str) -> list[dict]:
+        """
+        Mensajes de chat (humano/IA) del thread. Dentro del TTL se sirven de la cache; después
+        se piden solo los mensajes posteriores al último conocido (304 si no hubo cambios).
+        """
+        with self._lock:
+            cached = self._histories.setdefault(thread_id, _History())
+            if cached.fetched_at and time.monotonic() - cached.fetched_at < self.cache_ttl:
+                return list(cached.messages)
+
+        params: dict[str, Any] = {"types": list(CHAT_MESSAGE_TYPES)}
+        headers = {}
+        if cached.cursor:
+            params["after"] = cached.cursor
+        if cached.etag:
+            headers["If-None-Match"] = cached.etag
+
+        response = self._request("GET", f"/react/context/{thread_id}", params=params, headers=headers)
+        if response.status_code == 400 and cached.cursor:
+            # El cursor ya no existe (la memoria se reinició desde otro lado): se pide todo de nuevo
+            with self._lock:
+                self._histories.pop(thread_id, None)
+            return self.history(thread_id)
+
+        with self._lock:
+            if response.status_code == 304:
+                cached.fetched_at = time.monotonic()
+            elif response.status_code == 404:
+                # Thread inexistente (o borrado): historial vacío
+                self._histories[thread_id] = _History(fetched_at=time.monotonic())
+            else:
+                delta = self._check(response).json()
+                cached.messages.extend(delta)
+                cached.etag = response.headers.get("ETag")
+                cached.cursor = response.headers.get("X-Next-Cursor", cached.cursor)
+                cached.fetched_at = time.monotonic()
+            return list(self._histories[thread_id].messages)
+
+    def reset_history(self, thread_id: str) -> dict:
+        response = self._check(self._request("DELETE", f"/react/context/{thread_id}"))
+        with self._lock:
+            self._histories.pop(thread_id, None)
+        return response.json()
+
+    def _expire_history(self, thread_id: str):
+        with self._lock:
+            if thread_id in self._histories:
+                self._histories[thread_id].fetched_at = 0.0
+
+    # --- Streaming ---
+
+    def _stream(self, stream_path: str, fallback_path: str, payload: dict) -> Iterator[tuple[str, dict]]:
+        """
+        SSE si el backend lo ofrece; si no (404/405: backend anterior), el endpoint clásico
+        presentado como un único `token` + `done`, así la UI tiene un solo camino.
+        """
+        with self._request("POST", stream_path, json=payload, stream=True) as response:
+            if response.status_code not in (404, 405):
+                self._check(response)
+                yield from iter_sse(response)
+                return
+
+        data = self._check(self._request("POST", fallback_path, json=payload)).json()
+        yield "token", {"delta": data.get("answer", "")}
+        yield "done", data